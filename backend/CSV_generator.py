@@ -1,11 +1,41 @@
-import pandas as pd
-import random
+"""
+CSV_generator.py - Synthetic price series for the simulated market.
+
+Generates bounded random-walk or geometric Brownian motion (GBM) paths
+for any number of symbols and streams them, chunk by chunk, to a CSV
+file or to the binary tick format of tick_store.py (chosen by the
+.ticks extension), so the full series never has to fit in memory.
+
+Prices are kept inside each symbol's [low, high] band with the original
+reflection rule: a step that ends above `high` is reset to
+high - randint(1, 10), one that ends below `low` to low + randint(1, 10).
+
+Because of that rule each price depends on the previous clamped one, so
+time is walked row by row; every row is a handful of NumPy operations
+across all symbols, and all random draws for a chunk are made at once.
+
+Examples (from backend/):
+    python CSV_generator.py --out test.csv
+    python CSV_generator.py --universe universe.csv --ticks 1000000 --out big.ticks
+    python CSV_generator.py --synthetic 5000 --ticks 100000 --mode gbm --out wide.ticks
+
+A universe file is a CSV with the header symbol,start,high,low.
+"""
+
+import argparse
+import csv
+import sys
+
 import numpy as np
 
-companies ={"APPL":[250,280,220], "GOOGL":[320,350,290],
-            "TSLA":[230,250,210]}
-df = pd.DataFrame()
+from tick_store import write_binary
 
+DEFAULT_UNIVERSE = [
+    ("APPL", 250, 280, 220),
+    ("GOOGL", 320, 350, 290),
+    ("TSLA", 230, 250, 210),
+]
+# Other companies used in the game:
 #HDFC- starts -1600, high- 1850 , low-1200
 #Reliance -  starts- 2000, high -2500, low-1400
 #TATA Motors -  starts- 500, high - 700, low - 350
@@ -16,24 +46,119 @@ df = pd.DataFrame()
 #CIPLA - starts -900, high - 700, low - 500
 #BPCL - starts - 350, high - 400, low - 200
 
-np.random.seed(69)
-
-def generate_rand_vals(start,high,low, company_name):
-    trend = np.random.randint(low=-30, high=30, size=150)
-    print(type(trend))
-    price = [start]
-    for i in range(1, 150):
-        p = price[i-1] + trend[i]
-        if p > high:
-            p = high - np.random.randint(low=1, high=10)
-        elif p < low:
-            p = low + np.random.randint(low=1, high=10)
-        price.append(p)
-    df[company_name] = price
-    
-
-for company in companies:
-    generate_rand_vals(companies[company][0],companies[company][1],companies[company][2],company)
-    # print(companies[company])
-df = df.astype(int)
-df.to_csv('PRICE_LIST_DEMO.csv', sep=',', index=False)
\ No newline at end of file
+MAX_STEP = 30       # random-walk steps are drawn from [-MAX_STEP, MAX_STEP)
+MAX_REFLECTION = 10  # reflections land 1..MAX_REFLECTION-1 inside the band
+CHUNK_ROWS = 10000
+
+
+def read_universe(path):
+    """
+    Returns [(symbol, start, high, low), ...] from a universe CSV.
+    """
+    with open(path, newline="") as f:
+        return [
+            (row["symbol"], float(row["start"]), float(row["high"]), float(row["low"]))
+            for row in csv.DictReader(f)
+        ]
+
+
+def synthetic_universe(count, rng):
+    """
+    `count` made-up symbols with random starting prices and a +-20% band.
+    """
+    starts = np.round(rng.uniform(50, 5000, count))
+    return [
+        (f"SYM{i:05d}", start, np.round(start * 1.2), np.round(start * 0.8))
+        for i, start in enumerate(starts)
+    ]
+
+
+def generate(universe, ticks, rng, mode="walk", sigma=0.01, mu=0.0, chunk_rows=CHUNK_ROWS):
+    """
+    Yields (rows, symbols) float arrays of at most `chunk_rows` rows,
+    `ticks` rows in total. The first row is every symbol's start price.
+    `sigma` and `mu` are the per-tick volatility and drift of GBM mode.
+    """
+    _, start, high, low = (np.array(column) for column in zip(*universe))
+    start, high, low = start.astype(float), high.astype(float), low.astype(float)
+    symbols = len(universe)
+    previous = None
+
+    for first_row in range(0, ticks, chunk_rows):
+        rows = min(chunk_rows, ticks - first_row)
+        if mode == "walk":
+            steps = rng.integers(-MAX_STEP, MAX_STEP, size=(rows, symbols)).astype(float)
+        else:
+            shocks = rng.standard_normal((rows, symbols))
+            steps = np.exp((mu - sigma ** 2 / 2) + sigma * shocks)
+        upper = high - rng.integers(1, MAX_REFLECTION, size=(rows, symbols))
+        lower = low + rng.integers(1, MAX_REFLECTION, size=(rows, symbols))
+
+        out = np.empty((rows, symbols))
+        begin = 0
+        if previous is None:
+            out[0] = start
+            previous = out[0]
+            begin = 1
+        for i in range(begin, rows):
+            row = out[i]
+            if mode == "walk":
+                np.add(previous, steps[i], out=row)
+            else:
+                np.multiply(previous, steps[i], out=row)
+            np.copyto(row, upper[i], where=row > high)
+            np.copyto(row, lower[i], where=row < low)
+            previous = row
+        previous = out[-1].copy()
+        yield out
+
+
+def write_csv(path, symbols, chunks, fmt):
+    with open(path, "w", newline="") as f:
+        f.write(",".join(symbols) + "\n")
+        for chunk in chunks:
+            np.savetxt(f, chunk, fmt=fmt, delimiter=",")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--universe", help="CSV with symbol,start,high,low columns")
+    source.add_argument("--synthetic", type=int, metavar="N", help="generate N random symbols")
+    parser.add_argument("--ticks", type=int, default=150)
+    parser.add_argument("--mode", choices=("walk", "gbm"), default="walk")
+    parser.add_argument("--sigma", type=float, default=0.01, help="GBM volatility per tick")
+    parser.add_argument("--mu", type=float, default=0.0, help="GBM drift per tick")
+    parser.add_argument("--seed", type=int, default=69)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--out", default="PRICE_LIST_DEMO.csv", help="output .csv or .ticks file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.universe:
+        universe = read_universe(args.universe)
+    elif args.synthetic:
+        universe = synthetic_universe(args.synthetic, rng)
+    else:
+        universe = DEFAULT_UNIVERSE
+    for symbol, start, high, low in universe:
+        if not low <= start <= high:
+            print(f"Error: {symbol} starts at {start}, outside its band [{low}, {high}]")
+            sys.exit(1)
+        if high - low <= MAX_REFLECTION:
+            print(f"Error: {symbol} band [{low}, {high}] is too narrow to reflect into")
+            sys.exit(1)
+
+    symbols = [symbol for symbol, _, _, _ in universe]
+    chunks = generate(universe, args.ticks, rng, args.mode, args.sigma, args.mu, args.chunk_rows)
+    if args.out.endswith(".ticks"):
+        write_binary(args.out, symbols, chunks)
+    else:
+        # Integer prices, as before, unless the walk can leave the integers
+        integral = args.mode == "walk" and all(float(v).is_integer() for u in universe for v in u[1:])
+        write_csv(args.out, symbols, chunks, "%d" if integral else "%.4f")
+    print(f"Wrote {args.ticks} ticks x {len(symbols)} symbols to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
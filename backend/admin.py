@@ -0,0 +1,314 @@
+"""
+admin.py - Maintenance commands for the trading database.
+
+    python admin.py snapshot SEASON        archive portfolios and holdings
+    python admin.py rollover SEASON        archive portfolios, holdings and
+                                           trades, then start everyone over
+    python admin.py reset-cash             set every portfolio's cash
+    python admin.py seasons                list archived seasons
+    python admin.py export portfolios|holdings|transactions
+                    [--season SEASON] [--out FILE] [--format csv|parquet]
+
+Every command is set-based (INSERT ... SELECT, UPDATE, DELETE) over
+ranges of user ids, --chunk-size users per transaction, so memory stays
+flat however many users there are and the write lock is only held for
+one chunk at a time. snapshot and rollover resume where an interrupted
+run stopped. Exports stream rows; a .gz --out is gzipped, and Parquet
+needs pyarrow.
+
+Run a rollover with the app stopped, or restart it afterwards: running
+processes keep cached portfolios and rankings until they reload them.
+
+The database is --db PATH, else MOCK_TRADING_DB, else users.db as in app.py.
+"""
+
+import argparse
+import csv
+import gzip
+import os
+import sys
+import time
+
+from flask import Flask
+from sqlalchemy import text
+
+from models import db, Season, configure_sqlite, upgrade_schema
+
+CHUNK_SIZE = 50000
+STARTING_CASH = 10000.0
+
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("MOCK_TRADING_DB", "sqlite:///users.db")
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Every statement below runs for users in (:low, :high]
+USER_RANGE = "user_id > :low AND user_id <= :high"
+
+ARCHIVE_PORTFOLIOS = (
+    "INSERT OR IGNORE INTO season_portfolios (season, user_id, cash) "
+    f"SELECT :season, user_id, cash FROM portfolio WHERE {USER_RANGE}"
+)
+ARCHIVE_HOLDINGS = (
+    "INSERT INTO season_holdings (season, user_id, symbol, quantity, cost, realized_pnl) "
+    "SELECT :season, user_id, symbol, quantity, cost, realized_pnl FROM holdings "
+    f"WHERE {USER_RANGE}"
+)
+ARCHIVE_TRANSACTIONS = (
+    "INSERT INTO season_transactions "
+    "(season, id, user_id, type, symbol, quantity, price, timestamp, tick) "
+    "SELECT :season, id, user_id, type, symbol, quantity, price, timestamp, tick "
+    f"FROM transactions WHERE {USER_RANGE}"
+)
+RESET_CASH = f"UPDATE portfolio SET cash = :cash, version = version + 1 WHERE {USER_RANGE}"
+RESET_POSITIONS = (
+    f"DELETE FROM transactions WHERE {USER_RANGE}",
+    f"DELETE FROM holdings WHERE {USER_RANGE}",
+    # "remaining > 0" lets SQLite use the partial index ix_lots_open;
+    # consumed lots are purged by id afterwards
+    f"DELETE FROM lots WHERE remaining > 0 AND {USER_RANGE}",
+    "UPDATE orders SET status = 'cancelled', reason = 'Season ended' "
+    f"WHERE status = 'open' AND {USER_RANGE}",
+    RESET_CASH,
+)
+
+SNAPSHOT_STATEMENTS = (ARCHIVE_PORTFOLIOS, ARCHIVE_HOLDINGS)
+ROLLOVER_STATEMENTS = (ARCHIVE_PORTFOLIOS, ARCHIVE_HOLDINGS, ARCHIVE_TRANSACTIONS) + RESET_POSITIONS
+
+# name -> (live query, archived query, [(column, parquet type), ...])
+EXPORTS = {
+    "portfolios": (
+        'SELECT p.user_id, u.username, p.cash FROM portfolio p '
+        'JOIN "user" u ON u.id = p.user_id ORDER BY p.user_id',
+        'SELECT s.user_id, u.username, s.cash FROM season_portfolios s '
+        'LEFT JOIN "user" u ON u.id = s.user_id WHERE s.season = :season ORDER BY s.user_id',
+        [("user_id", "int64"), ("username", "string"), ("cash", "float64")]
+    ),
+    "holdings": (
+        "SELECT user_id, symbol, quantity, cost, realized_pnl FROM holdings "
+        "ORDER BY user_id, symbol",
+        "SELECT user_id, symbol, quantity, cost, realized_pnl FROM season_holdings "
+        "WHERE season = :season ORDER BY user_id, symbol",
+        [("user_id", "int64"), ("symbol", "string"), ("quantity", "int64"),
+         ("cost", "float64"), ("realized_pnl", "float64")]
+    ),
+    "transactions": (
+        "SELECT id, user_id, type, symbol, quantity, price, timestamp, tick "
+        "FROM transactions ORDER BY id",
+        "SELECT id, user_id, type, symbol, quantity, price, timestamp, tick "
+        "FROM season_transactions WHERE season = :season ORDER BY id",
+        [("id", "int64"), ("user_id", "int64"), ("type", "string"), ("symbol", "string"),
+         ("quantity", "int64"), ("price", "float64"), ("timestamp", "float64"), ("tick", "int64")]
+    ),
+}
+
+
+# =========================
+#  CHUNKED UPDATES
+# =========================
+
+def begin_write():
+    db.session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def next_chunk(after, chunk_size):
+    """
+    Returns the highest user id of the next `chunk_size` portfolios after
+    `after`, or None when there are none left.
+    """
+    return db.session.execute(text(
+        "SELECT MAX(user_id) FROM (SELECT user_id FROM portfolio "
+        "WHERE user_id > :after ORDER BY user_id LIMIT :limit)"
+    ), {"after": after, "limit": chunk_size}).scalar()
+
+
+def run_chunked(statements, params, chunk_size, after=0, season=None):
+    """
+    Runs `statements` for successive user-id ranges after `after`, one
+    write transaction per chunk. With `season`, its progress is saved in
+    the same transaction. Returns the number of portfolios touched.
+    """
+    users = 0
+    started = time.perf_counter()
+    while True:
+        begin_write()
+        high = next_chunk(after, chunk_size)
+        if high is None:
+            db.session.commit()
+            return users
+        chunk = dict(params, low=after, high=high)
+        count = db.session.execute(text(
+            f"SELECT COUNT(*) FROM portfolio WHERE {USER_RANGE}"
+        ), chunk).scalar()
+        for statement in statements:
+            db.session.execute(text(statement), chunk)
+        if season is not None:
+            db.session.execute(text(
+                "UPDATE seasons SET last_user_id = :high, users = users + :count WHERE name = :season"
+            ), dict(chunk, count=count))
+        db.session.commit()
+        users += count
+        after = high
+        print(f"  {users} portfolios done, up to user {high} ({time.perf_counter() - started:.1f}s)")
+
+
+def purge_consumed_lots(chunk_size):
+    """
+    Deletes fully sold lots (remaining = 0), which nothing reads, in
+    ranges of lot ids.
+    """
+    max_id = db.session.execute(text("SELECT MAX(id) FROM lots")).scalar() or 0
+    db.session.commit()
+    deleted = 0
+    for low in range(0, max_id, chunk_size):
+        begin_write()
+        deleted += db.session.execute(text(
+            "DELETE FROM lots WHERE id > :low AND id <= :high AND remaining = 0"
+        ), {"low": low, "high": low + chunk_size}).rowcount
+        db.session.commit()
+    return deleted
+
+
+def archive(name, kind, chunk_size, cash=STARTING_CASH):
+    season = db.session.get(Season, name)
+    if season is None:
+        season = Season(name=name, kind=kind, started_at=time.time())
+        db.session.add(season)
+        db.session.commit()
+    elif season.kind != kind:
+        raise SystemExit(f"Season {name!r} is already a {season.kind}; pick another name.")
+    elif season.finished_at is not None:
+        raise SystemExit(f"Season {name!r} was already archived ({season.users} portfolios).")
+    else:
+        print(f"Resuming {kind} {name!r} after user {season.last_user_id}")
+
+    statements = ROLLOVER_STATEMENTS if kind == "rollover" else SNAPSHOT_STATEMENTS
+    after = season.last_user_id
+    db.session.commit()
+    users = run_chunked(statements, {"season": name, "cash": cash}, chunk_size, after, name)
+    if kind == "rollover":
+        print(f"  purged {purge_consumed_lots(chunk_size)} consumed lots")
+
+    begin_write()
+    db.session.execute(text("UPDATE seasons SET finished_at = :now WHERE name = :season"),
+                       {"now": time.time(), "season": name})
+    db.session.commit()
+    print(f"{kind.capitalize()} {name!r} finished: {users} portfolios this run.")
+
+
+# =========================
+#  EXPORTS
+# =========================
+
+def open_output(path):
+    if path in (None, "-"):
+        return sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", newline="")
+    return open(path, "w", newline="")
+
+
+def write_csv(path, columns, partitions):
+    out = open_output(path)
+    try:
+        writer = csv.writer(out)
+        writer.writerow([name for name, _ in columns])
+        rows = 0
+        for partition in partitions:
+            writer.writerows(partition)
+            rows += len(partition)
+        return rows
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def write_parquet(path, columns, partitions):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export needs pyarrow (pip install pyarrow), or use --format csv.")
+    if path in (None, "-"):
+        raise SystemExit("Parquet export needs --out FILE.")
+
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        # One row group per partition
+        for partition in partitions:
+            arrays = [pa.array([row[i] for row in partition], type=field.type)
+                      for i, field in enumerate(schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(partition)
+    return rows
+
+
+def export(what, season, out, fmt, chunk_size):
+    live_query, season_query, columns = EXPORTS[what]
+    query = season_query if season else live_query
+    # Plain DB-API cursor: fetchmany() tuples without building Row objects
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute(query, {"season": season})
+    partitions = iter(lambda: cursor.fetchmany(chunk_size), [])
+    write = write_parquet if fmt == "parquet" else write_csv
+    rows = write(out, columns, partitions)
+    cursor.close()
+    db.session.commit()
+    if out not in (None, "-"):
+        print(f"Exported {rows} {what} rows to {out}.", file=sys.stderr)
+
+
+# =========================
+#  MAIN
+# =========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="path to the SQLite database")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="users per transaction / rows per export batch")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for kind in ("snapshot", "rollover"):
+        command = commands.add_parser(kind)
+        command.add_argument("season")
+        if kind == "rollover":
+            command.add_argument("--cash", type=float, default=STARTING_CASH)
+
+    command = commands.add_parser("reset-cash")
+    command.add_argument("--cash", type=float, default=STARTING_CASH)
+
+    commands.add_parser("seasons")
+
+    command = commands.add_parser("export")
+    command.add_argument("what", choices=sorted(EXPORTS))
+    command.add_argument("--season", help="export an archived season instead of live data")
+    command.add_argument("--out", help="output file (default: stdout)")
+    command.add_argument("--format", choices=("csv", "parquet"),
+                         help="default: parquet for *.parquet, else csv")
+
+    args = parser.parse_args(argv)
+    if args.db:
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.abspath(args.db)
+    db.init_app(app)
+
+    with app.app_context():
+        configure_sqlite(db.engine)
+        upgrade_schema()
+        if args.command in ("snapshot", "rollover"):
+            archive(args.season, args.command, args.chunk_size, getattr(args, "cash", STARTING_CASH))
+        elif args.command == "reset-cash":
+            users = run_chunked([RESET_CASH], {"cash": args.cash}, args.chunk_size)
+            print(f"Cash reset to {args.cash:g} for {users} portfolios.")
+        elif args.command == "seasons":
+            for season in Season.query.order_by(Season.started_at):
+                state = "done" if season.finished_at else f"interrupted after user {season.last_user_id}"
+                print(f"{season.name:<20} {season.kind:<9} {season.users:>9} portfolios  "
+                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(season.started_at))}  {state}")
+        else:
+            fmt = args.format or ("parquet" if (args.out or "").endswith(".parquet") else "csv")
+            export(args.what, args.season, args.out, fmt, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+admission.py - Per-client rate limits and a global concurrency limit.
+
+init_app() puts two checks in front of every route:
+
+  1. Token buckets per (budget, client). Each route is assigned a budget,
+     or several that must all have a token (ROUTE_BUDGETS in app.py):
+     cheap reads get a generous one, trades a strict one. The client is
+     the JWT identity when the request carries a valid token, otherwise
+     the remote address. Logins and registrations are keyed by address
+     ("auth", generous enough for a classroom behind one NAT signing in
+     at once), and logins also by the email tried ("login", strict, to
+     slow password guessing without locking out the neighbours). An
+     empty bucket answers 429 with Retry-After.
+  2. A cap on requests in progress (MAX_IN_FLIGHT). Past the cap a
+     request is answered 503 with Retry-After at once instead of
+     queueing behind the others, and the last RESERVED_FOR_TRADES slots
+     are kept for the "trade" budget, so a flood of reads cannot starve
+     orders.
+
+Rejected requests never reach the route, the database or the password
+pool. Counters: http_requests_throttled_total (429) and
+http_requests_shed_total (503) by budget.
+
+Configured with MOCK_TRADING_ADMISSION=on (default) | off,
+MOCK_TRADING_MAX_IN_FLIGHT, and MOCK_TRADING_RATE_LIMITS, e.g.
+"trade=5:10,login=0.2:5" (tokens per second : burst per budget).
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+import metrics
+
+# budget -> (tokens per second, burst)
+BUDGETS = {
+    "prices": (50.0, 100),
+    "default": (20.0, 40),
+    "trade": (10.0, 20),
+    # Per address: 60 logins at once, then 5 a second, about what a
+    # 4-worker password pool hashes; past that it answers 503 itself
+    "auth": (5.0, 60),
+    # Per email: 10 tries, then one every 2 seconds
+    "login": (0.5, 10)
+}
+ADDRESS_KEYED = ("auth",)
+ACCOUNT_KEYED = ("login",)
+MAX_IN_FLIGHT = 64
+RESERVED_FOR_TRADES = 16
+MAX_BUCKETS = 100000  # least recently used clients are forgotten past this
+SHED_RETRY_AFTER = 1  # seconds
+
+THROTTLED = metrics.Counter("http_requests_throttled_total",
+                            "Requests refused with 429 by a rate limit.", labels=("budget",))
+SHED = metrics.Counter("http_requests_shed_total",
+                       "Requests refused with 503 by the concurrency limit.", labels=("budget",))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now):
+        """
+        Takes a token. Returns 0, or the seconds until one is available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, budgets, capacity=MAX_BUCKETS):
+        self.budgets = dict(budgets)
+        self.capacity = capacity
+        self._buckets = OrderedDict()  # (budget, client) -> TokenBucket
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, budget, client):
+        rate, burst = self.budgets[budget]
+        now = time.monotonic()
+        key = (budget, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+                if len(self._buckets) > self.capacity:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit=MAX_IN_FLIGHT, reserved=RESERVED_FOR_TRADES):
+        self.limit = limit
+        self.reserved = min(reserved, limit)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, budget):
+        cap = self.limit if budget == "trade" else self.limit - self.reserved
+        with self._lock:
+            if self.in_flight >= cap:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+def parse_budgets(spec, budgets=BUDGETS):
+    """
+    Applies a MOCK_TRADING_RATE_LIMITS value to a copy of `budgets`.
+    """
+    budgets = dict(budgets)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, value = part.strip().partition("=")
+        rate, _, burst = value.partition(":")
+        if name not in budgets:
+            raise ValueError(f"Unknown rate limit budget {name!r}, expected one of "
+                             f"{', '.join(budgets)}")
+        budgets[name] = (float(rate), int(burst or max(float(rate), 1)))
+    return budgets
+
+
+def _client(budget):
+    if budget in ACCOUNT_KEYED:
+        data = request.get_json(silent=True)
+        email = data.get("email") if isinstance(data, dict) else None
+        if isinstance(email, str) and email:
+            return f"email:{email.strip().lower()}"
+    elif budget not in ADDRESS_KEYED:
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            # A bad token is the route's to reject; count it against the address
+            identity = None
+        if identity is not None:
+            return f"user:{identity}"
+    return f"ip:{request.remote_addr}"
+
+
+def _refuse(status, message, retry_after):
+    response = jsonify({"message": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def init_app(app, routes, enabled=None, max_in_flight=None, budgets=None):
+    """
+    Installs the checks on `app`. `routes` maps endpoint names to a budget
+    or a tuple of budgets; None exempts an endpoint (e.g. long-lived
+    streams), and unlisted endpoints use "default". Returns (RateLimiter, ConcurrencyLimiter), or
+    None when disabled.
+    """
+    if enabled is None:
+        enabled = os.getenv("MOCK_TRADING_ADMISSION", "on").strip().lower() not in ("off", "0", "false")
+    if not enabled:
+        return None
+    limiter = RateLimiter(budgets or parse_budgets(os.getenv("MOCK_TRADING_RATE_LIMITS")))
+    concurrency = ConcurrencyLimiter(
+        max_in_flight or int(os.getenv("MOCK_TRADING_MAX_IN_FLIGHT", MAX_IN_FLIGHT))
+    )
+
+    def admit():
+        if request.method == "OPTIONS" or request.endpoint in (None, "static"):
+            return None
+        budgets = routes.get(request.endpoint, "default")
+        if budgets is None:
+            return None
+        if isinstance(budgets, str):
+            budgets = (budgets,)
+        for budget in budgets:
+            wait = limiter.take(budget, _client(budget))
+            if wait:
+                THROTTLED.inc(1, budget)
+                return _refuse(429, "Too many requests, please slow down.", wait)
+        budget = budgets[0]
+        if not concurrency.acquire(budget):
+            SHED.inc(1, budget)
+            return _refuse(503, "The server is busy, please retry.", SHED_RETRY_AFTER)
+        g.admitted = True
+        return None
+
+    def release(error):
+        if g.pop("admitted", False):
+            concurrency.release()
+
+    # Call right after metrics.init_app(), so this runs after its hook
+    # (refused requests are still measured) and before the app's own
+    app.before_request(admit)
+    app.teardown_request(release)
+
+    metrics.add_collector(lambda: [
+        ("admission_in_flight", "gauge", "Requests admitted and in progress.", concurrency.in_flight),
+        ("admission_in_flight_limit", "gauge", "Requests admitted at once.", concurrency.limit),
+        ("rate_limit_buckets", "gauge", "Clients with a token bucket.", len(limiter))
+    ])
+    return limiter, concurrency
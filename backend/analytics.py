@@ -0,0 +1,241 @@
+"""
+analytics.py - Equity curve and risk metrics per user, for
+/api/portfolio/analytics.
+
+The position timeline is rebuilt from the transaction ledger with NumPy:
+trades are scattered into a (ticks x symbols) matrix of quantity changes
+and a vector of cash changes, cumulative sums give holdings and cash at
+every tick, and equity is cash plus the row-wise dot product of holdings
+and the price matrix. Only the last ANALYTICS_TICKS ticks are kept;
+older trades are folded into the opening position.
+
+Curves are cached per user and extended incrementally: a request after
+new ticks or trades only computes the ticks since the last one, from the
+stored closing cash and holdings. The curve is rebuilt from scratch when
+that is not possible: a trade stamped before the last computed tick, a
+reloaded price series, or cash that no longer matches the portfolio
+(e.g. after admin.py reset it).
+
+Returns are per tick and not annualized.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ANALYTICS_TICKS = 5000
+ROLLING_WINDOW = 20  # ticks
+CACHE_SIZE = 2000
+
+
+class EquityCurve:
+    """
+    Equity at ticks [start_tick, last_tick], plus the cash and holdings at
+    last_tick to extend it from. `trades` everywhere are rows of
+    (id, tick, type, symbol, quantity, price), in id order.
+    """
+
+    def __init__(self, user_id, series, cash, start_tick):
+        self.user_id = user_id
+        self.series = series
+        self.symbols = []
+        self.columns = {}       # symbol -> index into qty / price_columns
+        self.price_columns = np.empty(0, dtype=np.int64)
+        self.qty = np.empty(0)
+        self.cash = cash
+        self.start_tick = start_tick
+        self.last_tick = start_tick - 1
+        self.equity = np.empty(0)
+        self.last_transaction_id = 0
+        self.rendered = None    # ((last_tick, last_transaction_id, points), body)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, user_id, series, cash_now, trades, tick):
+        """
+        Builds the curve up to `tick` from the user's whole ledger and
+        current cash; the opening cash is whatever the trades leave over.
+        """
+        spent = sum(quantity * price * (1 if kind == "buy" else -1)
+                    for _, _, kind, _, quantity, price in trades)
+        traded_ticks = [t for _, t, _, _, _, _ in trades if t is not None]
+        first = min(traded_ticks) if traded_ticks else tick
+        start = max(first, tick - ANALYTICS_TICKS + 1)
+        curve = cls(user_id, series, cash_now + spent, start)
+        curve.extend(trades, tick)
+        return curve
+
+    def can_extend(self, trades):
+        return all(t is not None and t >= self.last_tick for _, t, _, _, _, _ in trades)
+
+    def _add_symbols(self, symbols):
+        for symbol in symbols:
+            if symbol not in self.columns and symbol in self.series.columns:
+                self.columns[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+        grow = len(self.symbols) - len(self.qty)
+        if grow:
+            self.qty = np.concatenate([self.qty, np.zeros(grow)])
+            self.price_columns = np.array([self.series.columns[s] for s in self.symbols],
+                                          dtype=np.int64)
+
+    def extend(self, trades, tick):
+        """
+        Applies `trades` (none stamped before last_tick) and computes the
+        equity of every tick up to `tick`.
+        """
+        if trades:
+            self.last_transaction_id = max(self.last_transaction_id, trades[-1][0])
+            self._add_symbols({symbol for _, _, _, symbol, _, _ in trades})
+        tick = max([tick] + [t for _, t, _, _, _, _ in trades if t is not None])
+
+        # Recompute last_tick itself if trades landed on it
+        resume = self.last_tick + 1
+        if any(t == self.last_tick for _, t, _, _, _, _ in trades):
+            resume = self.last_tick
+            self.equity = self.equity[:-1]
+        # Ticks that fall out of the window (or a live feed's ring) are never computed
+        first = max(resume, tick - ANALYTICS_TICKS + 1, self.series.first_tick)
+        if first > resume:
+            self.equity = np.empty(0)
+            self.start_tick = first
+
+        count = tick - first + 1
+        deltas = np.zeros((max(count, 0), len(self.symbols)))
+        cash_deltas = np.zeros(max(count, 0))
+        for _, t, kind, symbol, quantity, price in trades:
+            column = self.columns.get(symbol)
+            signed = quantity if kind == "buy" else -quantity
+            if t is None or t < first:
+                # Folded into the opening position
+                self.cash -= signed * price
+                if column is not None:
+                    self.qty[column] += signed
+                continue
+            row = t - first
+            cash_deltas[row] -= signed * price
+            if column is not None:
+                deltas[row, column] += signed
+        if count <= 0:
+            return
+
+        holdings = self.qty + np.cumsum(deltas, axis=0)
+        cash = self.cash + np.cumsum(cash_deltas)
+        rows = np.arange(first, tick + 1) % len(self.series)
+        prices = self.series.prices[np.ix_(rows, self.price_columns)]
+        equity = cash + np.einsum("ij,ij->i", holdings, prices)
+
+        self.equity = np.concatenate([self.equity, equity])[-ANALYTICS_TICKS:]
+        self.start_tick = tick - len(self.equity) + 1
+        self.qty = holdings[-1]
+        self.cash = float(cash[-1])
+        self.last_tick = tick
+
+
+def risk_metrics(equity, window=ROLLING_WINDOW):
+    """
+    Drawdown, rolling volatility and rolling Sharpe ratio (mean / std of
+    per-tick returns over `window` ticks; NaN until a window is full),
+    aligned with `equity`, and summary figures for the whole curve.
+    """
+    count = len(equity)
+    peak = np.maximum.accumulate(equity)
+    drawdown = np.divide(equity, peak, out=np.ones(count), where=peak > 0) - 1
+    returns = np.divide(np.diff(equity), equity[:-1], out=np.zeros(max(count - 1, 0)),
+                        where=equity[:-1] != 0)
+
+    rolling_volatility = np.full(count, np.nan)
+    rolling_sharpe = np.full(count, np.nan)
+    if len(returns) >= window:
+        windows = sliding_window_view(returns, window)
+        std = windows.std(axis=1)
+        mean = windows.mean(axis=1)
+        rolling_volatility[window:] = std
+        rolling_sharpe[window:] = np.divide(mean, std, out=np.zeros_like(std), where=std > 0)
+
+    volatility = float(returns.std()) if len(returns) else 0.0
+    summary = {
+        "equity": float(equity[-1]) if count else None,
+        "return": float(equity[-1] / equity[0] - 1) if count and equity[0] else 0.0,
+        "max_drawdown": float(drawdown.min()) if count else 0.0,
+        "volatility": volatility,
+        "sharpe": float(returns.mean() / volatility) if volatility > 0 else 0.0
+    }
+    return drawdown, rolling_volatility, rolling_sharpe, summary
+
+
+def _json_list(values):
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def render(curve, points, window=ROLLING_WINDOW):
+    """
+    The analytics payload: every series sampled at up to `points` evenly
+    spaced ticks ending with the latest one.
+    """
+    drawdown, volatility, sharpe, summary = risk_metrics(curve.equity, window)
+    count = len(curve.equity)
+    index = np.unique(np.linspace(0, count - 1, min(points, count)).round().astype(np.int64))
+    return {
+        "start_tick": curve.start_tick,
+        "end_tick": curve.last_tick,
+        "window": window,
+        "ticks": (curve.start_tick + index).tolist(),
+        "equity": curve.equity[index].tolist(),
+        "drawdown": drawdown[index].tolist(),
+        "rolling_volatility": _json_list(volatility[index]),
+        "rolling_sharpe": _json_list(sharpe[index]),
+        "summary": summary
+    }
+
+
+class AnalyticsCache:
+    """
+    LRU of EquityCurve per user. `load(user_id, after_id)` returns the
+    user's (cash, trades with id > after_id), or None if there is no
+    portfolio.
+    """
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self._curves = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.extensions = 0
+
+    def __len__(self):
+        return len(self._curves)
+
+    def curve(self, user_id, series, tick, load):
+        with self._lock:
+            curve = self._curves.get(user_id)
+            if curve is not None:
+                self._curves.move_to_end(user_id)
+
+        if curve is not None and curve.series is series:
+            with curve.lock:
+                loaded = load(user_id, curve.last_transaction_id)
+                if loaded is None:
+                    return None
+                cash, trades = loaded
+                if curve.can_extend(trades):
+                    curve.extend(trades, max(tick, curve.last_tick))
+                    if math.isclose(curve.cash, cash, rel_tol=1e-9, abs_tol=1e-6):
+                        self.extensions += 1
+                        return curve
+
+        loaded = load(user_id, 0)
+        if loaded is None:
+            return None
+        cash, trades = loaded
+        curve = EquityCurve.build(user_id, series, cash, trades, tick)
+        self.builds += 1
+        with self._lock:
+            self._curves[user_id] = curve
+            self._curves.move_to_end(user_id)
+            while len(self._curves) > self.capacity:
+                self._curves.popitem(last=False)
+        return curve
@@ -3,16 +3,39 @@ app.py - Complete Flask application for Mock-Trading, with JWT auth,
 SQLite DB, CSV-based stock updates, and buy/sell routes.
 """
 
-import time
-import csv
-import json
+import hmac
+import multiprocessing
+import os
 import threading
+import time
 
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, request, jsonify
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+import admission
+import analytics
+import execution
+import json_provider
+import market_clock
+import market_state
+import metrics
+from candles import MAX_POINTS
+from execution import OrderError
+from leaderboard import Leaderboard
+from lot_ledger import position_summary
+from models import db, User, Portfolio, Holding, Lot, Order, Transaction, configure_sqlite, upgrade_schema
+import password_pool
+from portfolio_cache import CachedPortfolio, PortfolioCache
+from order_book import OrderBook, ORDER_SIDES, ORDER_TYPES
+from price_snapshot import BINARY_MIMETYPE, SnapshotHistory
+from price_stream import PriceBroadcaster, parse_last_event_id
+import tick_feed
+from tick_feed import FeedBusy, FeedClock
+from tick_store import TickStore
+from trade_journal import TradeJournal
 
 # =========================
 #  CONFIG
@@ -20,8 +43,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 class Config:
     SECRET_KEY = "mysecretkey"
-    SQLALCHEMY_DATABASE_URI = "sqlite:///users.db"
+    SQLALCHEMY_DATABASE_URI = os.getenv("MOCK_TRADING_DB", "sqlite:///users.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_BUSY_TIMEOUT_MS = 5000
     JWT_SECRET_KEY = "jwtsecretkey"  # For JWT signing
 
 # =========================
@@ -30,71 +54,475 @@ class Config:
 
 app = Flask(__name__)
 app.config.from_object(Config)
-
-db = SQLAlchemy(app)
+json_provider.init_app(app)
+
+db.init_app(app)
+with app.app_context():
+    configure_sqlite(db.engine, app.config["SQLITE_BUSY_TIMEOUT_MS"])
+    metrics.init_app(app, db.engine)
+# Rate limit budget per endpoint (see admission.py); unlisted ones use
+# "default", None is exempt
+ROUTE_BUDGETS = {
+    "get_stock_prices": "prices",
+    "get_price_symbols": "prices",
+    "get_price_history": "prices",
+    "get_current_timestamp": "prices",
+    "stream_stock_prices": None,
+    "ingest_ticks": None,
+    "prometheus_metrics": None,
+    "slow_requests": None,
+    "register": "auth",
+    "login": ("auth", "login"),
+    "buy_stock": "trade",
+    "sell_stock": "trade",
+    "batch_orders": "trade",
+    "place_order": "trade",
+    "cancel_order": "trade"
+}
+ADMISSION = admission.init_app(app, ROUTE_BUDGETS)
 jwt = JWTManager(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 # =========================
-#  MODELS
+#  PORTFOLIO HELPERS
 # =========================
 
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-
-class Portfolio(db.Model):
-    __tablename__ = "portfolio"
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    cash = db.Column(db.Float, default=10000.0)
-    stocks = db.Column(db.JSON, default=lambda: json.dumps({}))
-    stock_purchases = db.Column(db.JSON, default=lambda: json.dumps({}))
-    transactions = db.Column(db.JSON, default=lambda: json.dumps([]))
+def value_holdings(holdings, row_index):
+    """
+    Returns (stocks, positions) from [(symbol, quantity, cost,
+    realized_pnl), ...]. `positions` carries the running cost basis and
+    P&L per symbol, valued at the prices of `row_index`.
+    """
+    stocks = {}
+    positions = {}
+    for symbol, quantity, cost, realized_pnl in holdings:
+        if quantity > 0:
+            stocks[symbol] = quantity
+        positions[symbol] = position_summary(
+            quantity, cost, realized_pnl, TICK_STORE.price(row_index, symbol)
+        )
+    return stocks, positions
+
+def load_holdings(user_id):
+    return [
+        (holding.symbol, holding.quantity, holding.cost, holding.realized_pnl)
+        for holding in Holding.query.filter_by(user_id=user_id)
+    ]
+
+def load_stock_purchases(user_id):
+    stock_purchases = {}
+    open_lots = Lot.query.filter(Lot.user_id == user_id, Lot.remaining > 0).order_by(Lot.id)
+    for lot in open_lots:
+        stock_purchases.setdefault(lot.symbol, []).append({
+            "quantity": lot.remaining,
+            "price": lot.price
+        })
+    return stock_purchases
+
+def load_positions(user_id):
+    """
+    Returns (stocks, stock_purchases, positions) for a user, built from
+    the holdings table and the still-open lots, valued at the current tick.
+    """
+    stocks, positions = value_holdings(load_holdings(user_id), market_now()[1])
+    return stocks, load_stock_purchases(user_id), positions
+
+def load_transaction_page(user_id, cursor, limit):
+    """
+    Returns (transaction dicts, next_cursor): the user's transactions
+    before id `cursor`, newest first; next_cursor is None on the last page.
+    """
+    query = Transaction.query.filter(Transaction.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(Transaction.id < cursor)
+    page = query.order_by(Transaction.id.desc()).limit(limit + 1).all()
+    transactions = [transaction.to_dict() for transaction in page[:limit]]
+    return transactions, transactions[-1]["id"] if len(page) > limit else None
+
+def load_cached_portfolio(user_id):
+    """
+    PORTFOLIO_CACHE loader: everything a portfolio response needs except
+    prices, or None if the user has no portfolio.
+    """
+    portfolio = Portfolio.query.filter_by(user_id=user_id).first()
+    if not portfolio:
+        return None
+    entry = CachedPortfolio(
+        user_id, portfolio.version, portfolio.cash, load_holdings(user_id),
+        load_stock_purchases(user_id), *load_transaction_page(user_id, None, RECENT_TRANSACTIONS)
+    )
+    db.session.commit()
+    return entry
+
+def load_analytics_trades(user_id, after_id):
+    """
+    ANALYTICS loader: the user's cash and their trades with id > after_id
+    as (id, tick, type, symbol, quantity, price), read in one transaction.
+    """
+    portfolio = db.session.query(Portfolio.cash).filter_by(user_id=user_id).first()
+    if portfolio is None:
+        db.session.commit()
+        return None
+    trades = db.session.query(
+        Transaction.id, Transaction.tick, Transaction.type, Transaction.symbol,
+        Transaction.quantity, Transaction.price
+    ).filter(Transaction.user_id == user_id, Transaction.id > after_id).order_by(Transaction.id)
+    trades = [tuple(trade) for trade in trades]
+    db.session.commit()
+    return portfolio.cash, trades
+
+def trade_response(message, user_id, symbol, price, balance, transaction):
+    """
+    Response to a buy or sell: the new transaction, cash and position in
+    the traded symbol. With ?full=1, also the whole portfolio (holdings,
+    open lots and the latest transactions), as older clients expect.
+    """
+    if request.args.get("full") in ("1", "true"):
+        stocks, stock_purchases, positions = load_positions(user_id)
+        transactions, cursor = load_transaction_page(user_id, None, RECENT_TRANSACTIONS)
+        db.session.commit()
+        return jsonify({
+            "message": message,
+            "balance": balance,
+            "stocks": stocks,
+            "stock_purchases": stock_purchases,
+            "positions": positions,
+            "price": price,
+            "transaction": transaction,
+            "transactions": transactions,
+            "transactions_cursor": cursor
+        }), 200
+    holding = db.session.get(Holding, (user_id, symbol))
+    position = (holding.quantity, holding.cost, holding.realized_pnl) if holding else (0, 0.0, 0.0)
+    db.session.commit()
+    return jsonify({
+        "message": message,
+        "balance": balance,
+        "price": price,
+        "transaction": transaction,
+        "position": position_summary(*position, price)
+    }), 200
+
+def cached_response(body, etag):
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 # =========================
-#  CSV BACKGROUND THREAD
+#  PRICE BACKGROUND THREAD
 # =========================
 
-STOCK_PRICES = []
+# Prices come from test.csv, cycled (default), or a live feed: api,
+# tail:<path> or replay:<path>, see tick_feed.py
+FEED_SPEC = os.getenv("MOCK_TRADING_FEED", "csv").strip()
+FEED_TAIL = None
+if FEED_SPEC.lower() == "csv":
+    TICK_STORE = TickStore("test.csv")
+else:
+    TICK_STORE, FEED_TAIL = tick_feed.feed_from_spec(
+        FEED_SPEC, int(os.getenv("MOCK_TRADING_FEED_CAPACITY", tick_feed.RING_CAPACITY))
+    )
+LIVE_FEED = isinstance(TICK_STORE, tick_feed.TickFeed)
+# Token for POST /api/ticks; ingestion is disabled without one
+ADMIN_TOKEN = os.getenv("MOCK_TRADING_ADMIN_TOKEN", "")
+PRICE_BROADCASTER = PriceBroadcaster()
+PRICE_SNAPSHOTS = SnapshotHistory()
+ORDER_BOOK = OrderBook()
 current_row_index = 0
+current_tick = 0  # monotonic, unlike current_row_index which wraps
 GLOBAL_TIMESTAMP = 0
-PRICE_UPDATE_INTERVAL = 15  # seconds
+PRICE_UPDATE_INTERVAL = 15  # seconds of market time per tick
+# A live feed ticks whenever a new tick arrives, so it replaces MOCK_TRADING_CLOCK
+MARKET_CLOCK = FeedClock(TICK_STORE) if LIVE_FEED else market_clock.clock_from_spec(
+    os.getenv("MOCK_TRADING_CLOCK"), PRICE_UPDATE_INTERVAL
+)
+market_clock.set_clock(MARKET_CLOCK)
+# With a shared clock several processes serve the same market; see market_state.py
+SHARED_MARKET = isinstance(MARKET_CLOCK, market_clock.SharedClock)
+is_matching_leader = not SHARED_MARKET
+_last_open_order_id = 0
+_last_transaction_id = 0
+MAX_BATCH_ORDERS = 100
+PORTFOLIO_CACHE = PortfolioCache()
+ANALYTICS = analytics.AnalyticsCache()
+LEADERBOARD = Leaderboard()
+# per-trade (default), grouped or async, see trade_journal.py
+DURABILITY = os.getenv("MOCK_TRADING_DURABILITY", "per-trade").strip().lower()
+TRADE_JOURNAL = None if DURABILITY == "per-trade" else TradeJournal(
+    os.getenv("MOCK_TRADING_JOURNAL") or os.path.join(app.instance_path, "trade-journal.log"),
+    DURABILITY, app.app_context
+)
+LEADERBOARD_RELOAD_TICKS = 20  # full reload from the DB, picks up writes from other processes
+MAX_LEADERBOARD_PAGE = 100
+MAX_TRANSACTIONS_PAGE = 500
+MAX_ORDERS_PAGE = 500
+RECENT_TRANSACTIONS = 20  # sent with a portfolio; older ones via /api/portfolio/transactions
+
+def market_now():
+    """
+    Returns (tick, row_index) to trade at. With a shared clock it comes
+    from the clock itself, so every process prices a trade the same way
+    even if its price thread has not yet woken for the new tick.
+    """
+    if SHARED_MARKET and MARKET_CLOCK.epoch is not None:
+        tick = MARKET_CLOCK.current_tick()
+        return tick, tick % max(len(TICK_STORE), 1)
+    return current_tick, current_row_index
 
-def read_stock_prices_from_csv():
-    global STOCK_PRICES
-    try:
-        with open("test.csv", newline="") as csvfile:
-            reader = csv.DictReader(csvfile)
-            STOCK_PRICES = [row for row in reader]
-    except FileNotFoundError:
-        print("Warning: test.csv not found. STOCK_PRICES will remain empty.")
+def execute_orders(user_id, orders, tick):
+    """
+    Executes [(side, symbol, quantity, price), ...] for a user,
+    all-or-nothing, and returns (new cash, [transaction dicts]): through
+    TRADE_JOURNAL when one is configured, otherwise in a transaction of
+    its own.
+    """
+    if TRADE_JOURNAL is not None:
+        return TRADE_JOURNAL.submit(user_id, orders, tick)
+    portfolio, transactions = execution.execute_batch(user_id, orders, tick)
+    return portfolio.cash, [transaction.to_dict() for transaction in transactions]
+
+def match_resting_orders():
+    """
+    Fills the resting limit/stop orders crossed by the current tick.
+    """
+    triggered = ORDER_BOOK.pop_triggered(TICK_STORE.row(current_row_index))
+    for order_id, user_id, symbol, price in triggered:
+        try:
+            execution.fill_resting_order(order_id, user_id, price, current_tick)
+        except Exception as e:
+            print(f"Error filling order {order_id}: {str(e)}")
+
+def load_leaderboard():
+    """
+    Rebuilds LEADERBOARD from the portfolios and holdings tables.
+    """
+    users = db.session.query(Portfolio.user_id, User.username, Portfolio.cash).join(
+        User, User.id == Portfolio.user_id
+    ).execution_options(yield_per=5000)
+    holdings = db.session.query(Holding.user_id, Holding.symbol, Holding.quantity).filter(
+        Holding.quantity > 0
+    ).execution_options(yield_per=5000)
+    LEADERBOARD.load(TICK_STORE.series.symbols, users, holdings)
+
+def refresh_leaderboard():
+    series = TICK_STORE.series
+    if len(series):
+        LEADERBOARD.refresh(series.symbols, series.prices[current_row_index % len(series)], current_tick)
+
+execution.on_commit(LEADERBOARD.update)
+execution.on_commit(lambda user_id, cash, quantities: PORTFOLIO_CACHE.invalidate(user_id))
+
+def sync_shared_market():
+    """
+    Shared clock only, called about once a second: renews or takes the
+    lease for matching resting orders, loads orders placed through other
+    processes into the book if this process leads, and drops cached
+    portfolios of users who traded through other processes.
+    """
+    global is_matching_leader, _last_open_order_id, _last_transaction_id
+    leader = market_state.hold_lease()
+    if leader and not is_matching_leader:
+        # Orders may have filled or been cancelled while another process led
+        ORDER_BOOK.clear()
+        _last_open_order_id = 0
+        print(f"Matching resting orders in this process ({market_state.OWNER})")
+    is_matching_leader = leader
+    if leader:
+        new_orders = Order.query.filter(
+            Order.status == "open", Order.id > _last_open_order_id
+        ).order_by(Order.id)
+        for order in new_orders:
+            ORDER_BOOK.add(order.id, order.user_id, order.symbol,
+                           order.side, order.type, order.trigger_price)
+            _last_open_order_id = order.id
+    new_trades = db.session.query(Transaction.id, Transaction.user_id).filter(
+        Transaction.id > _last_transaction_id
+    ).order_by(Transaction.id)
+    for transaction_id, user_id in new_trades:
+        PORTFOLIO_CACHE.invalidate(user_id)
+        _last_transaction_id = transaction_id
+    db.session.commit()
+
+def advance_market():
+    """
+    Moves the market to the row of prices for the clock's tick: publishes
+    it, fills the resting orders it crosses and re-ranks the leaderboard.
+    """
+    global current_row_index, current_tick, GLOBAL_TIMESTAMP
+    # Only re-parses the file when its mtime changed
+    TICK_STORE.refresh()
+    previous_tick, current_tick = current_tick, MARKET_CLOCK.tick
+    current_row_index = current_tick % len(TICK_STORE) if len(TICK_STORE) else 0
+    if SHARED_MARKET:
+        # Same timestamp, hence same ETag, from every process
+        GLOBAL_TIMESTAMP = MARKET_CLOCK.tick_time(current_tick)
+    else:
+        GLOBAL_TIMESTAMP = MARKET_CLOCK.time()
+    PRICE_BROADCASTER.publish(current_tick, {
+        "prices": TICK_STORE.row(current_row_index),
+        "timestamp": GLOBAL_TIMESTAMP
+    })
+    series = TICK_STORE.series
+    if len(series):
+        PRICE_SNAPSHOTS.publish(current_tick, GLOBAL_TIMESTAMP, series.symbols,
+                                series.prices[current_row_index % len(series)])
+    with app.app_context():
+        if is_matching_leader:
+            match_resting_orders()
+        # A shared clock can skip ticks, so compare periods, not remainders
+        if current_tick // LEADERBOARD_RELOAD_TICKS != previous_tick // LEADERBOARD_RELOAD_TICKS:
+            try:
+                load_leaderboard()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error reloading leaderboard: {str(e)}")
+    refresh_leaderboard()
 
 def update_stock_prices():
-    global current_row_index, GLOBAL_TIMESTAMP
     while True:
-        now = time.time()
-        if now - GLOBAL_TIMESTAMP >= PRICE_UPDATE_INTERVAL:
-            read_stock_prices_from_csv()
-            current_row_index += 1
-            if current_row_index >= len(STOCK_PRICES):
-                current_row_index = 0
-            GLOBAL_TIMESTAMP = now
-        time.sleep(1)
-
-# Start the background thread
-update_thread = threading.Thread(target=update_stock_prices, daemon=True)
-update_thread.start()
+        if not _db_ready:
+            with app.app_context():
+                init_database()
+        # Wakes at least once a second so a failed init is retried
+        ticked = MARKET_CLOCK.wait_for_tick(timeout=1)
+        if SHARED_MARKET and _db_ready:
+            with app.app_context():
+                try:
+                    sync_shared_market()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error syncing shared market state: {str(e)}")
+        if ticked:
+            started = time.perf_counter()
+            try:
+                advance_market()
+            except Exception as e:
+                print(f"Error advancing market: {str(e)}")
+            metrics.PRICE_TICK_SECONDS.observe(time.perf_counter() - started)
+
+def collect_app_metrics():
+    cache = PORTFOLIO_CACHE.stats()
+    return [
+        ("market_tick", "gauge", "Current tick (counted on from the last trade's, or from the shared epoch).", current_tick),
+        ("market_matching_leader", "gauge", "1 if this process matches resting orders.",
+         int(is_matching_leader)),
+        ("resting_orders", "gauge", "Open limit/stop orders in the book.", len(ORDER_BOOK)),
+        ("leaderboard_users", "gauge", "Users ranked on the leaderboard.", len(LEADERBOARD)),
+        ("portfolio_cache_entries", "gauge", "Portfolios in the cache.", cache["size"]),
+        ("analytics_curves", "gauge", "Equity curves in the analytics cache.", len(ANALYTICS)),
+        ("analytics_builds_total", "counter", "Equity curves built from the whole ledger.",
+         ANALYTICS.builds),
+        ("analytics_extensions_total", "counter", "Equity curves extended incrementally.",
+         ANALYTICS.extensions),
+        ("portfolio_cache_hits_total", "counter", "Portfolio cache hits.", cache["hits"]),
+        ("portfolio_cache_misses_total", "counter", "Portfolio cache misses.", cache["misses"]),
+        ("portfolio_cache_evictions_total", "counter", "Portfolio cache evictions.", cache["evictions"]),
+        ("password_pool_rejected_total", "counter", "Logins/registrations refused with 503.",
+         password_pool.rejected)
+    ]
+
+def collect_journal_metrics():
+    journal = TRADE_JOURNAL.stats()
+    return [
+        ("trade_journal_queued", "gauge", "Orders waiting for the journal applier.", journal["queued"]),
+        ("trade_journal_applied_seq", "gauge", "Last journal entry applied to the database.",
+         journal["applied_seq"]),
+        ("trade_journal_groups_total", "counter", "Groups of orders committed together.",
+         journal["groups"]),
+        ("trade_journal_entries_total", "counter", "Journal entries applied.", journal["entries"]),
+        ("trade_journal_fsyncs_total", "counter", "fsyncs of the journal file.", journal["fsyncs"]),
+        ("trade_journal_failed_total", "counter", "Journal entries given up after repeated errors.",
+         journal["failed"])
+    ]
+
+def collect_feed_metrics():
+    feed = TICK_STORE.stats()
+    samples = [
+        ("feed_ticks_ingested_total", "counter", "Ticks appended to the live feed.", feed["ingested"]),
+        ("feed_ticks_dropped_total", "counter", "Ticks overwritten before the market processed them.",
+         feed["dropped"]),
+        ("feed_batches_rejected_total", "counter", "Tick batches refused with 503 because of lag.",
+         feed["rejected"]),
+        ("feed_lag_ticks", "gauge", "Ticks ingested but not yet processed by the market.", feed["lag"]),
+        ("feed_ring_capacity", "gauge", "Ticks the live feed retains.", feed["capacity"])
+    ]
+    if FEED_TAIL is not None:
+        samples += [
+            ("feed_tail_bytes_total", "counter", "Bytes read from the tailed tick file.",
+             FEED_TAIL.bytes_read),
+            ("feed_tail_throttled_total", "counter", "Tail polls paused because of lag.",
+             feed["throttled"])
+        ]
+    return samples
+
+metrics.add_collector(collect_app_metrics)
+if TRADE_JOURNAL is not None:
+    metrics.add_collector(collect_journal_metrics)
+if LIVE_FEED:
+    metrics.add_collector(collect_feed_metrics)
 
 # =========================
 #  CREATE DB AT STARTUP
 # =========================
 
-@app.before_first_request
+_db_init_lock = threading.Lock()
+_db_ready = False
+
+def init_database():
+    """
+    Creates/upgrades the schema and loads resting orders into ORDER_BOOK.
+    Runs once, from whichever of the price thread or a request gets there
+    first; after a failure (e.g. another process holding the write lock
+    during startup) the next caller tries again.
+    """
+    global _db_ready, _last_transaction_id, current_tick, current_row_index
+    with _db_init_lock:
+        if _db_ready:
+            return
+        try:
+            upgrade_schema()
+            if TRADE_JOURNAL is not None:
+                # Before anything is loaded from the tables it may change
+                TRADE_JOURNAL.open()
+            if SHARED_MARKET:
+                market_state.attach(MARKET_CLOCK)
+                _last_transaction_id = db.session.query(db.func.max(Transaction.id)).scalar() or 0
+            if not SHARED_MARKET and FEED_TAIL is None:
+                # The clock counts ticks from startup, but trades keep theirs:
+                # carry on after the last one, so ticks never go backwards
+                # and analytics never sees one twice. (A shared clock's
+                # epoch is stored, and a tailed file numbers its own rows.)
+                last_tick = db.session.query(db.func.max(Transaction.tick)).scalar()
+                if last_tick is not None:
+                    MARKET_CLOCK.start_at(last_tick + 1)
+                    if current_tick <= last_tick:
+                        # For trades placed before that tick is processed
+                        current_tick = last_tick + 1
+                        current_row_index = current_tick % len(TICK_STORE) if len(TICK_STORE) else 0
+            if is_matching_leader:
+                # With a shared clock, sync_shared_market() loads them once this process leads
+                for order in Order.query.filter_by(status="open"):
+                    ORDER_BOOK.add(order.id, order.user_id, order.symbol,
+                                   order.side, order.type, order.trigger_price)
+            load_leaderboard()
+            refresh_leaderboard()
+            _db_ready = True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error initializing database: {str(e)}")
+
+@app.before_request
 def create_tables():
-    db.create_all()
+    if not _db_ready:
+        init_database()
+
+# Start the background thread (not in password_pool's worker processes,
+# which re-import the main script, and with it this module, on startup)
+if multiprocessing.parent_process() is None:
+    update_thread = threading.Thread(target=update_stock_prices, daemon=True)
+    update_thread.start()
+    if FEED_TAIL is not None:
+        FEED_TAIL.start()
 
 # =========================
 #  ROUTES
@@ -104,15 +532,168 @@ def create_tables():
 @app.route("/api/stock_prices", methods=["GET"])
 def get_stock_prices():
     """
-    Returns the current row of prices from test.csv
+    Returns the current row of prices from test.csv.
+    Query (all optional):
+      symbols=A,B,C   only these symbols; unknown ones are listed in "unknown"
+      since=<ts>      only prices that changed after the tick with timestamp
+                      <ts> (the client's last one); marked "delta": true. A
+                      full row comes back instead if that tick is too old.
+      format=binary   price_snapshot.py's binary encoding (or send
+                      Accept: application/vnd.mock-trading.prices)
+    Sends 304 when the client's If-None-Match matches the current tick.
     """
-    global STOCK_PRICES, current_row_index, GLOBAL_TIMESTAMP
-    if not STOCK_PRICES:
+    snapshot = PRICE_SNAPSHOTS.latest()
+    if snapshot is None:
         return jsonify({"prices": {}, "timestamp": GLOBAL_TIMESTAMP}), 200
-    return jsonify({
-        "prices": STOCK_PRICES[current_row_index],
-        "timestamp": GLOBAL_TIMESTAMP
-    }), 200
+
+    binary = (request.args.get("format") == "binary"
+              or request.accept_mimetypes.best == BINARY_MIMETYPE)
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            since = float(since)
+        except ValueError:
+            return jsonify({"error": "since must be a timestamp."}), 400
+        changed = PRICE_SNAPSHOTS.changed_since(snapshot, since)
+        if changed is None:
+            since = None  # too far back for a delta
+
+    symbols = request.args.get("symbols")
+    unknown = []
+    if symbols:
+        columns = []
+        for symbol in symbols.split(","):
+            column = snapshot.columns.get(symbol)
+            if column is None:
+                unknown.append(symbol)
+            else:
+                columns.append(column)
+        columns = np.array(columns, dtype=np.uint32)
+        if since is not None:
+            columns = np.intersect1d(columns, changed)
+        if binary:
+            body = snapshot.encode_binary(columns, delta=since is not None)
+        else:
+            body = snapshot.encode_json(columns, since, unknown)
+    elif since is None:
+        body = snapshot.full_binary if binary else snapshot.full_json
+    elif changed is snapshot.changed:
+        # The usual poll, one tick behind: encoded at publish time
+        body = snapshot.delta_binary if binary else snapshot.delta_json
+    else:
+        body = (snapshot.encode_binary(changed, delta=True) if binary
+                else snapshot.encode_json(changed, since))
+
+    response = Response(body, mimetype=BINARY_MIMETYPE if binary else "application/json")
+    response.set_etag(str(snapshot.timestamp))
+    response.vary.add("Accept")
+    return response.make_conditional(request)
+
+@app.route("/api/stock_prices/symbols", methods=["GET"])
+def get_price_symbols():
+    """
+    The symbol list that binary price snapshots index into, and its
+    layout id (the one in their header).
+    """
+    snapshot = PRICE_SNAPSHOTS.latest()
+    if snapshot is None:
+        return jsonify({"symbols": [], "layout": None}), 200
+    response = jsonify({"symbols": snapshot.symbols, "layout": snapshot.layout})
+    response.set_etag(str(snapshot.layout))
+    return response.make_conditional(request)
+
+@app.route("/api/stock_prices/history", methods=["GET"])
+def get_price_history():
+    """
+    Returns OHLC bars of one symbol for rows [from, to) of the price
+    series, up to the current row. Long ranges come back at a coarser
+    resolution than requested, at most MAX_POINTS bars.
+    Query: ?symbol=...&from=<row>&to=<row>&resolution=<ticks per bar>
+    """
+    series = TICK_STORE.series
+    if not len(series) or series.candles is None:
+        return jsonify({"error": "No stock price data available."}), 400
+    symbol = request.args.get("symbol")
+    column = series.columns.get(symbol)
+    if column is None:
+        return jsonify({"error": "Unknown stock symbol."}), 400
+
+    # Rows after the current one are future prices; a live series is
+    # indexed by tick instead of row
+    tick, row_index = market_now()
+    revealed = (tick if series.live else row_index % len(series)) + 1
+    try:
+        end = min(int(request.args.get("to", revealed)), revealed)
+        start = int(request.args.get("from", end - MAX_POINTS))
+        resolution = int(request.args.get("resolution", 1))
+    except ValueError:
+        return jsonify({"error": "from, to and resolution must be integers."}), 400
+    if resolution <= 0:
+        return jsonify({"error": "Resolution must be greater than zero."}), 400
+
+    resolution, bars = series.candles.query(column, start, end, resolution, MAX_POINTS)
+    bars.update({"symbol": symbol, "resolution": resolution})
+    return jsonify(bars), 200
+
+@app.route("/api/stock_prices/stream", methods=["GET"])
+def stream_stock_prices():
+    """
+    Server-Sent Events stream of price ticks. Reconnecting clients send
+    Last-Event-ID and get the ticks they missed.
+    """
+    last_event_id = parse_last_event_id(
+        request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    )
+    return Response(
+        PRICE_BROADCASTER.subscribe(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def pool_busy_response(error):
+    response = jsonify({"message": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+# ---------- TICK INGESTION (Admin) ----------
+@app.route("/api/ticks", methods=["POST"])
+def ingest_ticks():
+    """
+    Appends a batch of ticks to the live feed (MOCK_TRADING_FEED=api).
+    Authenticated with MOCK_TRADING_ADMIN_TOKEN, sent as
+    "Authorization: Bearer <token>" or X-Admin-Token.
+    Body: {"symbols": [...], "prices": [[...], ...], "timestamps": [...]}
+    with one row of prices per tick, in symbol order; null keeps a
+    symbol's previous price. timestamps (optional) are Unix seconds.
+    Sends 503 with Retry-After while the market is too far behind.
+    """
+    token = request.headers.get("X-Admin-Token", "")
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"message": "Admin token required."}), 403
+    if not LIVE_FEED:
+        return jsonify({"message": "Prices come from a file; start with MOCK_TRADING_FEED=api."}), 409
+
+    data = request.get_json(silent=True) or {}
+    symbols = data.get("symbols")
+    prices = data.get("prices")
+    timestamps = data.get("timestamps")
+    if not isinstance(symbols, list) or not isinstance(prices, list) or not prices:
+        return jsonify({"message": "symbols and prices are required."}), 400
+    if timestamps is not None and (not isinstance(timestamps, list) or len(timestamps) != len(prices)):
+        return jsonify({"message": "timestamps must have one entry per row of prices."}), 400
+    try:
+        rows = np.array([[np.nan if price is None else price for price in row] for row in prices],
+                        dtype=float)
+        first, last = TICK_STORE.append(symbols, rows, timestamps)
+    except FeedBusy as e:
+        return pool_busy_response(e)
+    except (TypeError, ValueError) as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"first_tick": first, "last_tick": last, "lag": TICK_STORE.lag()}), 200
 
 # ---------- REGISTER ----------
 @app.route("/api/register", methods=["POST"])
@@ -133,16 +714,29 @@ def register():
         return jsonify({"message": "Email already exists"}), 409
     if User.query.filter_by(username=username).first():
         return jsonify({"message": "Username already exists"}), 409
-
-    hashed_password = generate_password_hash(password, method="pbkdf2:sha256")
-    new_user = User(username=username, email=email, password=hashed_password)
-    db.session.add(new_user)
+    # Don't hold the read transaction open while the pool works
     db.session.commit()
 
-    # Create a portfolio for the new user
-    new_portfolio = Portfolio(user_id=new_user.id)
-    db.session.add(new_portfolio)
-    db.session.commit()
+    try:
+        hashed_password = password_pool.hash_password(password)
+    except password_pool.PoolBusy as e:
+        return pool_busy_response(e)
+
+    # User and portfolio in one write transaction, taking the write lock
+    # up front (see execution.py)
+    try:
+        db.session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+        new_user = User(username=username, email=email, password=hashed_password)
+        db.session.add(new_user)
+        db.session.flush()
+        new_portfolio = Portfolio(user_id=new_user.id)
+        db.session.add(new_portfolio)
+        db.session.commit()
+    except IntegrityError:
+        # Same email/username registered concurrently
+        db.session.rollback()
+        return jsonify({"message": "Email or username already exists"}), 409
+    LEADERBOARD.update(new_user.id, new_portfolio.cash, {}, username)
 
     # Return a JWT (cast user.id to string to avoid "Subject must be a string")
     access_token = create_access_token(identity=str(new_user.id))
@@ -166,11 +760,19 @@ def login():
         return jsonify({"message": "Missing email or password"}), 400
 
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password, password):
+    if not user:
         return jsonify({"message": "Invalid credentials"}), 401
+    # Don't hold the read transaction open while the pool works
+    user_id, password_hash = user.id, user.password
+    db.session.commit()
+    try:
+        if not password_pool.verify_password(password_hash, password):
+            return jsonify({"message": "Invalid credentials"}), 401
+    except password_pool.PoolBusy as e:
+        return pool_busy_response(e)
 
     # Return a JWT (cast user.id to string)
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_access_token(identity=str(user_id))
     return jsonify({"access_token": access_token}), 200
 
 # ---------- PORTFOLIO (Protected) ----------
@@ -178,32 +780,90 @@ def login():
 @jwt_required()
 def get_portfolio():
     """
-    Returns the logged-in user's portfolio.
+    Returns the logged-in user's portfolio. Served from PORTFOLIO_CACHE,
+    so it only touches the database after the user traded; the ETag
+    changes with the portfolio version and the price tick. Only the
+    latest RECENT_TRANSACTIONS transactions are included; pass
+    transactions_cursor to /api/portfolio/transactions for older ones.
     """
     try:
         user_id_str = get_jwt_identity()  # This will be a string
         user_id = int(user_id_str)        # Convert back to int if needed
 
-        portfolio = Portfolio.query.filter_by(user_id=user_id).first()
-        if not portfolio:
+        entry = PORTFOLIO_CACHE.get(user_id, load_cached_portfolio)
+        if entry is None:
             return jsonify({"error": "Portfolio not found"}), 404
 
-        stocks = json.loads(portfolio.stocks) if portfolio.stocks else {}
-        stock_purchases = json.loads(portfolio.stock_purchases) if portfolio.stock_purchases else {}
-        transactions = json.loads(portfolio.transactions) if portfolio.transactions else []
-
-        response_data = {
-            "cash": portfolio.cash,
-            "stocks": stocks,
-            "stock_purchases": stock_purchases,
-            "transactions": transactions
-        }
-        return jsonify(response_data), 200
+        tick, row_index = market_now()
+        rendered = entry.rendered
+        if rendered is None or rendered[0] != tick:
+            stocks, positions = value_holdings(entry.holdings, row_index)
+            rendered = (tick, app.json.dumps({
+                "cash": entry.cash,
+                "stocks": stocks,
+                "stock_purchases": entry.stock_purchases,
+                "positions": positions,
+                "realized_pnl": sum(p["realized_pnl"] for p in positions.values()),
+                "unrealized_pnl": sum(p.get("unrealized_pnl", 0.0) for p in positions.values()),
+                "transactions": entry.transactions,
+                "transactions_cursor": entry.transactions_cursor
+            }))
+            entry.rendered = rendered
+        return cached_response(rendered[1], f"{user_id}-{entry.version}-{tick}")
 
     except Exception as e:
         print(f"Error fetching portfolio: {str(e)}")
         return jsonify({"error": "Internal Server Error"}), 500
 
+# ---------- TRANSACTION HISTORY (Protected) ----------
+@app.route("/api/portfolio/transactions", methods=["GET"])
+@jwt_required()
+def get_transactions():
+    """
+    Pages through the logged-in user's transactions, newest first.
+    Query: ?limit=<1..MAX_TRANSACTIONS_PAGE>&cursor=<next_cursor of the previous page>
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), MAX_TRANSACTIONS_PAGE)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers."}), 400
+
+    transactions, next_cursor = load_transaction_page(user_id, cursor, limit)
+    db.session.commit()
+    return jsonify({"transactions": transactions, "next_cursor": next_cursor}), 200
+
+# ---------- PORTFOLIO ANALYTICS (Protected) ----------
+@app.route("/api/portfolio/analytics", methods=["GET"])
+@jwt_required()
+def get_portfolio_analytics():
+    """
+    Equity curve, drawdown, rolling volatility and rolling Sharpe ratio
+    over the last analytics.ANALYTICS_TICKS ticks, sampled at up to
+    `points` ticks, plus summary figures (see analytics.py).
+    Query: ?points=<at most MAX_POINTS, the default>
+    """
+    user_id = int(get_jwt_identity())
+    series = TICK_STORE.series
+    if not len(series):
+        return jsonify({"error": "No stock price data available."}), 400
+    try:
+        points = min(max(int(request.args.get("points", MAX_POINTS)), 1), MAX_POINTS)
+    except ValueError:
+        return jsonify({"error": "points must be an integer."}), 400
+
+    curve = ANALYTICS.curve(user_id, series, market_now()[0], load_analytics_trades)
+    if curve is None:
+        return jsonify({"error": "Portfolio not found"}), 404
+    with curve.lock:
+        key = (curve.last_tick, curve.last_transaction_id, points)
+        if curve.rendered is None or curve.rendered[0] != key:
+            curve.rendered = (key, app.json.dumps(analytics.render(curve, points)))
+        body = curve.rendered[1]
+    return cached_response(body, "-".join(str(part) for part in (user_id,) + key))
+
 # ---------- BUY STOCK (Protected) ----------
 @app.route("/api/buy", methods=["POST"])
 @jwt_required()
@@ -211,6 +871,7 @@ def buy_stock():
     """
     Buys the given quantity of a stock for the logged-in user.
     Body: { "symbol": "...", "quantity": <int> }
+    Query: ?full=1 to get the whole portfolio back (see trade_response)
     """
     try:
         data = request.get_json()
@@ -221,61 +882,23 @@ def buy_stock():
         if quantity <= 0:
             return jsonify({"error": "Quantity must be greater than zero."}), 400
 
-        portfolio = Portfolio.query.filter_by(user_id=user_id).first()
-        if not portfolio:
-            return jsonify({"error": "Portfolio not found."}), 404
-
-        # Load JSON data
-        stocks = json.loads(portfolio.stocks)
-        stock_purchases = json.loads(portfolio.stock_purchases)
-        transactions = json.loads(portfolio.transactions)
-
         # Get the current stock price from CSV
-        if not STOCK_PRICES:
+        if not len(TICK_STORE):
             return jsonify({"error": "No stock price data available."}), 400
-        current_prices = STOCK_PRICES[current_row_index]
-        stock_price = float(current_prices.get(symbol, 0))
-
-        total_cost = quantity * stock_price
-        if portfolio.cash < total_cost:
-            return jsonify({"error": "Insufficient funds to buy stock."}), 400
-
-        # Update portfolio
-        portfolio.cash -= total_cost
-        stocks[symbol] = stocks.get(symbol, 0) + quantity
-
-        # Update stock_purchases
-        if symbol not in stock_purchases:
-            stock_purchases[symbol] = []
-        stock_purchases[symbol].append({
-            "quantity": quantity,
-            "price": stock_price
-        })
+        tick, row_index = market_now()
+        stock_price = TICK_STORE.price(row_index, symbol)
+        if stock_price is None:
+            return jsonify({"error": "Unknown stock symbol."}), 400
 
-        # Record the transaction
-        transaction = {
-            "type": "buy",
-            "symbol": symbol,
-            "quantity": quantity,
-            "price": stock_price,
-            "timestamp": time.time()
-        }
-        transactions.append(transaction)
-
-        # Save updates
-        portfolio.stocks = json.dumps(stocks)
-        portfolio.stock_purchases = json.dumps(stock_purchases)
-        portfolio.transactions = json.dumps(transactions)
-        db.session.commit()
+        try:
+            balance, transactions = execute_orders(
+                user_id, [("buy", symbol, quantity, stock_price)], tick
+            )
+        except OrderError as e:
+            return jsonify({"error": e.message}), e.status
 
-        return jsonify({
-            "message": "Stock bought successfully.",
-            "balance": portfolio.cash,
-            "stocks": stocks,
-            "stock_purchases": stock_purchases,
-            "price": stock_price,
-            "transactions": transactions
-        }), 200
+        return trade_response("Stock bought successfully.", user_id, symbol, stock_price,
+                              balance, transactions[0])
 
     except Exception as e:
         print(f"Error in buy_stock endpoint: {str(e)}")
@@ -288,6 +911,7 @@ def sell_stock():
     """
     Sells the given quantity of a stock for the logged-in user.
     Body: { "symbol": "...", "quantity": <int> }
+    Query: ?full=1 to get the whole portfolio back (see trade_response)
     """
     try:
         data = request.get_json()
@@ -306,76 +930,226 @@ def sell_stock():
         if quantity <= 0:
             return jsonify({"message": "Quantity must be greater than zero."}), 400
 
-        portfolio = Portfolio.query.filter_by(user_id=user_id).first()
-        if not portfolio:
-            return jsonify({"message": "Portfolio not found."}), 404
+        if not len(TICK_STORE):
+            return jsonify({"error": "No stock price data available."}), 400
+        tick, row_index = market_now()
+        stock_price = TICK_STORE.price(row_index, symbol)
+        if stock_price is None:
+            return jsonify({"error": "Unknown stock symbol."}), 400
 
-        # Load JSON data
-        stocks = json.loads(portfolio.stocks)
-        stock_purchases = json.loads(portfolio.stock_purchases)
-        transactions = json.loads(portfolio.transactions)
+        try:
+            balance, transactions = execute_orders(
+                user_id, [("sell", symbol, quantity, stock_price)], tick
+            )
+        except OrderError as e:
+            return jsonify({"message": e.message}), e.status
 
-        if symbol not in stocks or stocks[symbol] < quantity:
-            return jsonify({"message": "Insufficient stocks to sell."}), 400
+        return trade_response("Stock sold successfully.", user_id, symbol, stock_price,
+                              balance, transactions[0])
 
-        if not STOCK_PRICES:
+    except Exception as e:
+        print(f"Error in sell_stock endpoint: {str(e)}")
+        return jsonify({"message": f"Internal Server Error: {str(e)}"}), 500
+
+# ---------- BATCH ORDERS (Protected) ----------
+@app.route("/api/orders/batch", methods=["POST"])
+@jwt_required()
+def batch_orders():
+    """
+    Executes several buys/sells for the logged-in user in one transaction.
+    Every order is priced against the same tick, and either all of them
+    are filled or none is.
+    Body: { "orders": [ { "side": "buy"|"sell", "symbol": "...", "quantity": <int> }, ... ] }
+    """
+    try:
+        data = request.get_json()
+        user_id = int(get_jwt_identity())
+        orders = data.get("orders") if isinstance(data, dict) else data
+
+        if not isinstance(orders, list) or not orders:
+            return jsonify({"error": "A non-empty list of orders is required."}), 400
+        if len(orders) > MAX_BATCH_ORDERS:
+            return jsonify({"error": f"At most {MAX_BATCH_ORDERS} orders per batch."}), 400
+
+        # One snapshot of the market for the whole batch
+        series = TICK_STORE.series
+        if not len(series):
             return jsonify({"error": "No stock price data available."}), 400
-        current_prices = STOCK_PRICES[current_row_index]
-        stock_price = float(current_prices.get(symbol, 0))
-
-        total_gain = quantity * stock_price
-        remaining_quantity = quantity
-        updated_purchases = []
-
-        # FIFO logic for removing shares from earliest purchase
-        for purchase in stock_purchases.get(symbol, []):
-            if remaining_quantity == 0:
-                updated_purchases.append(purchase)
-            elif purchase["quantity"] <= remaining_quantity:
-                total_gain += purchase["quantity"] * (stock_price - purchase["price"])
-                remaining_quantity -= purchase["quantity"]
-            else:
-                total_gain += remaining_quantity * (stock_price - purchase["price"])
-                purchase["quantity"] -= remaining_quantity
-                updated_purchases.append(purchase)
-                remaining_quantity = 0
-
-        # Update portfolio
-        portfolio.cash += total_gain
-        stocks[symbol] -= quantity
-        if stocks[symbol] == 0:
-            del stocks[symbol]
-            del stock_purchases[symbol]
-        else:
-            stock_purchases[symbol] = updated_purchases
-
-        # Record the transaction
-        transaction = {
-            "type": "sell",
-            "symbol": symbol,
-            "quantity": quantity,
-            "price": stock_price,
-            "timestamp": time.time()
-        }
-        transactions.append(transaction)
-
-        portfolio.stocks = json.dumps(stocks)
-        portfolio.stock_purchases = json.dumps(stock_purchases)
-        portfolio.transactions = json.dumps(transactions)
-        db.session.commit()
+        tick, row_index = market_now()
+        prices = series.prices[row_index % len(series)]
+
+        parsed = []
+        for index, order in enumerate(orders):
+            try:
+                side = order["side"]
+                symbol = order["symbol"]
+                quantity = int(order["quantity"])
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"error": "Each order needs side, symbol and an integer quantity.",
+                                "index": index}), 400
+            if side not in ("buy", "sell"):
+                return jsonify({"error": "Side must be buy or sell.", "index": index}), 400
+            if quantity <= 0:
+                return jsonify({"error": "Quantity must be greater than zero.", "index": index}), 400
+            column = series.columns.get(symbol)
+            if column is None:
+                return jsonify({"error": "Unknown stock symbol.", "index": index}), 400
+            parsed.append((side, symbol, quantity, float(prices[column])))
+
+        try:
+            balance, _ = execute_orders(user_id, parsed, tick)
+        except OrderError as e:
+            return jsonify({"error": e.message, "index": e.index}), e.status
 
         return jsonify({
-            "message": "Stock sold successfully.",
-            "balance": portfolio.cash,
-            "stocks": stocks,
-            "stock_purchases": stock_purchases,
-            "price": stock_price,
-            "transactions": transactions
+            "message": "Orders executed successfully.",
+            "balance": balance,
+            "results": [
+                {"side": side, "symbol": symbol, "quantity": quantity, "price": price}
+                for side, symbol, quantity, price in parsed
+            ]
         }), 200
 
     except Exception as e:
-        print(f"Error in sell_stock endpoint: {str(e)}")
-        return jsonify({"message": f"Internal Server Error: {str(e)}"}), 500
+        print(f"Error in batch_orders endpoint: {str(e)}")
+        return jsonify({"error": "Internal Server Error."}), 500
+
+# ---------- LIMIT / STOP ORDERS (Protected) ----------
+@app.route("/api/orders", methods=["POST"])
+@jwt_required()
+def place_order():
+    """
+    Places a resting limit or stop order for the logged-in user. It is
+    checked on every price tick and filled at the price of the tick that
+    crosses it.
+    Body: { "side": "buy"|"sell", "type": "limit"|"stop", "symbol": "...",
+            "quantity": <int>, "price": <float> }
+    """
+    try:
+        data = request.get_json()
+        user_id = int(get_jwt_identity())
+        side = data.get("side")
+        order_type = data.get("type")
+        symbol = data.get("symbol")
+
+        if side not in ORDER_SIDES:
+            return jsonify({"error": "Side must be buy or sell."}), 400
+        if order_type not in ORDER_TYPES:
+            return jsonify({"error": "Type must be limit or stop."}), 400
+        try:
+            quantity = int(data.get("quantity"))
+            trigger_price = float(data.get("price"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Quantity must be an integer and price a number."}), 400
+        if quantity <= 0 or trigger_price <= 0:
+            return jsonify({"error": "Quantity and price must be greater than zero."}), 400
+        if symbol not in TICK_STORE.series.columns:
+            return jsonify({"error": "Unknown stock symbol."}), 400
+
+        order = Order(
+            user_id=user_id,
+            side=side,
+            type=order_type,
+            symbol=symbol,
+            quantity=quantity,
+            trigger_price=trigger_price,
+            status="open",
+            created_at=market_clock.now()
+        )
+        db.session.add(order)
+        db.session.commit()
+        if is_matching_leader:
+            # Otherwise the leader picks it up in sync_shared_market()
+            ORDER_BOOK.add(order.id, user_id, symbol, side, order_type, trigger_price)
+
+        return jsonify(order.to_dict()), 201
+
+    except Exception as e:
+        print(f"Error in place_order endpoint: {str(e)}")
+        return jsonify({"error": "Internal Server Error."}), 500
+
+@app.route("/api/orders", methods=["GET"])
+@jwt_required()
+def list_orders():
+    """
+    Pages through the logged-in user's limit/stop orders, newest first.
+    Query: ?status=open|filled|cancelled|rejected
+           &limit=<1..MAX_ORDERS_PAGE>&cursor=<next_cursor of the previous page>
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), MAX_ORDERS_PAGE)
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers."}), 400
+
+    query = Order.query.filter_by(user_id=user_id)
+    status = request.args.get("status")
+    if status:
+        query = query.filter_by(status=status)
+    if cursor is not None:
+        query = query.filter(Order.id < cursor)
+    page = query.order_by(Order.id.desc()).limit(limit + 1).all()
+    db.session.commit()
+    orders = [order.to_dict() for order in page[:limit]]
+    return jsonify({
+        "orders": orders,
+        "next_cursor": orders[-1]["id"] if len(page) > limit else None
+    }), 200
+
+@app.route("/api/orders/<int:order_id>", methods=["DELETE"])
+@jwt_required()
+def cancel_order(order_id):
+    """
+    Cancels one of the logged-in user's open orders.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        # Conditional update, so a cancel can never undo a fill
+        cancelled = Order.query.filter_by(
+            id=order_id, user_id=user_id, status="open"
+        ).update({"status": "cancelled"})
+        db.session.commit()
+
+        if not cancelled:
+            order = Order.query.filter_by(id=order_id, user_id=user_id).first()
+            if not order:
+                return jsonify({"error": "Order not found."}), 404
+            return jsonify({"error": f"Order is already {order.status}."}), 409
+
+        ORDER_BOOK.cancel(order_id)
+        return jsonify({"message": "Order cancelled.", "id": order_id}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in cancel_order endpoint: {str(e)}")
+        return jsonify({"error": "Internal Server Error."}), 500
+
+# ---------- LEADERBOARD ----------
+@app.route("/api/leaderboard", methods=["GET"])
+@jwt_required(optional=True)
+def get_leaderboard():
+    """
+    Returns one page of users ranked by total equity (cash + holdings at
+    the current tick), plus the caller's own rank when logged in.
+    Query: ?offset=<int>&limit=<int>
+    """
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = min(max(int(request.args.get("limit", 20)), 1), MAX_LEADERBOARD_PAGE)
+    except ValueError:
+        return jsonify({"error": "Offset and limit must be integers."}), 400
+
+    ranking = LEADERBOARD.ranking
+    identity = get_jwt_identity()
+    return jsonify({
+        "tick": ranking.tick,
+        "total": len(ranking),
+        "offset": offset,
+        "entries": ranking.page(offset, limit),
+        "me": ranking.lookup(int(identity)) if identity else None
+    }), 200
 
 # ---------- TIMESTAMP (Unprotected) ----------
 @app.route("/api/current_timestamp", methods=["GET"])
@@ -390,16 +1164,19 @@ def get_current_timestamp():
 @app.route("/api/portfolio/<int:user_id>", methods=["GET"])
 def get_user_portfolio(user_id):
     """
-    Returns the portfolio for a given user_id.
+    Returns the portfolio for a given user_id, from PORTFOLIO_CACHE.
     """
-    portfolio = Portfolio.query.filter_by(user_id=user_id).first()
-    if not portfolio:
+    entry = PORTFOLIO_CACHE.get(user_id, load_cached_portfolio)
+    if entry is None:
         return jsonify({"error": "User not found."}), 404
-    return jsonify({
-        "cash": portfolio.cash,
-        "stocks": portfolio.stocks,
-        "transactions": portfolio.transactions
-    }), 200
+    if entry.public_body is None:
+        entry.public_body = app.json.dumps({
+            "cash": entry.cash,
+            "stocks": {symbol: quantity for symbol, quantity, _, _ in entry.holdings if quantity > 0},
+            "transactions": entry.transactions,
+            "transactions_cursor": entry.transactions_cursor
+        })
+    return cached_response(entry.public_body, f"{user_id}-{entry.version}")
 
 # =========================
 #  MAIN
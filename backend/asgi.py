@@ -0,0 +1,263 @@
+"""
+asgi.py - asyncio serving mode for app.py.
+
+Threaded WSGI servers (including app.run()) hold one thread per open
+connection, so idle price subscribers are capped by the thread count.
+Here /api/stock_prices/stream is served on the event loop instead: the
+price thread hands each PriceEvent to the loop, which wakes every
+subscriber through one shared future, so an idle subscriber costs a
+coroutine and a socket. Every other route runs in the Flask app on a
+thread pool (ASGI_WSGI_THREADS), so SQLAlchemy queries and password
+hashing never block the loop.
+
+`application` is a plain ASGI 3 app for any ASGI server;
+`python asgi.py [--host H] [--port P]` serves it with uvicorn, the same
+as `uvicorn asgi:application`.
+Run one process per market, or several with MOCK_TRADING_CLOCK=shared.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as trading
+import metrics
+from price_stream import KEEPALIVE_INTERVAL, parse_last_event_id
+
+STREAM_PATH = "/api/stock_prices/stream"
+STREAM_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+    (b"access-control-allow-origin", b"*"),
+]
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 32))
+SHUTDOWN_TIMEOUT = 2  # seconds
+
+EXECUTOR = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+
+# =========================
+#  PRICE BROADCAST
+# =========================
+
+class TickBroadcast:
+    """
+    Wakes every subscriber coroutine once per price event. Subscribers
+    all await the same future, which is replaced on each publish. When no
+    price event arrived for `keepalive` seconds a None is published, so
+    idle streams can send a keepalive without a timer each.
+    """
+
+    def __init__(self, keepalive=KEEPALIVE_INTERVAL):
+        self.keepalive = keepalive
+        self.loop = None
+        self.subscribers = 0
+        self._next = None
+        self._last_publish = 0.0
+
+    def attach(self, loop):
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self._next = loop.create_future()
+        self._last_publish = loop.time()
+        loop.create_task(self._keepalive())
+
+    def publish_threadsafe(self, event):
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._publish, event)
+
+    def next(self):
+        # Shielded: a cancelled subscriber must not cancel everyone's future
+        return asyncio.shield(self._next)
+
+    def _publish(self, event):
+        future, self._next = self._next, self.loop.create_future()
+        self._last_publish = self.loop.time()
+        future.set_result(event)
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive - (self.loop.time() - self._last_publish))
+            if self.loop.time() - self._last_publish >= self.keepalive:
+                self._publish(None)
+
+
+BROADCAST = TickBroadcast()
+trading.PRICE_BROADCASTER.add_listener(BROADCAST.publish_threadsafe)
+
+metrics.add_collector(lambda: [
+    ("asgi_stream_subscribers", "gauge", "Open price streams on the event loop.",
+     BROADCAST.subscribers)
+])
+
+
+async def stream_prices(scope, receive, send):
+    """
+    The asyncio version of app.stream_stock_prices: same frames, same
+    Last-Event-ID resume.
+    """
+    headers = dict(scope["headers"])
+    query = parse_qs(scope["query_string"].decode("latin1"))
+    last_id = parse_last_event_id(
+        headers.get(b"last-event-id", b"").decode("latin1") or query.get("last_event_id", [None])[0]
+    )
+    handler = asyncio.current_task()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        handler.cancel()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    BROADCAST.subscribers += 1
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": STREAM_HEADERS})
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while True:
+            events = trading.PRICE_BROADCASTER.events_after(last_id)
+            if events:
+                body = b"".join(event.frame_bytes for event in events)
+                last_id = events[-1].id
+            else:
+                event = await BROADCAST.next()
+                if event is None:
+                    body = b": keepalive\n\n"
+                elif last_id is not None and event.id == last_id + 1:
+                    # The common case: no lock, no scan of the history
+                    body = event.frame_bytes
+                    last_id = event.id
+                else:
+                    continue
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    except asyncio.CancelledError:
+        pass  # the client went away
+    finally:
+        BROADCAST.subscribers -= 1
+        watcher.cancel()
+
+# =========================
+#  WSGI DELEGATION
+# =========================
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0] if client else "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin1"), value.decode("latin1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def run_wsgi(environ):
+    """
+    Runs one request through the Flask app on an executor thread and
+    returns (status, headers, body). Bodies are buffered, which is fine
+    for every route except the stream, which never gets here.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    result = trading.app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    status, headers = started
+    return (int(status.split(" ", 1)[0]),
+            [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers],
+            body)
+
+
+async def call_wsgi(scope, receive, send):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    environ = build_environ(scope, b"".join(chunks))
+    status, headers, body = await asyncio.get_running_loop().run_in_executor(
+        EXECUTOR, run_wsgi, environ
+    )
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            BROADCAST.attach(asyncio.get_running_loop())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    # For servers that skip the lifespan protocol
+    BROADCAST.attach(asyncio.get_running_loop())
+    if scope["path"] == STREAM_PATH and scope["method"] == "GET":
+        await stream_prices(scope, receive, send)
+    else:
+        await call_wsgi(scope, receive, send)
+
+# =========================
+#  SERVER
+# =========================
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    print(f"Serving on http://{args.host}:{args.port} (uvicorn, {WSGI_THREADS} WSGI threads)")
+    # Price streams never end on their own, so do not wait long for them on shutdown
+    uvicorn.run(application, host=args.host, port=args.port, backlog=4096,
+                lifespan="on", access_log=False, timeout_graceful_shutdown=SHUTDOWN_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+backtest.py - Runs a trading strategy over a whole price series as fast
+as the CPU allows, with no server, database or wall clock involved.
+
+Orders follow the rules of /api/buy and /api/sell: market orders fill at
+the current row's price, a buy needs enough cash, a sell needs enough
+shares, and shares are sold FIFO by lot (lot_ledger.LotLedger, the same
+accounting execution.apply_sell does). Trades are timestamped by a
+ManualClock that advances PRICE_UPDATE_INTERVAL market seconds per row.
+
+A strategy is a callable strategy(account, index, prices) called once per
+row, where `prices` is the row as a NumPy array aligned with
+account.symbols. It places orders with account.buy() / account.sell(),
+which raise execution.OrderError when the order would be rejected.
+
+Usage (from backend/):
+    python backtest.py --series test.csv
+    python backtest.py mystrategies:momentum --series big.ticks --cash 50000
+"""
+
+import argparse
+import importlib
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from execution import OrderError
+from lot_ledger import LotLedger
+from market_clock import ManualClock
+from tick_store import load_series
+
+STARTING_CASH = 10000.0
+PRICE_UPDATE_INTERVAL = 15
+
+
+class BacktestAccount:
+    def __init__(self, series, cash=STARTING_CASH, clock=None):
+        self.symbols = series.symbols
+        self.columns = series.columns
+        self.cash = cash
+        self.ledgers = defaultdict(LotLedger)
+        self.clock = clock or ManualClock(PRICE_UPDATE_INTERVAL, start=0.0)
+        self.prices = None
+        self.transactions = []  # (type, symbol, quantity, price, timestamp)
+        self.rejected = 0
+
+    def price(self, symbol):
+        column = self.columns.get(symbol)
+        if column is None:
+            self._reject("Unknown stock symbol.")
+        return float(self.prices[column])
+
+    def buy(self, symbol, quantity):
+        quantity = self._check_quantity(quantity)
+        price = self.price(symbol)
+        total_cost = quantity * price
+        if self.cash < total_cost:
+            self._reject("Insufficient funds to buy stock.")
+        self.cash -= total_cost
+        self.ledgers[symbol].buy(quantity, price)
+        self.transactions.append(("buy", symbol, quantity, price, self.clock.time()))
+
+    def sell(self, symbol, quantity):
+        quantity = self._check_quantity(quantity)
+        price = self.price(symbol)
+        ledger = self.ledgers.get(symbol)
+        if ledger is None or ledger.quantity < quantity:
+            self._reject("Insufficient stocks to sell.")
+        ledger.sell(quantity, price)
+        self.cash += quantity * price
+        self.transactions.append(("sell", symbol, quantity, price, self.clock.time()))
+
+    def holding(self, symbol):
+        ledger = self.ledgers.get(symbol)
+        return ledger.quantity if ledger else 0
+
+    def equity(self):
+        return self.cash + sum(
+            ledger.quantity * float(self.prices[self.columns[symbol]])
+            for symbol, ledger in self.ledgers.items()
+        )
+
+    def _check_quantity(self, quantity):
+        quantity = int(quantity)
+        if quantity <= 0:
+            self._reject("Quantity must be greater than zero.")
+        return quantity
+
+    def _reject(self, message):
+        self.rejected += 1
+        raise OrderError(message)
+
+
+def run_backtest(series, strategy, cash=STARTING_CASH):
+    """
+    Feeds every row of `series` to `strategy`. A rejected order only ends
+    the strategy's turn for that row. Returns (account, elapsed_seconds).
+    """
+    account = BacktestAccount(series, cash)
+    clock = account.clock
+    prices = series.prices
+    started = time.perf_counter()
+    for index in range(len(series)):
+        clock.advance()
+        account.prices = prices[index]
+        try:
+            strategy(account, index, account.prices)
+        except OrderError:
+            pass
+    return account, time.perf_counter() - started
+
+
+def mean_reversion(window=20, threshold=0.02, quantity=1):
+    """
+    Example strategy: buys `quantity` shares of every symbol trading more
+    than `threshold` below its `window`-row moving average, and sells
+    them when it trades that far above.
+    """
+    history = []
+
+    def strategy(account, index, prices):
+        history.append(np.asarray(prices, dtype=float))
+        if len(history) > window:
+            history.pop(0)
+        if len(history) < window:
+            return
+        average = np.mean(history, axis=0)
+        for column in np.flatnonzero(prices < average * (1 - threshold)):
+            symbol = account.symbols[column]
+            if account.cash >= quantity * prices[column]:
+                account.buy(symbol, quantity)
+        for column in np.flatnonzero(prices > average * (1 + threshold)):
+            symbol = account.symbols[column]
+            if account.holding(symbol) >= quantity:
+                account.sell(symbol, quantity)
+
+    return strategy
+
+
+def load_strategy(spec):
+    """
+    Resolves "module:function" to the strategy callable.
+    """
+    module_name, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), name or "strategy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("strategy", nargs="?",
+                        help="module:function taking (account, index, prices); "
+                             "defaults to mean_reversion()")
+    parser.add_argument("--series", default="test.csv", help="CSV or .ticks price file")
+    parser.add_argument("--cash", type=float, default=STARTING_CASH)
+    args = parser.parse_args()
+
+    series = load_series(args.series)
+    if not len(series):
+        print(f"Error: {args.series} has no rows")
+        return
+    strategy = load_strategy(args.strategy) if args.strategy else mean_reversion()
+    account, elapsed = run_backtest(series, strategy, args.cash)
+
+    trades = len(account.transactions)
+    elapsed = max(elapsed, 1e-9)
+    equity = account.equity()
+    realized = sum(ledger.realized_pnl for ledger in account.ledgers.values())
+    unrealized = equity - account.cash - sum(ledger.cost for ledger in account.ledgers.values())
+    print(f"rows={len(series)} symbols={len(series.symbols)} elapsed={elapsed:.3f}s "
+          f"rows/s={len(series) / elapsed:,.0f}")
+    print(f"trades={trades} rejected={account.rejected} trades/s={trades / elapsed:,.0f}")
+    print(f"cash={account.cash:.2f} equity={equity:.2f} "
+          f"realized_pnl={realized:.2f} unrealized_pnl={unrealized:.2f}")
+
+
+if __name__ == "__main__":
+    main()
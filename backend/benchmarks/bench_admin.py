@@ -0,0 +1,92 @@
+"""
+bench_admin.py - Times admin.py's snapshot, export and rollover on a
+seeded database, with the peak memory of each command.
+
+Seeds --users users with a few holdings, lots and trades each straight
+in SQL, into a temporary SQLite file (users.db is never touched), then
+runs each admin command in its own process.
+
+Usage (from backend/):
+    python -m benchmarks.bench_admin --users 1000000
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS = ["APPL", "GOOGL", "TSLA", "HDFC", "ITC"]
+
+
+def seed(path, users):
+    # Creates the schema the way the app does
+    subprocess.run([sys.executable, "admin.py", "--db", path, "seasons"],
+                   cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(path)
+    numbers = f"WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {users})"
+    symbols = " UNION ALL ".join(f"SELECT {k} AS k, '{s}' AS symbol" for k, s in enumerate(SYMBOLS))
+    conn.executescript(f"""
+        INSERT INTO "user" (id, username, email, password)
+            {numbers} SELECT i, 'user' || i, 'user' || i || '@bench', '-' FROM n;
+        INSERT INTO portfolio (user_id, cash, version)
+            {numbers} SELECT i, 10000 - i % 5000, 1 FROM n;
+        INSERT INTO holdings (user_id, symbol, quantity, cost, realized_pnl)
+            {numbers} SELECT i, symbol, 1 + (i + k) % 7, 100.0 * (1 + (i + k) % 7), 0
+            FROM n, ({symbols}) WHERE k < 3;
+        INSERT INTO lots (user_id, symbol, quantity, remaining, price, timestamp)
+            {numbers} SELECT i, symbol, 10, CASE WHEN k < 3 THEN 5 ELSE 0 END, 100, 0
+            FROM n, ({symbols});
+        INSERT INTO transactions (user_id, type, symbol, quantity, price, timestamp, tick)
+            {numbers} SELECT i, CASE WHEN k < 3 THEN 'buy' ELSE 'sell' END, symbol, 5, 100, 0, k
+            FROM n, ({symbols});
+    """)
+    conn.commit()
+    conn.close()
+
+
+def run(label, path, *command):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "admin.py", "--db", path, *command],
+                   cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is the max over all children so far, in KiB on Linux
+    memory = f"{peak / 1024:6.0f} MiB peak" if peak > before else "  (no new peak)"
+    print(f"{label:<28} {elapsed:7.2f} s  {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-admin-")
+    try:
+        path = os.path.join(tmpdir, "admin.db")
+        started = time.perf_counter()
+        seed(path, args.users)
+        print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(path) / 2**20:.0f} MiB)")
+
+        run("snapshot", path, "snapshot", "bench-snapshot")
+        run("export holdings (csv.gz)", path, "export", "holdings", "--out",
+            os.path.join(tmpdir, "holdings.csv.gz"))
+        run("export transactions (csv)", path, "export", "transactions", "--out",
+            os.path.join(tmpdir, "transactions.csv"))
+        run("rollover", path, "rollover", "bench-season")
+        run("export archived trades", path, "export", "transactions", "--season", "bench-season",
+            "--out", os.path.join(tmpdir, "season.csv"))
+        run("reset-cash", path, "reset-cash")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+bench_admission.py - Trade latency of well-behaved users while one client
+abuses the API, with admission control (admission.py) off and on.
+
+For each setting a fresh server is started (see load_test.py). --traders
+users each place a one-share buy or sell every --interval seconds, while
+an abusive user sends --abuse-rate requests per second, three quarters
+trades and a quarter logins, from --abusers threads. The abuser keeps its
+rate whatever the answers (as far as its threads keep up), so refusing
+its requests cheaply is what frees the server. Reports the traders' trade
+latency and statuses, and what became of the abuser's requests.
+
+Usage (from backend/):
+    python -m benchmarks.bench_admission --seconds 15 --abuse-rate 200
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.load_test import PASSWORD, free_port, percentile, register_users, request, start_server
+
+
+def trader(port, token, symbol, interval, deadline, latencies, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    side = "sell"
+    while time.monotonic() < deadline:
+        # Alternating, so every order can fill
+        side = "buy" if side == "sell" else "sell"
+        started = time.perf_counter()
+        try:
+            status, _, _ = request(conn, "POST", f"/api/{side}", {"symbol": symbol, "quantity": 1}, token)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = "error"
+        latencies.append(time.perf_counter() - started)
+        statuses[status] += 1
+        time.sleep(max(interval - (time.perf_counter() - started), 0))
+
+
+def abuser(port, email, token, symbol, login, interval, deadline, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    side = "sell"
+    due = time.monotonic()
+    while due < deadline:
+        time.sleep(max(due - time.monotonic(), 0))
+        due += interval
+        side = "buy" if side == "sell" else "sell"
+        try:
+            if login:
+                status, _, _ = request(conn, "POST", "/api/login", {"email": email, "password": PASSWORD})
+            else:
+                status, _, _ = request(conn, "POST", f"/api/{side}", {"symbol": symbol, "quantity": 1}, token)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = "error"
+        statuses[status] += 1
+
+
+def run(admission, args, tmpdir):
+    port = free_port()
+    with open(os.path.join(tmpdir, f"server-{admission}.log"), "w") as log:
+        server = start_server(port, os.path.join(tmpdir, f"{admission}.db"), args.clock, log,
+                              admission=admission)
+        try:
+            users = register_users(port, args.traders + 1, 4)
+            symbol = "APPL"
+            (abuser_email, abuser_token), traders = users[0], users[1:]
+
+            deadline = time.monotonic() + args.seconds
+            latencies, trade_statuses, abuse_statuses = [], Counter(), Counter()
+            threads = [threading.Thread(target=trader, args=(
+                port, token, symbol, args.interval, deadline, latencies, trade_statuses
+            )) for _, token in traders]
+            threads += [threading.Thread(target=abuser, args=(
+                port, abuser_email, abuser_token, symbol, i % 4 == 0,
+                args.abusers / args.abuse_rate, deadline, abuse_statuses
+            )) for i in range(args.abusers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    latencies.sort()
+    print(f"{admission:<10} {len(latencies):>7} {percentile(latencies, 0.5) * 1e3:>8.1f} "
+          f"{percentile(latencies, 0.99) * 1e3:>8.1f} {latencies[-1] * 1e3:>8.1f}  "
+          f"{dict(trade_statuses)!s:<24} {dict(abuse_statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--traders", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between a trader's orders")
+    parser.add_argument("--abusers", type=int, default=32, help="abusive client threads")
+    parser.add_argument("--abuse-rate", type=float, default=200, help="abusive requests per second")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--clock", default="x15", help="MOCK_TRADING_CLOCK for the server")
+    parser.add_argument("--settings", nargs="+", choices=("off", "on"), default=["off", "on"])
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-admission-")
+    try:
+        print(f"{args.traders} traders (one order per {args.interval}s) vs {args.abuse_rate:.0f} abusive "
+              f"requests/s from {args.abusers} threads, {args.seconds}s\n")
+        print(f"{'admission':<10} {'trades':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  "
+              f"{'trader statuses':<24} abuser statuses")
+        for admission in args.settings:
+            run(admission, args, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+bench_leaderboard.py - Times leaderboard.Leaderboard at competition scale:
+the per-tick revaluation and re-sort, trade updates, and the reads served
+by /api/leaderboard (one page, one user's rank).
+
+The per-request Python loop the leaderboard replaces (price every user's
+holdings, then sort) is timed alongside for comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_leaderboard --users 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from leaderboard import Leaderboard
+
+SYMBOLS = ["APPL", "GOOGL", "TSLA", "HDFC", "ITC", "HAL", "BPCL", "CIPLA"]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e3
+
+
+def bench(users, ticks, seed):
+    rng = random.Random(seed)
+    cash = [(user_id, f"user{user_id}", rng.uniform(0, 10000)) for user_id in range(users)]
+    holdings = [
+        (user_id, symbol, rng.randint(1, 50))
+        for user_id in range(users)
+        for symbol in rng.sample(SYMBOLS, rng.randint(0, 4))
+    ]
+    prices = np.array([rng.uniform(100, 3000) for _ in SYMBOLS])
+
+    board = Leaderboard()
+    started = time.perf_counter()
+    board.load(SYMBOLS, cash, holdings)
+    load_ms = (time.perf_counter() - started) * 1e3
+
+    tick = [0]
+
+    def refresh():
+        tick[0] += 1
+        prices[:] *= 1 + np.random.default_rng(tick[0]).normal(0, 0.004, len(SYMBOLS))
+        board.refresh(SYMBOLS, prices, tick[0])
+
+    refresh_ms = timed(refresh, ticks)
+    update_ms = timed(lambda: board.update(rng.randrange(users), 5000.0, {"TSLA": 3}), 1000)
+    page_ms = timed(lambda: board.ranking.page(rng.randrange(max(users - 20, 1)), 20), 1000)
+    rank_ms = timed(lambda: board.ranking.lookup(rng.randrange(users)), 1000)
+
+    by_user = {}
+    for user_id, symbol, quantity in holdings:
+        by_user.setdefault(user_id, {})[symbol] = quantity
+    price_of = dict(zip(SYMBOLS, prices))
+
+    def naive():
+        equity = [
+            (user_cash + sum(q * price_of[s] for s, q in by_user.get(user_id, {}).items()), user_id)
+            for user_id, _, user_cash in cash
+        ]
+        equity.sort(reverse=True)
+
+    naive_ms = timed(naive, 3)
+    print(f"users={users:>8,}  load={load_ms:8.1f} ms  refresh={refresh_ms:7.2f} ms/tick  "
+          f"update={update_ms * 1e3:5.1f} us  page={page_ms * 1e3:6.1f} us  "
+          f"rank={rank_ms * 1e3:5.1f} us  naive={naive_ms:8.1f} ms/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for users in args.users:
+        bench(users, args.ticks, args.seed)
+
+
+if __name__ == "__main__":
+    main()
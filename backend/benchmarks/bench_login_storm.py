@@ -0,0 +1,126 @@
+"""
+bench_login_storm.py - Latency of /api/stock_prices and /api/buy while a
+storm of logins hits the same process, with PBKDF2 run inline on the
+request threads and then in password_pool's process pool.
+
+Login threads hammer /api/login for --seconds; meanwhile one probe thread
+alternates price and buy requests and records their latency. Runs
+against a temporary SQLite file and never touches users.db.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login_storm --logins 32 --seconds 10
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+PROBE_INTERVAL = 0.02  # seconds between probe requests
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def seed_users(trading, count, password_hash):
+    with trading.app.app_context():
+        for i in range(count):
+            user = trading.User(username=f"storm{i}", email=f"storm{i}@bench", password=password_hash)
+            trading.db.session.add(user)
+            trading.db.session.flush()
+            trading.db.session.add(trading.Portfolio(user_id=user.id, cash=1e9))
+        trading.db.session.commit()
+        return trading.create_access_token(identity=str(user.id))
+
+
+def run_storm(trading, logins, seconds, users, token, symbol):
+    stop = threading.Event()
+    login_statuses = defaultdict(int)
+    latencies = defaultdict(list)
+    lock = threading.Lock()
+
+    def login_worker(worker):
+        client = trading.app.test_client()
+        i = worker
+        while not stop.is_set():
+            response = client.post("/api/login", json={
+                "email": f"storm{i % users}@bench", "password": "password"
+            })
+            with lock:
+                login_statuses[response.status_code] += 1
+            i += logins
+
+    def probe():
+        client = trading.app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        while not stop.is_set():
+            for name, call in (
+                ("prices", lambda: client.get("/api/stock_prices")),
+                ("buy", lambda: client.post("/api/buy", json={"symbol": symbol, "quantity": 1},
+                                            headers=headers))
+            ):
+                started = time.perf_counter()
+                call()
+                latencies[name].append(time.perf_counter() - started)
+            time.sleep(PROBE_INTERVAL)
+
+    threads = [threading.Thread(target=login_worker, args=(i,)) for i in range(logins)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return login_statuses, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login threads")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: password_pool.WORKERS)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-logins-")
+    try:
+        os.environ["MOCK_TRADING_DB"] = "sqlite:///" + os.path.join(tmpdir, "logins.db")
+        # In-process clients share one address; this measures the app, not the limits
+        os.environ["MOCK_TRADING_ADMISSION"] = "off"
+        import app as trading
+        import password_pool
+
+        with trading.app.app_context():
+            trading.init_database()
+        trading.TICK_STORE.refresh()
+        symbol = trading.TICK_STORE.series.symbols[0]
+        workers = args.workers or password_pool.WORKERS
+
+        password_pool.configure(0)
+        token = seed_users(trading, args.users, password_pool.hash_password("password"))
+
+        for mode, pool_workers in (("inline", 0), (f"pool({workers})", workers)):
+            password_pool.configure(pool_workers)
+            statuses, latencies = run_storm(trading, args.logins, args.seconds, args.users, token, symbol)
+            print(f"{mode:<10} logins/s={sum(statuses.values()) / args.seconds:7.1f}  "
+                  f"statuses={dict(statuses)}")
+            for name in ("prices", "buy"):
+                values = latencies[name]
+                print(f"           {name:<7} n={len(values):<5} "
+                      f"p50={percentile(values, 0.50) * 1e3:8.1f} ms  "
+                      f"p99={percentile(values, 0.99) * 1e3:8.1f} ms")
+        password_pool.configure(0)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
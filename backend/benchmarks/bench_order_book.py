@@ -0,0 +1,96 @@
+"""
+bench_order_book.py - Measures how long one price tick takes to match
+resting limit/stop orders as the number of resting orders grows.
+
+Matching cost depends on the orders a tick actually crosses, not on how
+many are resting, so the time per fill should stay flat as the book
+grows. A naive scan of every open order is timed alongside for comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_order_book --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+
+from order_book import OrderBook, ORDER_SIDES, ORDER_TYPES, fires_below
+
+SYMBOLS = ["APPL", "GOOGL", "TSLA", "HDFC", "ITC", "HAL", "BPCL", "CIPLA"]
+
+
+def random_order(rng, prices):
+    symbol = rng.choice(SYMBOLS)
+    side = rng.choice(ORDER_SIDES)
+    order_type = rng.choice(ORDER_TYPES)
+    # Resting orders sit 2-30% away from the price, on the side that
+    # has not fired yet
+    distance = prices[symbol] * rng.uniform(0.02, 0.30)
+    if fires_below(side, order_type):
+        trigger = prices[symbol] - distance
+    else:
+        trigger = prices[symbol] + distance
+    return symbol, side, order_type, trigger
+
+
+def bench(size, ticks, naive, seed):
+    rng = random.Random(seed)
+    prices = {symbol: 1000.0 for symbol in SYMBOLS}
+    book = OrderBook()
+    resting = {}
+    next_id = 0
+    for _ in range(size):
+        order = random_order(rng, prices)
+        book.add(next_id, 0, *order)
+        resting[next_id] = order
+        next_id += 1
+
+    book_time = scan_time = 0.0
+    fills = 0
+    for _ in range(ticks):
+        for symbol in SYMBOLS:
+            prices[symbol] *= 1 + rng.gauss(0, 0.004)
+
+        if naive:
+            started = time.perf_counter()
+            [order_id for order_id, (symbol, side, order_type, trigger) in resting.items()
+             if (prices[symbol] <= trigger if fires_below(side, order_type)
+                 else prices[symbol] >= trigger)]
+            scan_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        fired = book.pop_triggered(prices)
+        book_time += time.perf_counter() - started
+        fills += len(fired)
+
+        # Keep the book at a constant size (not timed)
+        for order_id, _, _, _ in fired:
+            del resting[order_id]
+            order = random_order(rng, prices)
+            book.add(next_id, 0, *order)
+            resting[next_id] = order
+            next_id += 1
+
+    line = (f"resting={size:>9,}  ticks={ticks}  fills/tick={fills / ticks:8.1f}  "
+            f"heap={book_time / ticks * 1e6:10.1f} us/tick "
+            f"({book_time / max(fills, 1) * 1e6:5.1f} us/fill)")
+    if naive:
+        line += f"  scan={scan_time / ticks * 1e6:12.1f} us/tick"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--naive-limit", type=int, default=100000,
+                        help="largest size to also time with a full scan")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        bench(size, args.ticks, size <= args.naive_limit, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+bench_portfolio_cache.py - Cost of GET /api/portfolio with and without
+the portfolio cache, and how many SQL statements each read issues.
+
+Seeds users with a trading history, then reads every portfolio: once
+cold (cache cleared), again at the same tick (cached body), again with
+If-None-Match (304), and after a tick (re-rendered from the cache). Runs
+against a temporary SQLite file and never touches users.db.
+
+Usage (from backend/):
+    python -m benchmarks.bench_portfolio_cache --users 200 --trades 50
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--trades", type=int, default=50, help="trades per user")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-cache-")
+    try:
+        os.environ["MOCK_TRADING_DB"] = "sqlite:///" + os.path.join(tmpdir, "cache.db")
+        # In-process clients share one address; this measures the app, not the limits
+        os.environ["MOCK_TRADING_ADMISSION"] = "off"
+        os.environ["MOCK_TRADING_CLOCK"] = "manual"
+        import app as trading
+
+        with trading.app.app_context():
+            trading.init_database()
+            statements = [0]
+            event.listen(trading.db.engine, "before_cursor_execute",
+                         lambda *_: statements.__setitem__(0, statements[0] + 1))
+        trading.TICK_STORE.refresh()
+        symbols = trading.TICK_STORE.series.symbols
+
+        rng = random.Random(args.seed)
+        tokens = []
+        with trading.app.app_context():
+            for i in range(args.users):
+                user = trading.User(username=f"cache{i}", email=f"cache{i}@bench", password="-")
+                trading.db.session.add(user)
+                trading.db.session.flush()
+                trading.db.session.add(trading.Portfolio(user_id=user.id, cash=1e7))
+                trading.db.session.commit()
+                for _ in range(args.trades):
+                    trading.execution.buy(user.id, rng.choice(symbols), rng.randint(1, 5), 100.0)
+                tokens.append(trading.create_access_token(identity=str(user.id)))
+
+        client = trading.app.test_client()
+        etags = {}
+
+        def read_all(label, conditional=False):
+            statements[0] = 0
+            started = time.perf_counter()
+            statuses = set()
+            for token in tokens:
+                headers = {"Authorization": f"Bearer {token}"}
+                if conditional:
+                    headers["If-None-Match"] = etags[token]
+                response = client.get("/api/portfolio", headers=headers)
+                etags[token] = response.headers.get("ETag", "").strip('"')
+                statuses.add(response.status_code)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<24} {elapsed / len(tokens) * 1e3:7.2f} ms/read  "
+                  f"{statements[0] / len(tokens):5.1f} SQL/read  statuses={sorted(statuses)}")
+
+        trading.PORTFOLIO_CACHE.clear()
+        read_all("cold (cache miss)")
+        read_all("warm, same tick")
+        read_all("warm, If-None-Match", conditional=True)
+        trading.MARKET_CLOCK.step(timeout=10)
+        read_all("warm, next tick")
+        print(f"cache: {trading.PORTFOLIO_CACHE.stats()}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
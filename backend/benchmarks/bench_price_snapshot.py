@@ -0,0 +1,72 @@
+"""
+bench_price_snapshot.py - Response size and cost of /api/stock_prices
+variants for a large symbol universe: full row, 5-symbol watchlist,
+one-tick delta and a 10-tick delta, as JSON and binary.
+
+Publishes synthetic ticks in which --moving of the symbols change price,
+straight into price_snapshot.SnapshotHistory (no server involved).
+
+Usage (from backend/):
+    python -m benchmarks.bench_price_snapshot --symbols 5000 --moving 0.05
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from price_snapshot import SnapshotHistory
+
+
+def timed(fn, repeat=200):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1e6, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--moving", type=float, default=0.05, help="share of symbols moving per tick")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+    row = rng.integers(50, 500, args.symbols).astype(np.float64)
+    history = SnapshotHistory()
+    publish_times = []
+    for tick in range(12):
+        moving = rng.random(args.symbols) < args.moving
+        row = row + moving * rng.choice([-1.0, 1.0], args.symbols)
+        started = time.perf_counter()
+        history.publish(tick, 1000.0 + tick * 15, symbols, row)
+        publish_times.append(time.perf_counter() - started)
+
+    snapshot = history.latest()
+    watchlist = np.array([snapshot.columns[s] for s in symbols[:5]], dtype=np.uint32)
+    print(f"{args.symbols} symbols, {args.moving:.0%} moving per tick; "
+          f"publish (diff + pre-encoding) {np.median(publish_times) * 1e3:.2f} ms/tick\n")
+    print(f"{'variant':<28} {'bytes':>9} {'us/request':>11}")
+    variants = [
+        ("full JSON (pre-encoded)", lambda: snapshot.full_json),
+        ("full binary (pre-encoded)", lambda: snapshot.full_binary),
+        ("delta 1 tick JSON", lambda: snapshot.delta_json),
+        ("delta 1 tick binary", lambda: snapshot.delta_binary),
+        ("delta 10 ticks JSON", lambda: snapshot.encode_json(
+            history.changed_since(snapshot, 1000.0 + 1 * 15), 1015.0)),
+        ("delta 10 ticks binary", lambda: snapshot.encode_binary(
+            history.changed_since(snapshot, 1000.0 + 1 * 15), True)),
+        ("5-symbol watchlist JSON", lambda: snapshot.encode_json(watchlist)),
+        ("5-symbol watchlist binary", lambda: snapshot.encode_binary(watchlist)),
+        ("full JSON, re-encoded", lambda: snapshot.encode_json(
+            np.arange(args.symbols, dtype=np.uint32))),
+    ]
+    for label, fn in variants:
+        micros, size = timed(fn)
+        print(f"{label:<28} {size:>9} {micros:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
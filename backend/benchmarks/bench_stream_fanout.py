@@ -0,0 +1,148 @@
+"""
+bench_stream_fanout.py - Server memory and tick fan-out latency versus the
+number of open /api/stock_prices/stream connections.
+
+Starts the server in a subprocess (asgi.py, or app.run(threaded=True) for
+comparison) on a temporary SQLite file with one tick per second, opens
+connections in steps, and at each step reports the server's RSS and
+thread count and, over a few ticks, how long after the first subscriber
+the rest received each tick (p50 / p99 / last). Clients run on asyncio in
+this process, so on a small machine they share the CPU with the server.
+
+Usage (from backend/):
+    python -m benchmarks.bench_stream_fanout --connections 100 1000 5000 10000
+    python -m benchmarks.bench_stream_fanout --server threaded --connections 100 500 1000
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.load_test import free_port, start_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONNECT_CONCURRENCY = 200
+
+
+def server_status(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.strip()
+    return int(fields["VmRSS"].split()[0]) / 1024, int(fields["Threads"])
+
+
+class Subscribers:
+    def __init__(self, port):
+        self.port = port
+        self.received = defaultdict(list)  # tick id -> receipt times
+        self.tasks = []
+        self.failed = 0
+        self._connect = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def subscribe(self, opened):
+        try:
+            async with self._connect:
+                reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.write(b"GET /api/stock_prices/stream HTTP/1.1\r\nHost: bench\r\n\r\n")
+                await reader.readuntil(b"\r\n\r\n")
+            opened.release()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b"id: "):
+                    self.received[int(line[4:])].append(time.perf_counter())
+        except (OSError, asyncio.IncompleteReadError):
+            self.failed += 1
+            opened.release()
+
+    async def grow(self, count):
+        opened = asyncio.Semaphore(0)
+        new = count - len(self.tasks)
+        for _ in range(new):
+            self.tasks.append(asyncio.ensure_future(self.subscribe(opened)))
+        for _ in range(new):
+            await opened.acquire()
+
+    def fan_out(self, after_tick):
+        """
+        Latencies (ms) after the first receipt, for ticks after
+        `after_tick` that every open connection received.
+        """
+        open_now = len(self.tasks) - self.failed
+        delays = []
+        for tick, times in self.received.items():
+            if tick > after_tick and len(times) >= open_now:
+                first = min(times)
+                delays.extend((t - first) * 1e3 for t in times)
+        return sorted(delays)
+
+
+async def run(port, pid, levels, ticks):
+    subscribers = Subscribers(port)
+    rss, threads = server_status(pid)
+    print(f"{'connections':>11} {'server RSS':>11} {'KiB/conn':>9} {'threads':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'last ms':>8}")
+    print(f"{0:>11} {rss:>9.0f}MB {'':>9} {threads:>8}")
+    base_rss = rss
+    for level in levels:
+        await subscribers.grow(level)
+        last_seen = max(subscribers.received, default=0)
+        await asyncio.sleep(ticks + 0.5)
+        delays = subscribers.fan_out(last_seen)
+        rss, threads = server_status(pid)
+        per_connection = (rss - base_rss) * 1024 / level
+        if delays:
+            p50 = delays[len(delays) // 2]
+            p99 = delays[min(int(len(delays) * 0.99), len(delays) - 1)]
+            print(f"{level:>11} {rss:>9.0f}MB {per_connection:>9.1f} {threads:>8} "
+                  f"{p50:>8.1f} {p99:>8.1f} {delays[-1]:>8.1f}")
+        else:
+            print(f"{level:>11} {rss:>9.0f}MB {per_connection:>9.1f} {threads:>8}   (no complete tick)")
+    if subscribers.failed:
+        print(f"{subscribers.failed} connections failed")
+    for task in subscribers.tasks:
+        task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server", choices=("asgi", "threaded"), default="asgi")
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--ticks", type=int, default=3, help="ticks measured per step")
+    args = parser.parse_args()
+
+    # Server and clients each need a descriptor per connection
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if max(args.connections) + 100 > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-stream-")
+    try:
+        port = free_port()
+        if args.server == "asgi":
+            code = f"import sys; sys.argv = ['asgi.py', '--port', '{port}']; import asgi; asgi.main()"
+        else:
+            code = None
+        with open(os.path.join(tmpdir, "server.log"), "w") as log:
+            os.environ["PASSWORD_POOL_WORKERS"] = "0"
+            # x15: one tick per second
+            server = start_server(port, os.path.join(tmpdir, "stream.db"), "x15", log, code)
+            try:
+                asyncio.run(run(port, server.pid, sorted(args.connections), args.ticks))
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
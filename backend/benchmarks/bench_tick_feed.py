@@ -0,0 +1,99 @@
+"""
+bench_tick_feed.py - Ingestion throughput of the live tick feed (see
+tick_feed.py).
+
+Appends --ticks ticks of --symbols prices to a TickFeed in batches of
+each --batch size, with a consumer thread taking ticks as the market loop
+would, then tails a CSV and a binary file of the same ticks from the
+start. Reports ticks per second and how often the producer was refused
+because the consumer lagged.
+
+Usage (from backend/):
+    python -m benchmarks.bench_tick_feed --ticks 200000 --symbols 50
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from tick_feed import FeedBusy, FileTail, TickFeed
+from tick_store import write_binary
+
+
+def consume(feed, stop):
+    while not stop.is_set():
+        feed.next_due(0.01)
+
+
+def bench_append(prices, symbols, batch, capacity):
+    feed = TickFeed(capacity)
+    stop = threading.Event()
+    consumer = threading.Thread(target=consume, args=(feed, stop), daemon=True)
+    consumer.start()
+    began = time.perf_counter()
+    start = 0
+    while start < len(prices):
+        try:
+            feed.append(symbols, prices[start:start + batch])
+            start += batch
+        except FeedBusy:
+            time.sleep(0.0005)
+    elapsed = time.perf_counter() - began
+    stop.set()
+    consumer.join()
+    print(f"append  batch={batch:<6} {len(prices) / elapsed:>12.0f} ticks/s "
+          f"{feed.rejected:>8} refused")
+
+
+def bench_tail(path, prices, capacity):
+    feed = TickFeed(capacity)
+    tail = FileTail(path, feed, from_start=True)
+    stop = threading.Event()
+    consumer = threading.Thread(target=consume, args=(feed, stop), daemon=True)
+    consumer.start()
+    began = time.perf_counter()
+    while feed.ingested < len(prices):
+        if not tail.poll():
+            time.sleep(0.0005)
+    elapsed = time.perf_counter() - began
+    stop.set()
+    consumer.join()
+    print(f"tail    {os.path.splitext(path)[1]:<12} {len(prices) / elapsed:>12.0f} ticks/s "
+          f"{feed.throttled:>8} throttled")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ticks", type=int, default=200000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--capacity", type=int, default=65536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    prices = 100 + rng.standard_normal((args.ticks, args.symbols)).cumsum(axis=0)
+
+    print(f"{args.ticks} ticks x {args.symbols} symbols, ring of {args.capacity}\n")
+    for batch in args.batch:
+        bench_append(prices, symbols, batch, args.capacity)
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-feed-")
+    try:
+        csv_path = os.path.join(tmpdir, "ticks.csv")
+        np.savetxt(csv_path, prices, delimiter=",", fmt="%.4f", header=",".join(symbols), comments="")
+        bench_tail(csv_path, prices, args.capacity)
+        binary_path = os.path.join(tmpdir, "ticks.ticks")
+        write_binary(binary_path, symbols, [prices])
+        bench_tail(binary_path, prices, args.capacity)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+bench_trade_journal.py - Market order throughput for each durability mode
+(per-trade, grouped, async; see trade_journal.py).
+
+--threads request threads each submit --trades one-share buys for users
+of their own, in-process (no HTTP), against a temporary SQLite file and
+journal. Reports trades per second, per-order latency, and how many
+database commits and journal fsyncs the orders took. With --synchronous
+FULL, SQLite syncs on every commit as well (the app runs WAL with
+synchronous=NORMAL, which only syncs at checkpoints).
+
+Usage (from backend/):
+    python -m benchmarks.bench_trade_journal --threads 16 --trades 200
+    python -m benchmarks.bench_trade_journal --synchronous FULL
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+MODES = ("per-trade", "grouped", "async")
+
+
+def run_mode(trading, mode, args, tmpdir, commits):
+    with trading.app.app_context():
+        user_ids = []
+        for i in range(args.threads):
+            user = trading.User(username=f"{mode}{i}", email=f"{mode}{i}@bench", password="-")
+            trading.db.session.add(user)
+            trading.db.session.flush()
+            trading.db.session.add(trading.Portfolio(user_id=user.id, cash=1e9))
+            user_ids.append(user.id)
+        trading.db.session.commit()
+
+    journal = None
+    if mode != "per-trade":
+        journal = trading.TradeJournal(os.path.join(tmpdir, f"{mode}.log"), mode,
+                                       trading.app.app_context)
+        with trading.app.app_context():
+            journal.open()
+
+    latencies = []
+    start = threading.Barrier(args.threads + 1)
+
+    def client(user_id):
+        orders = [("buy", "APPL", 1, 100.0)]
+        timings = []
+        with trading.app.app_context():
+            start.wait()
+            for _ in range(args.trades):
+                began = time.perf_counter()
+                if journal is not None:
+                    journal.submit(user_id, orders, 0)
+                else:
+                    trading.execution.execute_batch(user_id, orders, 0)
+                timings.append(time.perf_counter() - began)
+        latencies.extend(timings)
+
+    threads = [threading.Thread(target=client, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    commits[0] = 0
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    total = len(latencies)
+    fsyncs = journal.stats()["fsyncs"] if journal is not None else 0
+    print(f"{mode:<10} {total / elapsed:>9.0f} {latencies[total // 2] * 1e3:>8.2f} "
+          f"{latencies[min(int(total * 0.99), total - 1)] * 1e3:>8.2f} "
+          f"{commits[0]:>8} {fsyncs:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--trades", type=int, default=200, help="orders per thread")
+    parser.add_argument("--synchronous", choices=("NORMAL", "FULL"), default="NORMAL")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-journal-")
+    try:
+        os.environ["MOCK_TRADING_DB"] = "sqlite:///" + os.path.join(tmpdir, "journal.db")
+        os.environ["MOCK_TRADING_CLOCK"] = "manual"
+        os.environ["MOCK_TRADING_DURABILITY"] = "per-trade"
+        import app as trading
+
+        # Before adding listeners, so the price thread is not connecting meanwhile
+        with trading.app.app_context():
+            trading.init_database()
+            engine = trading.db.engine
+        if args.synchronous == "FULL":
+            event.listen(engine, "connect", lambda dbapi_connection, _: dbapi_connection.execute(
+                "PRAGMA synchronous=FULL"))
+            engine.dispose()
+        commits = [0]
+        event.listen(engine, "commit", lambda _: commits.__setitem__(0, commits[0] + 1))
+
+        print(f"{args.threads} threads x {args.trades} orders, SQLite synchronous={args.synchronous}\n")
+        print(f"{'mode':<10} {'trades/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'commits':>8} {'fsyncs':>7}")
+        for mode in args.modes:
+            run_mode(trading, mode, args, tmpdir, commits)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
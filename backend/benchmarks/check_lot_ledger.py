@@ -0,0 +1,121 @@
+"""
+check_lot_ledger.py - Randomized equivalence check of lot_ledger.LotLedger
+against the list-rebuilding FIFO loop that sell_stock used to run, plus a
+timing comparison of the two on long lot histories.
+
+For thousands of random buy/sell sequences it checks that both produce
+the same open lots, quantity, cost basis and realized P&L after every
+step. Exits non-zero on the first mismatch.
+
+Usage (from backend/):
+    python -m benchmarks.check_lot_ledger --cases 2000 --steps 200
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from lot_ledger import LotLedger
+
+
+def legacy_sell(purchases, quantity, price):
+    """
+    The original sell_stock FIFO loop: returns (updated_purchases, pnl).
+    """
+    pnl = 0.0
+    remaining_quantity = quantity
+    updated_purchases = []
+    for purchase in purchases:
+        if remaining_quantity == 0:
+            updated_purchases.append(purchase)
+        elif purchase["quantity"] <= remaining_quantity:
+            pnl += purchase["quantity"] * (price - purchase["price"])
+            remaining_quantity -= purchase["quantity"]
+        else:
+            pnl += remaining_quantity * (price - purchase["price"])
+            purchase["quantity"] -= remaining_quantity
+            updated_purchases.append(purchase)
+            remaining_quantity = 0
+    return updated_purchases, pnl
+
+
+def close(a, b):
+    return abs(a - b) <= 1e-6 * max(1.0, abs(a), abs(b))
+
+
+def check_case(rng, steps):
+    ledger = LotLedger()
+    purchases = []
+    realized = 0.0
+    for step in range(steps):
+        price = rng.choice([rng.randint(1, 500), round(rng.uniform(1, 500), 2)])
+        held = sum(p["quantity"] for p in purchases)
+        if held and rng.random() < 0.45:
+            quantity = rng.choice([held, rng.randint(1, held)])
+            purchases, pnl = legacy_sell(purchases, quantity, price)
+            realized += pnl
+            if not close(ledger.sell(quantity, price), pnl):
+                return f"step {step}: sale P&L differs"
+        else:
+            quantity = rng.randint(1, 50)
+            purchases.append({"quantity": quantity, "price": price})
+            ledger.buy(quantity, price)
+
+        expected_lots = [(p["quantity"], p["price"]) for p in purchases]
+        expected_cost = sum(q * p for q, p in expected_lots)
+        if list(ledger.open_lots()) != expected_lots:
+            return f"step {step}: open lots {list(ledger.open_lots())} != {expected_lots}"
+        if ledger.quantity != sum(q for q, _ in expected_lots):
+            return f"step {step}: quantity {ledger.quantity} differs"
+        if not close(ledger.cost, expected_cost):
+            return f"step {step}: cost {ledger.cost} != {expected_cost}"
+        if not close(ledger.realized_pnl, realized):
+            return f"step {step}: realized {ledger.realized_pnl} != {realized}"
+        if not close(ledger.unrealized_pnl(price), ledger.quantity * price - expected_cost):
+            return f"step {step}: unrealized P&L differs"
+    return None
+
+
+def time_sells(lots, sells):
+    """
+    Times `sells` one-share sales from a position of `lots` one-share lots.
+    """
+    purchases = [{"quantity": 1, "price": 100.0} for _ in range(lots)]
+    started = time.perf_counter()
+    for _ in range(sells):
+        purchases, _ = legacy_sell(purchases, 1, 101.0)
+    legacy = time.perf_counter() - started
+
+    ledger = LotLedger()
+    for _ in range(lots):
+        ledger.buy(1, 100.0)
+    started = time.perf_counter()
+    for _ in range(sells):
+        ledger.sell(1, 101.0)
+    return legacy, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        error = check_case(rng, args.steps)
+        if error:
+            print(f"FAILED case {case}: {error}")
+            sys.exit(1)
+    print(f"OK: {args.cases} random histories of {args.steps} steps match the legacy FIFO loop")
+
+    for lots in (1000, 10000, 100000):
+        legacy, ledger = time_sells(lots, 500)
+        print(f"lots={lots:>7,}  legacy={legacy / 500 * 1e6:9.1f} us/sell  "
+              f"ledger={ledger / 500 * 1e6:5.2f} us/sell")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+load_test.py - Load-test harness for the Flask API.
+
+Starts app.py in a subprocess against a temporary SQLite file (users.db
+is never touched), registers --users users through /api/register, then
+drives a weighted mix of workloads from --workers threads (or processes
+with --processes) for --seconds:
+
+    prices     GET  /api/stock_prices
+    portfolio  GET  /api/portfolio
+    trade      POST /api/buy or /api/sell (one share)
+    login      POST /api/login
+
+It reports throughput and p50/p95/p99 latency per endpoint as JSON. With
+--baseline it compares against an earlier report and exits 1 when any
+endpoint's p95 or p99 regressed by more than --threshold.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --seconds 20 --out before.json
+    python -m benchmarks.load_test --seconds 20 --baseline before.json --threshold 0.2
+    python -m benchmarks.load_test --mix prices=10,login=90 --processes
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "prices=50,portfolio=30,trade=15,login=5"
+PASSWORD = "load-test-password"
+STARTUP_TIMEOUT = 60  # seconds
+
+
+# =========================
+#  SERVER
+# =========================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, db_path, clock, log, code=None, admission="off"):
+    """
+    Runs `code` (default: app.run() on `port`) in a subprocess and waits
+    until it answers. Rate limits are off by default, since every load
+    test client shares one address.
+    """
+    env = dict(os.environ, MOCK_TRADING_DB="sqlite:///" + db_path, MOCK_TRADING_CLOCK=clock,
+               MOCK_TRADING_ADMISSION=admission)
+    if code is None:
+        code = ("import app; app.app.run(host='127.0.0.1', port=%d, threaded=True, "
+                "debug=False, use_reloader=False)" % port)
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                              stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {server.returncode}")
+        try:
+            status, _, _ = request(http.client.HTTPConnection("127.0.0.1", port, timeout=5),
+                                   "GET", "/api/current_timestamp")
+            if status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("app.py did not start in time")
+
+
+def request(conn, method, path, body=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, response.getheader("ETag"), data
+
+
+def register_users(port, count, threads):
+    """
+    Registers `count` users concurrently. Returns [(email, token), ...].
+    """
+    prefix = f"load{os.getpid()}_{int(time.time())}_"
+    users = []
+    lock = threading.Lock()
+    pending = list(range(count))
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while True:
+            with lock:
+                if not pending:
+                    return
+                i = pending.pop()
+            email = f"{prefix}{i}@load"
+            status, _, data = request(conn, "POST", "/api/register", {
+                "username": f"{prefix}{i}", "email": email, "password": PASSWORD
+            })
+            if status != 201:
+                raise RuntimeError(f"register failed with {status}: {data[:200]!r}")
+            with lock:
+                users.append((email, json.loads(data)["access_token"]))
+
+    pool = [threading.Thread(target=worker) for _ in range(min(threads, count))]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    if len(users) != count:
+        raise RuntimeError(f"only {len(users)} of {count} users registered")
+    return users
+
+
+# =========================
+#  WORKLOADS
+# =========================
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("prices", "portfolio", "trade", "login"):
+            raise ValueError(f"unknown workload {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_worker(port, users, symbols, mix, seconds, seed):
+    """
+    Runs the mix for `seconds` on one keep-alive connection. Returns
+    {endpoint: {"latencies": [...], "statuses": {status: count}}}.
+    """
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    results = defaultdict(lambda: {"latencies": [], "statuses": defaultdict(int)})
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        workload = rng.choices(names, weights)[0]
+        email, token = rng.choice(users)
+        started = time.perf_counter()
+        try:
+            if workload == "prices":
+                endpoint = "GET /api/stock_prices"
+                status, _, _ = request(conn, "GET", "/api/stock_prices")
+            elif workload == "portfolio":
+                endpoint = "GET /api/portfolio"
+                status, _, _ = request(conn, "GET", "/api/portfolio", token=token)
+            elif workload == "trade":
+                side = rng.choice(("buy", "sell"))
+                endpoint = f"POST /api/{side}"
+                status, _, _ = request(conn, "POST", f"/api/{side}",
+                                       {"symbol": rng.choice(symbols), "quantity": 1}, token)
+            else:
+                endpoint = "POST /api/login"
+                status, _, _ = request(conn, "POST", "/api/login",
+                                       {"email": email, "password": PASSWORD})
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = "error"
+        results[endpoint]["latencies"].append(time.perf_counter() - started)
+        results[endpoint]["statuses"][status] += 1
+
+    return {endpoint: {"latencies": r["latencies"], "statuses": dict(r["statuses"])}
+            for endpoint, r in results.items()}
+
+
+def _process_worker(args):
+    return run_worker(*args)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+def summarize(worker_results, seconds):
+    merged = defaultdict(lambda: {"latencies": [], "statuses": defaultdict(int)})
+    for result in worker_results:
+        for endpoint, r in result.items():
+            merged[endpoint]["latencies"] += r["latencies"]
+            for status, count in r["statuses"].items():
+                merged[endpoint]["statuses"][str(status)] += count
+
+    endpoints = {}
+    for endpoint, r in sorted(merged.items()):
+        latencies = sorted(r["latencies"])
+        errors = sum(count for status, count in r["statuses"].items()
+                     if status == "error" or int(status) >= 500)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "throughput": len(latencies) / seconds,
+            "errors": errors,
+            "statuses": dict(r["statuses"]),
+            "p50_ms": percentile(latencies, 0.50) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"total_requests": total, "total_throughput": total / seconds, "endpoints": endpoints}
+
+
+def compare(report, baseline, threshold):
+    """
+    Returns a list of regressions of p95/p99 beyond `threshold` (0.2 = 20%).
+    """
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if before[key] and stats[key] > before[key] * (1 + threshold):
+                regressions.append(f"{endpoint} {key}: {before[key]:.1f} -> {stats[key]:.1f} "
+                                   f"(+{(stats[key] / before[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+# =========================
+#  MAIN
+# =========================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--processes", action="store_true", help="run workers as processes")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--clock", default="x15", help="MOCK_TRADING_CLOCK for the server")
+    parser.add_argument("--admission", choices=("on", "off"), default="off",
+                        help="rate limits and concurrency limit (see admission.py)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed p95/p99 regression vs the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-load-")
+    try:
+        port = free_port()
+        with open(os.path.join(tmpdir, "server.log"), "w") as log:
+            server = start_server(port, os.path.join(tmpdir, "load.db"), args.clock, log,
+                                  admission=args.admission)
+            try:
+                users = register_users(port, args.users, args.workers)
+                _, _, data = request(http.client.HTTPConnection("127.0.0.1", port), "GET", "/api/stock_prices")
+                symbols = list(json.loads(data)["prices"]) or ["APPL"]
+
+                jobs = [(port, users, symbols, mix, args.seconds, args.seed + i) for i in range(args.workers)]
+                if args.processes:
+                    with multiprocessing.Pool(args.workers) as pool:
+                        results = pool.map(_process_worker, jobs)
+                else:
+                    results = [None] * args.workers
+
+                    def run(i):
+                        results[i] = run_worker(*jobs[i])
+
+                    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.workers)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+        report = summarize(results, args.seconds)
+        report["config"] = {
+            "users": args.users, "workers": args.workers, "processes": args.processes,
+            "seconds": args.seconds, "mix": mix, "clock": args.clock, "admission": args.admission
+        }
+        text = json.dumps(report, indent=2)
+        print(text)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text + "\n")
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(report, json.load(f), args.threshold)
+            if regressions:
+                print(f"FAILED: {len(regressions)} latency regression(s) beyond {args.threshold:.0%}",
+                      file=sys.stderr)
+                for regression in regressions:
+                    print("  " + regression, file=sys.stderr)
+                sys.exit(1)
+            print(f"OK: no p95/p99 regression beyond {args.threshold:.0%}", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
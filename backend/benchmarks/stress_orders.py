@@ -0,0 +1,188 @@
+"""
+stress_orders.py - Fires thousands of concurrent buy/sell orders at
+/api/buy and /api/sell and checks that cash and share counts are conserved.
+
+Each phase uses a different number of distinct users with the same total
+number of orders, so the printed throughput shows how order execution
+scales when orders are spread over more users. Runs against a temporary
+SQLite file and never touches users.db.
+
+Usage (from backend/):
+    python -m benchmarks.stress_orders --orders 4000 --threads 32 --users 1 8 64
+"""
+
+import argparse
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+STARTING_CASH = 10000.0
+
+
+def replay_ledger(transactions):
+    """
+    Rebuilds (cash, holdings, open lots) for one user from its ledger,
+    using the same FIFO rules as execution.apply_sell.
+    """
+    cash = STARTING_CASH
+    lots = defaultdict(deque)
+    for t in transactions:
+        if t.type == "buy":
+            cash -= t.quantity * t.price
+            lots[t.symbol].append([t.quantity, t.price])
+            continue
+        cash += t.quantity * t.price
+        remaining = t.quantity
+        symbol_lots = lots[t.symbol]
+        while remaining:
+            lot = symbol_lots[0]
+            used = min(lot[0], remaining)
+            lot[0] -= used
+            remaining -= used
+            if lot[0] == 0:
+                symbol_lots.popleft()
+    holdings = {symbol: sum(q for q, _ in open_lots) for symbol, open_lots in lots.items()}
+    return cash, {symbol: q for symbol, q in holdings.items() if q}
+
+
+def seed_users(trading, count, prefix):
+    with trading.app.app_context():
+        user_ids = []
+        for i in range(count):
+            user = trading.User(username=f"{prefix}{i}", email=f"{prefix}{i}@stress", password="-")
+            trading.db.session.add(user)
+            trading.db.session.flush()
+            trading.db.session.add(trading.Portfolio(user_id=user.id, cash=STARTING_CASH))
+            user_ids.append(user.id)
+        trading.db.session.commit()
+        tokens = {
+            user_id: trading.create_access_token(identity=str(user_id))
+            for user_id in user_ids
+        }
+    return tokens
+
+
+def run_phase(trading, users, orders, threads, seed):
+    tokens = seed_users(trading, users, f"stress{users}_")
+    symbols = trading.TICK_STORE.series.symbols
+    rng = random.Random(seed)
+    work = queue.Queue()
+    for _ in range(orders):
+        work.put((
+            rng.choice(list(tokens)),
+            rng.choice(["buy", "buy", "sell"]),
+            rng.choice(symbols),
+            rng.randint(1, 5)
+        ))
+
+    accepted = defaultdict(int)
+    statuses = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker():
+        client = trading.app.test_client()
+        while True:
+            try:
+                user_id, side, symbol, quantity = work.get_nowait()
+            except queue.Empty:
+                return
+            response = client.post(
+                f"/api/{side}",
+                json={"symbol": symbol, "quantity": quantity},
+                headers={"Authorization": f"Bearer {tokens[user_id]}"}
+            )
+            with lock:
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    accepted[user_id] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = check_conservation(trading, tokens, accepted)
+    print(f"users={users:<5} orders={orders} threads={threads} "
+          f"elapsed={elapsed:.2f}s throughput={orders / elapsed:,.0f} orders/s "
+          f"statuses={dict(statuses)}")
+    return errors
+
+
+def check_conservation(trading, tokens, accepted):
+    errors = []
+    with trading.app.app_context():
+        for user_id in tokens:
+            transactions = trading.Transaction.query.filter_by(user_id=user_id).order_by(trading.Transaction.id).all()
+            if len(transactions) != accepted[user_id]:
+                errors.append(f"user {user_id}: {accepted[user_id]} accepted orders "
+                              f"but {len(transactions)} ledger rows")
+
+            cash, holdings = replay_ledger(transactions)
+            portfolio = trading.Portfolio.query.filter_by(user_id=user_id).first()
+            if abs(portfolio.cash - cash) > 1e-6:
+                errors.append(f"user {user_id}: cash {portfolio.cash} != replayed {cash}")
+            if portfolio.cash < -1e-6:
+                errors.append(f"user {user_id}: negative cash {portfolio.cash}")
+
+            rows = trading.Holding.query.filter_by(user_id=user_id).all()
+            stored = {h.symbol: h.quantity for h in rows if h.quantity}
+            if stored != holdings:
+                errors.append(f"user {user_id}: holdings {stored} != replayed {holdings}")
+
+            open_lots = defaultdict(int)
+            open_cost = defaultdict(float)
+            for lot in trading.Lot.query.filter(trading.Lot.user_id == user_id, trading.Lot.remaining > 0):
+                open_lots[lot.symbol] += lot.remaining
+                open_cost[lot.symbol] += lot.remaining * lot.price
+            if dict(open_lots) != stored:
+                errors.append(f"user {user_id}: open lots {dict(open_lots)} != holdings {stored}")
+            for h in rows:
+                if abs(h.cost - open_cost[h.symbol]) > 1e-6:
+                    errors.append(f"user {user_id}: {h.symbol} cost {h.cost} != open lots {open_cost[h.symbol]}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=4000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="mock-trading-stress-")
+    try:
+        os.environ["MOCK_TRADING_DB"] = "sqlite:///" + os.path.join(tmpdir, "stress.db")
+        # In-process clients share one address; this measures the app, not the limits
+        os.environ["MOCK_TRADING_ADMISSION"] = "off"
+        import app as trading
+
+        with trading.app.app_context():
+            trading.init_database()
+        trading.TICK_STORE.refresh()
+
+        errors = []
+        for users in args.users:
+            errors += run_phase(trading, users, args.orders, args.threads, args.seed)
+
+        if errors:
+            print(f"FAILED: {len(errors)} conservation error(s)")
+            for error in errors[:20]:
+                print("  " + error)
+            sys.exit(1)
+        print("OK: cash and share counts conserved")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
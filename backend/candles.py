@@ -0,0 +1,95 @@
+"""
+candles.py - OHLC bars over the tick series at several resolutions.
+
+Bars are precomputed once per loaded series: resolution 1 is the series
+itself, and each coarser level is aggregated from the one below it
+(1 -> 5 -> 25 -> 100 ticks), so building all levels costs about one pass
+over the prices. Bar i of resolution r covers rows [i*r, (i+1)*r).
+
+A range query slices the coarsest level that keeps the answer under
+max_points bars; only ranges longer than that level allows are grouped
+further on the fly, and only the trailing partial bar is built from raw
+rows.
+"""
+
+import numpy as np
+
+RESOLUTIONS = (1, 5, 25, 100)
+MAX_POINTS = 500
+
+
+def aggregate(bars, factor):
+    """
+    Groups every `factor` consecutive bars of (open, high, low, close)
+    into one. The last group may be shorter.
+    """
+    opens, highs, lows, closes = bars
+    count = len(opens)
+    if factor == 1 or count == 0:
+        return bars
+    starts = np.arange(0, count, factor)
+    ends = np.minimum(starts + factor, count) - 1
+    return (
+        np.asarray(opens[starts]),
+        np.maximum.reduceat(highs, starts, axis=0),
+        np.minimum.reduceat(lows, starts, axis=0),
+        np.asarray(closes[ends])
+    )
+
+
+class CandleSet:
+    def __init__(self, prices, resolutions=RESOLUTIONS):
+        """
+        `prices` is the (rows, symbols) array of a TickSeries. Each
+        resolution must be a multiple of the previous one.
+        """
+        self.prices = prices
+        self.resolutions = tuple(resolutions)
+        self.levels = {}
+        bars, previous = (prices, prices, prices, prices), 1
+        for resolution in self.resolutions:
+            bars = aggregate(bars, resolution // previous)
+            self.levels[resolution] = bars
+            previous = resolution
+
+    def __len__(self):
+        return len(self.prices)
+
+    def query(self, column, start, end, resolution=1, max_points=MAX_POINTS):
+        """
+        Returns the bars of one symbol column for rows [start, end) as
+        (resolution, {"index", "open", "high", "low", "close"}), where
+        index is each bar's first row. The resolution is raised when the
+        range would need more than max_points bars.
+        """
+        start, end = max(start, 0), min(end, len(self))
+        if end <= start:
+            return resolution, {"index": [], "open": [], "high": [], "low": [], "close": []}
+        needed = max(resolution, -(-(end - start) // max_points), 1)
+        level = next((r for r in self.resolutions if r >= needed), self.resolutions[-1])
+        factor = -(-needed // level)
+        width = level * factor
+
+        first, last = start // width, end // width
+        opens, highs, lows, closes = aggregate(
+            tuple(a[first * factor:last * factor, column] for a in self.levels[level]),
+            factor
+        )
+        bars = {
+            "index": (np.arange(first, max(first, last)) * width).tolist(),
+            "open": opens.tolist(),
+            "high": highs.tolist(),
+            "low": lows.tolist(),
+            "close": closes.tolist()
+        }
+
+        # Trailing partial bar, from raw rows so it never reaches past `end`
+        tail_start = max(first, last) * width
+        if tail_start < end:
+            tail = np.asarray(self.prices[tail_start:end, column])
+            bars["index"].append(tail_start)
+            bars["open"].append(float(tail[0]))
+            bars["high"].append(float(tail.max()))
+            bars["low"].append(float(tail.min()))
+            bars["close"].append(float(tail[-1]))
+        return width, bars
@@ -0,0 +1,345 @@
+"""
+execution.py - Buy/sell order execution.
+
+Concurrency model:
+  - Orders for the same user are serialized by a striped lock, so two
+    buys from one user can never both pass the cash check. Orders from
+    different users only share a stripe by hash collision, never a single
+    global lock.
+  - Each order runs in a BEGIN IMMEDIATE transaction, which takes SQLite's
+    write lock up front (waiting up to the busy timeout) instead of failing
+    when a read transaction tries to upgrade.
+  - Portfolio.version is checked on every update, so a write based on a
+    stale read from another process raises StaleDataError and is retried.
+
+Listeners registered with on_commit() are called after every committed
+order with the user's new cash and the new quantity of each symbol the
+order touched, so in-memory views (e.g. the leaderboard) stay current
+without re-reading the database.
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+import market_clock
+from models import db, Portfolio, Holding, Lot, Order, Transaction
+
+LOCK_STRIPES = 256
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.01  # seconds, doubled on every retry
+
+_user_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_commit_listeners = []
+
+
+class OrderError(Exception):
+    """
+    An order was rejected. `status` is the HTTP status the route returns;
+    `index` is the position of the failing order within a batch.
+    """
+
+    def __init__(self, message, status=400, index=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.index = index
+
+
+def user_lock(user_id):
+    return _user_locks[hash(user_id) % LOCK_STRIPES]
+
+
+def on_commit(listener):
+    """
+    Registers listener(user_id, cash, quantities), called after each
+    committed order. `quantities` maps every symbol the order touched to
+    the user's new holding.
+    """
+    _commit_listeners.append(listener)
+
+
+def _record_holding(holding):
+    db.session.info.setdefault("order_changes", {})[holding.symbol] = holding.quantity
+
+
+def _notify(user_id, cash, quantities):
+    for listener in _commit_listeners:
+        try:
+            listener(user_id, cash, quantities)
+        except Exception as e:
+            print(f"Error in commit listener: {str(e)}")
+
+
+def run_order(user_id, apply):
+    """
+    Loads the user's portfolio in a write transaction, calls
+    apply(portfolio) and commits. Retries on version conflicts and on
+    lock timeouts; OrderError raised by `apply` rolls back and propagates.
+    Returns whatever `apply` returned.
+    """
+    with user_lock(user_id):
+        for attempt in range(MAX_ATTEMPTS):
+            # Reads done by the caller must not hold a deferred transaction open
+            if db.session().in_transaction():
+                db.session.commit()
+            db.session.info.pop("order_changes", None)
+            try:
+                db.session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+                portfolio = Portfolio.query.filter_by(user_id=user_id).first()
+                if not portfolio:
+                    raise OrderError("Portfolio not found.", 404)
+                result = apply(portfolio)
+                cash = portfolio.cash
+                changes = db.session.info.pop("order_changes", {})
+                db.session.commit()
+                _notify(user_id, cash, changes)
+                return result
+            except (StaleDataError, OperationalError) as e:
+                db.session.rollback()
+                if isinstance(e, OperationalError) and "locked" not in str(e):
+                    raise
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+            except Exception:
+                db.session.rollback()
+                raise
+    raise OrderError("The market is busy, please retry.", 503)
+
+
+def apply_buy(portfolio, symbol, quantity, price, tick=None, timestamp=None):
+    """
+    Applies a buy to `portfolio` inside the caller's transaction.
+    Returns the new Transaction row.
+    """
+    total_cost = quantity * price
+    if portfolio.cash < total_cost:
+        raise OrderError("Insufficient funds to buy stock.")
+
+    user_id = portfolio.user_id
+    portfolio.cash -= total_cost
+    holding = db.session.get(Holding, (user_id, symbol))
+    if holding is None:
+        holding = Holding(user_id=user_id, symbol=symbol, quantity=0, cost=0.0, realized_pnl=0.0)
+        db.session.add(holding)
+    holding.quantity += quantity
+    holding.cost += total_cost
+    _record_holding(holding)
+
+    # Open a new lot and record the transaction
+    now = market_clock.now() if timestamp is None else timestamp
+    db.session.add(Lot(
+        user_id=user_id,
+        symbol=symbol,
+        quantity=quantity,
+        remaining=quantity,
+        price=price,
+        timestamp=now
+    ))
+    transaction = Transaction(
+        user_id=user_id,
+        type="buy",
+        symbol=symbol,
+        quantity=quantity,
+        price=price,
+        timestamp=now,
+        tick=tick
+    )
+    db.session.add(transaction)
+    return transaction
+
+
+def apply_sell(portfolio, symbol, quantity, price, tick=None, timestamp=None):
+    """
+    Applies a sell to `portfolio` inside the caller's transaction,
+    consuming lots FIFO (the rules of lot_ledger.LotLedger). The sale
+    proceeds are credited to cash and the difference to the consumed
+    cost is booked as realized P&L. Returns the new Transaction row.
+    """
+    user_id = portfolio.user_id
+    holding = db.session.get(Holding, (user_id, symbol))
+    if holding is None or holding.quantity < quantity:
+        raise OrderError("Insufficient stocks to sell.")
+
+    proceeds = quantity * price
+    consumed_cost = 0.0
+    remaining_quantity = quantity
+
+    # FIFO logic for removing shares from earliest purchase
+    open_lots = Lot.query.filter(
+        Lot.user_id == user_id, Lot.symbol == symbol, Lot.remaining > 0
+    ).order_by(Lot.id)
+    for lot in open_lots:
+        if remaining_quantity == 0:
+            break
+        used = min(lot.remaining, remaining_quantity)
+        consumed_cost += used * lot.price
+        lot.remaining -= used
+        remaining_quantity -= used
+
+    # Update portfolio
+    portfolio.cash += proceeds
+    holding.quantity -= quantity
+    holding.realized_pnl += proceeds - consumed_cost
+    if holding.quantity == 0:
+        # Kept at zero so the symbol's realized P&L survives a full exit
+        holding.cost = 0.0
+        Lot.query.filter(
+            Lot.user_id == user_id, Lot.symbol == symbol, Lot.remaining > 0
+        ).update({"remaining": 0})
+    else:
+        holding.cost -= consumed_cost
+    _record_holding(holding)
+
+    transaction = Transaction(
+        user_id=user_id,
+        type="sell",
+        symbol=symbol,
+        quantity=quantity,
+        price=price,
+        timestamp=market_clock.now() if timestamp is None else timestamp,
+        tick=tick
+    )
+    db.session.add(transaction)
+    return transaction
+
+
+def buy(user_id, symbol, quantity, price, tick=None):
+    """
+    Executes a market buy and returns (portfolio, transaction).
+    """
+    return run_order(user_id, lambda portfolio: (
+        portfolio, apply_buy(portfolio, symbol, quantity, price, tick)
+    ))
+
+
+def sell(user_id, symbol, quantity, price, tick=None):
+    """
+    Executes a market sell and returns (portfolio, transaction).
+    """
+    return run_order(user_id, lambda portfolio: (
+        portfolio, apply_sell(portfolio, symbol, quantity, price, tick)
+    ))
+
+
+def execute_batch(user_id, orders, tick=None):
+    """
+    Executes [(side, symbol, quantity, price), ...] in order, all-or-nothing,
+    in a single transaction. Returns (portfolio, transactions). If any order
+    is rejected nothing is applied and OrderError.index names the culprit.
+    """
+    def apply(portfolio):
+        return portfolio, _apply_orders(portfolio, orders, tick, market_clock.now())
+
+    return run_order(user_id, apply)
+
+
+def _apply_orders(portfolio, orders, tick, timestamp):
+    transactions = []
+    for index, (side, symbol, quantity, price) in enumerate(orders):
+        apply_order = apply_buy if side == "buy" else apply_sell
+        try:
+            transactions.append(apply_order(portfolio, symbol, quantity, price, tick, timestamp))
+        except OrderError as e:
+            e.index = index
+            raise
+    return transactions
+
+
+def execute_group(entries, finish=None):
+    """
+    Executes the orders of many users in a single transaction, so they
+    share one commit. `entries` is [(user_id, orders, tick, timestamp), ...]
+    with `orders` as for execute_batch(). Each entry is all-or-nothing and
+    a rejected entry does not affect the others: apply_buy/apply_sell
+    check before they change anything, so only entries of several orders
+    need a savepoint. Portfolios and holdings are loaded for the whole
+    group up front, and the rows written are flushed together.
+    finish(), if given, runs inside the transaction just before the commit.
+    Returns one result per entry: (the user's new cash, [Transaction.to_dict()
+    of each order]), or the OrderError.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        if db.session().in_transaction():
+            db.session.commit()
+        try:
+            db.session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+            user_ids = {user_id for user_id, _, _, _ in entries}
+            symbols = {order[1] for _, orders, _, _ in entries for order in orders}
+            portfolios = {
+                portfolio.user_id: portfolio
+                for portfolio in Portfolio.query.filter(Portfolio.user_id.in_(user_ids))
+            }
+            # Kept in the identity map, so session.get() needs no query
+            holdings = Holding.query.filter(
+                Holding.user_id.in_(user_ids), Holding.symbol.in_(symbols)
+            ).all()
+            results = []
+            notifications = []
+            for user_id, orders, tick, timestamp in entries:
+                db.session.info.pop("order_changes", None)
+                portfolio = portfolios.get(user_id)
+                try:
+                    if portfolio is None:
+                        raise OrderError("Portfolio not found.", 404)
+                    if len(orders) == 1:
+                        transactions = _apply_orders(portfolio, orders, tick, timestamp)
+                    else:
+                        with db.session.begin_nested():
+                            transactions = _apply_orders(portfolio, orders, tick, timestamp)
+                except OrderError as e:
+                    results.append(e)
+                    continue
+                results.append((portfolio.cash, transactions))
+                notifications.append((user_id, portfolio.cash,
+                                      db.session.info.pop("order_changes", {})))
+            # Assigns the transaction ids
+            db.session.flush()
+            results = [
+                result if isinstance(result, OrderError)
+                else (result[0], [transaction.to_dict() for transaction in result[1]])
+                for result in results
+            ]
+            if finish is not None:
+                finish()
+            db.session.commit()
+            for notification in notifications:
+                _notify(*notification)
+            return results
+        except (StaleDataError, OperationalError) as e:
+            db.session.rollback()
+            if isinstance(e, OperationalError) and "locked" not in str(e):
+                raise
+            time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        except Exception:
+            db.session.rollback()
+            raise
+    raise OrderError("The market is busy, please retry.", 503)
+
+
+def fill_resting_order(order_id, user_id, price, tick=None):
+    """
+    Executes a triggered limit/stop order at `price`. The order is marked
+    filled, or rejected with the reason if the user can no longer afford
+    it. Does nothing if the order was cancelled in the meantime.
+    Returns the Order, or None if it was not open.
+    """
+    def apply(portfolio):
+        order = db.session.get(Order, order_id)
+        if order is None or order.status != "open":
+            return None
+        apply_order = apply_buy if order.side == "buy" else apply_sell
+        now = market_clock.now()
+        try:
+            apply_order(portfolio, order.symbol, order.quantity, price, tick, now)
+        except OrderError as e:
+            order.status = "rejected"
+            order.reason = e.message
+        else:
+            order.status = "filled"
+            order.fill_price = price
+        order.filled_at = now
+        return order
+
+    return run_order(user_id, apply)
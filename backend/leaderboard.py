@@ -0,0 +1,159 @@
+"""
+leaderboard.py - Ranked total equity for every user, refreshed per tick.
+
+Positions are kept as a users x symbols NumPy matrix plus a cash vector,
+updated in place as trades commit. On each price tick total equity is
+one matrix-vector product (cash + holdings @ prices), and the sorted
+ranking is swapped in as an immutable snapshot, so reads (a page of the
+board, or one user's rank) never sort or touch the database.
+"""
+
+import threading
+
+import numpy as np
+
+
+class Ranking:
+    """
+    Result of one refresh. order[i] is the row ranked i+1 and
+    rank_of_row[row] is that row's 0-based rank. `row_of_user` and `names`
+    are shared with the Leaderboard, which only ever appends to them, so
+    rows past len(order) are simply not ranked yet.
+    """
+
+    def __init__(self, tick, user_ids, names, row_of_user, equity, order):
+        self.tick = tick
+        self.user_ids = user_ids
+        self.names = names
+        self.row_of_user = row_of_user
+        self.equity = equity
+        self.order = order
+        self.rank_of_row = np.empty(len(order), dtype=np.int64)
+        self.rank_of_row[order] = np.arange(len(order))
+
+    def __len__(self):
+        return len(self.order)
+
+    def entry(self, row):
+        return {
+            "rank": int(self.rank_of_row[row]) + 1,
+            "user_id": int(self.user_ids[row]),
+            "username": self.names[row],
+            "equity": float(self.equity[row])
+        }
+
+    def page(self, offset, limit):
+        return [self.entry(row) for row in self.order[offset:offset + limit]]
+
+    def lookup(self, user_id):
+        row = self.row_of_user.get(user_id)
+        if row is None or row >= len(self.order):
+            return None
+        return self.entry(row)
+
+
+EMPTY_RANKING = Ranking(0, np.empty(0, dtype=np.int64), [], {}, np.empty(0),
+                        np.empty(0, dtype=np.int64))
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._symbols = []
+        self._columns = {}
+        self._rows = {}  # user_id -> row
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._names = []
+        self._cash = np.empty(0)
+        self._holdings = np.empty((0, 0))
+        self.ranking = EMPTY_RANKING
+
+    def __len__(self):
+        return len(self._rows)
+
+    def load(self, symbols, users, holdings):
+        """
+        Replaces all state. `users` yields (user_id, username, cash) and
+        `holdings` yields (user_id, symbol, quantity).
+        """
+        user_ids, names, cash = [], [], []
+        for user_id, username, user_cash in users:
+            user_ids.append(user_id)
+            names.append(username)
+            cash.append(user_cash or 0.0)
+        rows = {user_id: row for row, user_id in enumerate(user_ids)}
+        columns = {symbol: column for column, symbol in enumerate(symbols)}
+
+        matrix = np.zeros((len(user_ids), len(symbols)))
+        for user_id, symbol, quantity in holdings:
+            row, column = rows.get(user_id), columns.get(symbol)
+            if row is not None and column is not None:
+                matrix[row, column] = quantity
+
+        with self._lock:
+            self._symbols = list(symbols)
+            self._columns = columns
+            self._rows = rows
+            self._user_ids = np.array(user_ids, dtype=np.int64)
+            self._names = names
+            self._cash = np.array(cash, dtype=float)
+            self._holdings = matrix
+
+    def update(self, user_id, cash, quantities, username=None):
+        """
+        Applies a committed trade: the user's new cash and the new quantity
+        of every symbol it touched. Unknown users are appended.
+        """
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._append(user_id, username)
+            self._cash[row] = cash
+            for symbol, quantity in quantities.items():
+                column = self._columns.get(symbol)
+                if column is not None:
+                    self._holdings[row, column] = quantity
+
+    def refresh(self, symbols, prices, tick=0):
+        """
+        Revalues every user at `prices` (a vector aligned with `symbols`)
+        and swaps in a new ranking. Returns the ranking.
+        """
+        with self._lock:
+            if list(symbols) != self._symbols:
+                self._set_symbols(symbols)
+            size = len(self._rows)
+            equity = self._cash[:size].copy()
+            if len(self._symbols):
+                equity += self._holdings[:size] @ np.asarray(prices, dtype=float)
+            order = np.argsort(-equity, kind="stable")
+            self.ranking = Ranking(tick, self._user_ids[:size].copy(), self._names,
+                                   self._rows, equity, order)
+        return self.ranking
+
+    def _append(self, user_id, username):
+        row = len(self._rows)
+        if row == len(self._cash):
+            capacity = max(16, 2 * row)
+            self._cash = np.resize(self._cash, capacity)
+            self._user_ids = np.resize(self._user_ids, capacity)
+            holdings = np.zeros((capacity, len(self._symbols)))
+            holdings[:row] = self._holdings[:row]
+            self._holdings = holdings
+        self._rows[user_id] = row
+        self._user_ids[row] = user_id
+        self._names.append(username or str(user_id))
+        self._cash[row] = 0.0
+        self._holdings[row] = 0.0
+        return row
+
+    def _set_symbols(self, symbols):
+        columns = {symbol: column for column, symbol in enumerate(symbols)}
+        holdings = np.zeros((len(self._cash), len(symbols)))
+        for symbol, old_column in self._columns.items():
+            new_column = columns.get(symbol)
+            if new_column is not None:
+                holdings[:, new_column] = self._holdings[:, old_column]
+        self._symbols = list(symbols)
+        self._columns = columns
+        self._holdings = holdings
@@ -0,0 +1,91 @@
+"""
+lot_ledger.py - FIFO lot accounting with running cost basis.
+
+A LotLedger holds the open lots of one symbol in a deque. Sells consume
+lots from the front: fully used lots are popped and a partially used
+front lot is tracked with a head offset, so nothing is copied. Running
+quantity, cost and realized P&L make average cost and P&L O(1) reads.
+
+The same rules are applied to the lots table by execution.apply_sell,
+which keeps the running totals on the Holding row.
+"""
+
+from collections import deque
+
+
+class LotLedger:
+    def __init__(self):
+        self._lots = deque()  # [quantity, price], oldest first
+        self._head_used = 0   # shares already sold from the front lot
+        self.quantity = 0
+        self.cost = 0.0
+        self.realized_pnl = 0.0
+
+    def __len__(self):
+        return len(self._lots)
+
+    def buy(self, quantity, price):
+        self._lots.append((quantity, price))
+        self.quantity += quantity
+        self.cost += quantity * price
+
+    def sell(self, quantity, price):
+        """
+        Consumes `quantity` shares FIFO at `price`. Returns the realized
+        P&L of this sale.
+        """
+        if quantity > self.quantity:
+            raise ValueError("Insufficient stocks to sell.")
+        remaining = quantity
+        cost = 0.0
+        lots = self._lots
+        while remaining:
+            lot_quantity, lot_price = lots[0]
+            available = lot_quantity - self._head_used
+            used = min(available, remaining)
+            cost += used * lot_price
+            remaining -= used
+            if used == available:
+                lots.popleft()
+                self._head_used = 0
+            else:
+                self._head_used += used
+
+        self.quantity -= quantity
+        self.cost = self.cost - cost if self.quantity else 0.0
+        pnl = quantity * price - cost
+        self.realized_pnl += pnl
+        return pnl
+
+    @property
+    def average_cost(self):
+        return self.cost / self.quantity if self.quantity else 0.0
+
+    def unrealized_pnl(self, price):
+        return self.quantity * price - self.cost
+
+    def open_lots(self):
+        """
+        Yields (remaining_quantity, price) for every open lot, oldest first.
+        """
+        head_used = self._head_used
+        for quantity, price in self._lots:
+            yield quantity - head_used, price
+            head_used = 0
+
+
+def position_summary(quantity, cost, realized_pnl, price):
+    """
+    The per-symbol P&L fields exposed by /api/portfolio, from running
+    totals. `price` may be None if the symbol has no current price.
+    """
+    summary = {
+        "quantity": quantity,
+        "average_cost": cost / quantity if quantity else 0.0,
+        "cost_basis": cost,
+        "realized_pnl": realized_pnl
+    }
+    if price is not None:
+        summary["market_value"] = quantity * price
+        summary["unrealized_pnl"] = quantity * price - cost
+    return summary
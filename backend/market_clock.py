@@ -0,0 +1,229 @@
+"""
+market_clock.py - Pluggable clocks that drive the price feed.
+
+A clock decides when the next price tick is due and what time it is in
+the market, which is also the timestamp put on trades and orders:
+
+  - WallClock: one tick every `interval` seconds of real time.
+  - AcceleratedClock: market time runs `speed` times faster than real
+    time, so ticks come every interval / speed seconds.
+  - ManualClock: ticks only when step() is called; market time advances
+    by exactly `interval` per tick, so runs are deterministic.
+  - SharedClock: the tick is derived from an epoch shared by every
+    process (market_state.py keeps it in SQLite), so any number of
+    worker processes agree on the current tick without talking to
+    each other.
+
+The feed loop calls wait_for_tick(timeout) and processes a tick each time
+it returns True; `clock.tick` is then the tick to process. Ticks count
+from 1 at startup; start_at() moves that on, so that a restarted server
+carries on past the ticks already stamped on trades. The clock in use is
+set with set_clock(); now() reads it.
+
+Choose one with MOCK_TRADING_CLOCK=wall | x<speed> (e.g. x60) | manual |
+shared | shared-x<speed>.
+"""
+
+import threading
+import time
+
+
+class WallClock:
+    speed = 1.0
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.tick = 0
+        self._next_tick = 0.0  # the first tick is due immediately
+
+    def time(self):
+        return time.time()
+
+    def wait_for_tick(self, timeout):
+        """
+        Waits up to `timeout` real seconds for the next tick. Returns True
+        if one is due, which consumes it.
+        """
+        remaining = (self._next_tick - self.time()) / self.speed
+        if remaining > timeout:
+            time.sleep(timeout)
+            return False
+        if remaining > 0:
+            time.sleep(remaining)
+        self._next_tick = self.time() + self.interval
+        self.tick += 1
+        return True
+
+    def start_at(self, tick):
+        """
+        Makes `tick` the next tick, unless the clock is already past it.
+        """
+        self.tick = max(self.tick, tick - 1)
+
+
+class AcceleratedClock(WallClock):
+    def __init__(self, interval, speed):
+        super().__init__(interval)
+        self.speed = speed
+        self._epoch = time.time()
+
+    def time(self):
+        return self._epoch + (time.time() - self._epoch) * self.speed
+
+
+class ManualClock:
+    def __init__(self, interval, start=None):
+        self.interval = interval
+        self._time = time.time() if start is None else start
+        self._pending = 0
+        self._first = 1     # number of the first tick, see start_at()
+        self._taken = 0     # ticks handed to the feed loop
+        self._finished = 0  # ticks the feed loop is done with
+        self._condition = threading.Condition()
+
+    @property
+    def tick(self):
+        return self._first + self._taken - 1
+
+    def start_at(self, tick):
+        """
+        Makes `tick` the next tick, unless the clock is already past it.
+        Only renumbers ticks, so step() waits for the same ones.
+        """
+        with self._condition:
+            self._first = max(self._first, tick - self._taken)
+
+    def time(self):
+        return self._time
+
+    def wait_for_tick(self, timeout):
+        with self._condition:
+            # Being called again means the previous tick was processed
+            if self._finished < self._taken:
+                self._finished = self._taken
+                self._condition.notify_all()
+            if not self._condition.wait_for(lambda: self._pending, timeout):
+                return False
+            self._pending -= 1
+            self._taken += 1
+            self._time += self.interval
+            return True
+
+    def advance(self, count=1):
+        """
+        Moves market time forward `count` ticks with no feed loop involved,
+        for single-threaded callers such as backtest.py.
+        """
+        with self._condition:
+            self._time += count * self.interval
+
+    def step(self, count=1, timeout=None):
+        """
+        Releases `count` ticks and waits (up to `timeout` seconds) until
+        the feed loop has processed them. Returns True if it did.
+        """
+        with self._condition:
+            self._pending += count
+            target = self._taken + self._pending
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: self._finished >= target, timeout)
+
+
+class SharedClock:
+    """
+    Tick n starts at epoch + n * interval market seconds, and market time
+    runs `speed` times faster than real time from the epoch. Until
+    attach() supplies the shared epoch (the database may not be ready
+    yet) no tick is ever due.
+    """
+
+    def __init__(self, interval, speed=1.0):
+        self.interval = interval
+        self.speed = speed
+        self.epoch = None
+        self.tick = 0
+
+    def attach(self, epoch, interval, speed):
+        self.epoch, self.interval, self.speed = epoch, interval, speed
+
+    def time(self):
+        if self.epoch is None:
+            return time.time()
+        return self.epoch + (time.time() - self.epoch) * self.speed
+
+    def tick_time(self, tick):
+        """
+        Market time at which `tick` starts, the same in every process.
+        """
+        return self.epoch + tick * self.interval
+
+    def current_tick(self):
+        """
+        The tick every process agrees is current right now.
+        """
+        if self.epoch is None:
+            return 0
+        return int((self.time() - self.epoch) // self.interval)
+
+    def wait_for_tick(self, timeout):
+        if self.epoch is None:
+            time.sleep(timeout)
+            return False
+        due = self.epoch + (self.tick + 1) * self.interval
+        remaining = (due - self.time()) / self.speed
+        if remaining > timeout:
+            time.sleep(timeout)
+            return False
+        if remaining > 0:
+            time.sleep(remaining)
+        # Skips ticks missed while busy instead of replaying them
+        self.tick = max(self.tick + 1, self.current_tick())
+        return True
+
+
+def _parse_speed(spec):
+    try:
+        speed = float(spec[1:]) if spec.startswith("x") else 0
+    except ValueError:
+        speed = 0
+    if speed <= 0:
+        raise ValueError(f"Unknown clock speed {spec!r}, expected x<speed>")
+    return speed
+
+
+def clock_from_spec(spec, interval):
+    """
+    Builds a clock from a MOCK_TRADING_CLOCK value.
+    """
+    spec = (spec or "wall").strip().lower()
+    if spec == "wall":
+        return WallClock(interval)
+    if spec == "manual":
+        return ManualClock(interval)
+    if spec == "shared":
+        return SharedClock(interval)
+    if spec.startswith("shared-"):
+        return SharedClock(interval, _parse_speed(spec[len("shared-"):]))
+    if spec.startswith("x"):
+        return AcceleratedClock(interval, _parse_speed(spec))
+    raise ValueError(f"Unknown clock {spec!r}, expected wall, manual, x<speed>, "
+                     f"shared or shared-x<speed>")
+
+
+_clock = WallClock(15)
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+
+def get_clock():
+    return _clock
+
+
+def now():
+    """
+    The current market time, used for trade and order timestamps.
+    """
+    return _clock.time()
@@ -0,0 +1,69 @@
+"""
+market_state.py - Market state shared by several app processes.
+
+Under gunicorn every worker imports app.py and runs its own price thread.
+With MOCK_TRADING_CLOCK=shared (or shared-x<speed>) they stay in step
+without talking to each other: the first process to start writes an
+epoch into the market_state row, and every process derives the current
+tick from it (market_clock.SharedClock), so a given tick means the same
+prices everywhere.
+
+Matching resting orders must happen once per tick, not once per process,
+so a single leader does it. Leadership is a lease on the same row that
+the leader renews every tick; if the leader dies another process takes
+over once the lease runs out.
+"""
+
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, MarketState
+
+LEASE_SECONDS = 5.0
+STATE_ID = 1
+
+# Unique per process, even across hosts sharing one database
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def attach(clock):
+    """
+    Loads the shared epoch, creating it on first start, and attaches
+    `clock` to it. A clock started with a different interval or speed
+    follows the stored ones, so all processes tick together.
+    """
+    db.session.execute(
+        insert(MarketState)
+        .values(id=STATE_ID, epoch=time.time(), interval=clock.interval,
+                speed=clock.speed, lease_until=0.0)
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    db.session.commit()
+    state = db.session.get(MarketState, STATE_ID)
+    if state.interval != clock.interval or state.speed != clock.speed:
+        print(f"Shared clock: using stored interval={state.interval} speed={state.speed}")
+    clock.attach(state.epoch, state.interval, state.speed)
+    db.session.commit()
+
+
+def hold_lease(owner=OWNER, duration=LEASE_SECONDS):
+    """
+    Takes or renews the matching lease. Returns True if `owner` holds it
+    for the next `duration` seconds.
+    """
+    now = time.time()
+    result = db.session.execute(
+        update(MarketState)
+        .where(MarketState.id == STATE_ID,
+               or_(MarketState.leader == owner, MarketState.lease_until < now))
+        .values(leader=owner, lease_until=now + duration)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
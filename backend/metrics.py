@@ -0,0 +1,336 @@
+"""
+metrics.py - Request metrics in the Prometheus text format.
+
+init_app() instruments every route of a Flask app:
+  - http_request_duration_seconds     histogram by route, method, status
+  - http_requests_in_flight           gauge by route
+  - http_request_sql_queries          histogram of SQL statements per request
+  - http_request_sql_duration_seconds histogram of SQL time per request
+  - sql_queries_total / sql_query_duration_seconds_total, including the
+    background thread, via SQLAlchemy cursor events
+Other modules add their own instruments (e.g. PRICE_TICK_SECONDS) or
+collectors for values they already count; render() formats everything
+for GET /metrics.
+
+An opt-in sampling profiler samples the stacks of in-flight requests
+every few ms and keeps the slowest requests with their sampled stacks.
+Enable it with METRICS_PROFILER=1 or toggle it with SIGUSR1; turning it
+off prints the report, and GET /metrics/slow serves it while it is on.
+"""
+
+import heapq
+import itertools
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_instruments = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# =========================
+#  INSTRUMENTS
+# =========================
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _instruments.append(self)
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labels, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, *label_values):
+        self.inc(-amount, *label_values)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series = {}  # label values -> [count per bucket..., sum]
+        self._lock = threading.Lock()
+        _instruments.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        samples = []
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                samples.append((self.name + "_bucket",
+                                _labels(self.labels, key, [("le", _number(bound))]), cumulative))
+            samples.append((self.name + "_sum", _labels(self.labels, key), series[-1]))
+            samples.append((self.name + "_count", _labels(self.labels, key), cumulative))
+        return samples
+
+
+def add_collector(collect):
+    """
+    Registers collect() -> [(name, kind, help, value), ...], read on
+    every scrape, for values another module already keeps.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    lines = []
+    for instrument in _instruments:
+        lines.append(f"# HELP {instrument.name} {instrument.help}")
+        lines.append(f"# TYPE {instrument.name} {instrument.kind}")
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in instrument.samples())
+    for collect in _collectors:
+        try:
+            collected = collect()
+        except Exception as e:
+            print(f"Error in metrics collector: {str(e)}")
+            continue
+        for name, kind, help_text, value in collected:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency.",
+                            labels=("route", "method", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled.", labels=("route",))
+REQUEST_QUERIES = Histogram("http_request_sql_queries", "SQL statements per request.",
+                            QUERY_BUCKETS, labels=("route",))
+REQUEST_SQL_SECONDS = Histogram("http_request_sql_duration_seconds", "SQL time per request.",
+                                labels=("route",))
+SQL_QUERIES = Counter("sql_queries_total", "SQL statements executed, in requests or not.")
+SQL_SECONDS = Counter("sql_query_duration_seconds_total", "Time spent executing SQL.")
+PRICE_TICK_SECONDS = Histogram("price_tick_duration_seconds",
+                               "Time to advance the market by one tick.")
+
+
+# =========================
+#  PROFILER
+# =========================
+
+class SlowRequestProfiler:
+    """
+    Samples the stack of every in-flight request every `interval` seconds
+    and keeps the `keep` slowest finished requests with their samples.
+    """
+
+    def __init__(self, interval=0.005, keep=10):
+        self.interval = interval
+        self.keep = keep
+        self.enabled = False
+        self._active = {}   # thread id -> request record
+        self._slowest = []  # min-heap of (duration, seq, record)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def toggle(self):
+        if self.enabled:
+            self.enabled = False
+            print(self.report())
+        else:
+            self.start()
+
+    def start(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        with self._lock:
+            self._slowest = []
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def begin(self, label):
+        if not self.enabled:
+            return None
+        record = {"label": label, "samples": StackCounter(), "duration": 0.0}
+        self._active[threading.get_ident()] = record
+        return record
+
+    def finish(self, record, duration):
+        self._active.pop(threading.get_ident(), None)
+        record["duration"] = duration
+        with self._lock:
+            entry = (duration, next(self._seq), record)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def report(self, top_stacks=5):
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        lines = [f"Slowest {len(slowest)} requests (sampled every {self.interval * 1e3:g} ms):"]
+        for duration, _, record in slowest:
+            lines.append(f"\n{duration * 1e3:9.1f} ms  {record['label']}  "
+                         f"({sum(record['samples'].values())} samples)")
+            for stack, count in record["samples"].most_common(top_stacks):
+                lines.append(f"  {count:5d}  {stack}")
+        return "\n".join(lines) + "\n"
+
+    def _sample(self):
+        me = threading.get_ident()
+        while self.enabled:
+            frames = sys._current_frames()
+            for thread_id, record in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                record["samples"][";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+PROFILER = SlowRequestProfiler()
+
+
+# =========================
+#  FLASK / SQLALCHEMY HOOKS
+# =========================
+
+_local = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    SQL_QUERIES.inc()
+    SQL_SECONDS.inc(elapsed)
+    if getattr(_local, "active", False):
+        _local.queries += 1
+        _local.sql_seconds += elapsed
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _before_request():
+    route = _route()
+    g.metrics_started = time.perf_counter()
+    g.metrics_route = route
+    g.metrics_profile = PROFILER.begin(f"{request.method} {request.full_path}")
+    _local.active, _local.queries, _local.sql_seconds = True, 0, 0.0
+    IN_FLIGHT.inc(1, route)
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(error):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    route = g.pop("metrics_route")
+    status = g.pop("metrics_status", 500)
+    IN_FLIGHT.dec(1, route)
+    REQUEST_SECONDS.observe(duration, route, request.method, str(status))
+    REQUEST_QUERIES.observe(getattr(_local, "queries", 0), route)
+    REQUEST_SQL_SECONDS.observe(getattr(_local, "sql_seconds", 0.0), route)
+    _local.active = False
+    record = g.pop("metrics_profile", None)
+    if record is not None:
+        PROFILER.finish(record, duration)
+
+
+def init_app(app, engine):
+    """
+    Instruments every route of `app` and every statement run on `engine`,
+    and adds GET /metrics and GET /metrics/slow.
+    """
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    # First in line, so the time spent in other before_request hooks counts
+    app.before_request_funcs.setdefault(None, []).insert(0, _before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/slow", methods=["GET"])
+    def slow_requests():
+        if not PROFILER.enabled:
+            return Response("Profiler is off (METRICS_PROFILER=1 or SIGUSR1 to enable).\n",
+                            status=404, mimetype="text/plain")
+        return Response(PROFILER.report(), mimetype="text/plain")
+
+    if os.getenv("METRICS_PROFILER") == "1":
+        PROFILER.start()
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: PROFILER.toggle())
+    except (AttributeError, ValueError):
+        pass  # no SIGUSR1 (Windows) or not the main thread
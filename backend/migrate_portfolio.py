@@ -0,0 +1,172 @@
+"""
+migrate_portfolio.py - Converts the legacy blob columns on `portfolio`
+(stocks, stock_purchases, transactions) into the holdings, lots and
+transactions tables from models.py.
+
+Both blob variants are understood:
+  - app.py's db.JSON columns, which hold JSON-encoded JSON strings
+  - the old PickleType columns from models.py, which hold pickled objects
+Only run it against databases you trust, since pickled values are loaded.
+
+Each portfolio is converted in its own transaction and its legacy columns
+are cleared afterwards, so the script can be interrupted and re-run.
+
+Usage:
+    python migrate_portfolio.py [path/to/users.db]
+"""
+
+import json
+import os
+import pickle
+import sys
+
+from flask import Flask
+from sqlalchemy import text
+
+from lot_ledger import LotLedger
+from models import db, Holding, Lot, Transaction, upgrade_schema
+
+LEGACY_COLUMNS = ("stocks", "stock_purchases", "transactions")
+BATCH_SIZE = 500
+
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///users.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+
+def decode_legacy(value, default):
+    """
+    Decodes a legacy blob value into a Python object, unwrapping pickles
+    and any number of JSON string encodings.
+    """
+    if value is None:
+        return default
+    if isinstance(value, memoryview):
+        value = bytes(value)
+    if isinstance(value, bytes):
+        try:
+            value = pickle.loads(value)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            value = value.decode()
+    while isinstance(value, str):
+        if not value.strip():
+            return default
+        value = json.loads(value)
+    return value
+
+
+def legacy_columns():
+    rows = db.session.execute(text("PRAGMA table_info(portfolio)")).fetchall()
+    present = {row[1] for row in rows}
+    return [column for column in LEGACY_COLUMNS if column in present]
+
+
+def migrate_row(user_id, stocks, stock_purchases, transactions):
+    for entry in transactions:
+        db.session.add(Transaction(
+            user_id=user_id,
+            type=entry["type"],
+            symbol=entry["symbol"],
+            quantity=int(entry["quantity"]),
+            price=float(entry["price"]),
+            timestamp=entry.get("timestamp")
+        ))
+
+    for symbol, purchases in stock_purchases.items():
+        for purchase in purchases:
+            quantity = int(purchase["quantity"])
+            if quantity <= 0:
+                continue
+            db.session.add(Lot(
+                user_id=user_id,
+                symbol=symbol,
+                quantity=quantity,
+                remaining=quantity,
+                price=float(purchase["price"])
+            ))
+
+    for symbol, quantity in stocks.items():
+        if int(quantity) > 0:
+            db.session.merge(Holding(
+                user_id=user_id,
+                symbol=symbol,
+                quantity=int(quantity),
+                cost=sum(float(p["quantity"]) * float(p["price"])
+                         for p in stock_purchases.get(symbol, [])),
+                realized_pnl=replay_realized_pnl(transactions, symbol)
+            ))
+
+
+def replay_realized_pnl(transactions, symbol):
+    """
+    Realized P&L of `symbol`, replayed FIFO from the legacy history.
+    Inconsistent histories (selling more than was bought) count as 0.
+    """
+    ledger = LotLedger()
+    try:
+        for entry in transactions:
+            if entry["symbol"] != symbol:
+                continue
+            if entry["type"] == "buy":
+                ledger.buy(int(entry["quantity"]), float(entry["price"]))
+            else:
+                ledger.sell(int(entry["quantity"]), float(entry["price"]))
+    except ValueError:
+        return 0.0
+    return ledger.realized_pnl
+
+
+def migrate():
+    upgrade_schema()
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_portfolio_user_id ON portfolio (user_id)"
+    ))
+    db.session.commit()
+
+    columns = legacy_columns()
+    if not columns:
+        print("No legacy portfolio columns found, nothing to migrate.")
+        return
+
+    select_columns = ", ".join(columns)
+    pending = " OR ".join(f"{column} IS NOT NULL" for column in columns)
+    clear = ", ".join(f"{column} = NULL" for column in columns)
+
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(text(
+            f"SELECT id, user_id, {select_columns} FROM portfolio "
+            f"WHERE id > :last_id AND ({pending}) ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+
+        for row in rows:
+            values = dict(zip(columns, row[2:]))
+            try:
+                migrate_row(
+                    row.user_id,
+                    decode_legacy(values.get("stocks"), {}),
+                    decode_legacy(values.get("stock_purchases"), {}),
+                    decode_legacy(values.get("transactions"), [])
+                )
+                db.session.execute(
+                    text(f"UPDATE portfolio SET {clear} WHERE id = :id"), {"id": row.id}
+                )
+                db.session.commit()
+                migrated += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error migrating portfolio {row.id}: {str(e)}")
+            last_id = row.id
+
+    print(f"Migrated {migrated} portfolio(s).")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.abspath(sys.argv[1])
+    db.init_app(app)
+    with app.app_context():
+        migrate()
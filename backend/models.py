@@ -1,7 +1,32 @@
+"""
+models.py - SQLAlchemy models shared by app.py and the maintenance scripts.
+
+Positions are stored as rows instead of JSON blobs on Portfolio:
+  - holdings:     current quantity per (user_id, symbol)
+  - lots:         one row per purchase; `remaining` is consumed FIFO by sells
+  - transactions: append-only trade ledger
+so a trade touches a constant number of rows however old the account is.
+"""
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 
 db = SQLAlchemy()
 
+# Columns added after a table was first created. create_all() never alters
+# existing tables, so upgrade_schema() adds these in place and runs the
+# optional backfill statement.
+ADDED_COLUMNS = {
+    "portfolio": [("version", "INTEGER NOT NULL DEFAULT 1", None)],
+    "holdings": [
+        ("cost", "FLOAT NOT NULL DEFAULT 0",
+         "UPDATE holdings SET cost = (SELECT COALESCE(SUM(lots.remaining * lots.price), 0) "
+         "FROM lots WHERE lots.user_id = holdings.user_id AND lots.symbol = holdings.symbol "
+         "AND lots.remaining > 0)"),
+        ("realized_pnl", "FLOAT NOT NULL DEFAULT 0", None),
+    ],
+}
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -9,9 +34,208 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
 
 class Portfolio(db.Model):
+    __tablename__ = "portfolio"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     cash = db.Column(db.Float, default=10000.0)
-    stocks = db.Column(db.PickleType, default={})
-    stock_purchases = db.Column(db.PickleType, default={})
-    transactions = db.Column(db.PickleType, default=[])
+    # Bumped on every update; a write based on a stale read fails instead
+    # of silently overwriting another worker's trade.
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {"version_id_col": version}
+
+class Holding(db.Model):
+    __tablename__ = "holdings"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    symbol = db.Column(db.String(32), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    # Running totals so average cost and P&L never need the lots:
+    # cost of the open quantity, and P&L realized by past sells
+    cost = db.Column(db.Float, nullable=False, default=0.0)
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+
+class Lot(db.Model):
+    __tablename__ = "lots"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    remaining = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.Float)
+
+    __table_args__ = (
+        # Partial index: FIFO lookups skip fully consumed lots entirely
+        db.Index("ix_lots_open", "user_id", "symbol", "id",
+                 sqlite_where=db.text("remaining > 0")),
+    )
+
+class Transaction(db.Model):
+    __tablename__ = "transactions"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    type = db.Column(db.String(8), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.Float)
+    tick = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index("ix_transactions_user", "user_id", "id"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "symbol": self.symbol,
+            "quantity": self.quantity,
+            "price": self.price,
+            "timestamp": self.timestamp
+        }
+
+class Order(db.Model):
+    """
+    A resting limit or stop order. `status` moves from "open" to exactly
+    one of "filled", "cancelled" or "rejected".
+    """
+    __tablename__ = "orders"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    side = db.Column(db.String(8), nullable=False)
+    type = db.Column(db.String(8), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    trigger_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="open")
+    reason = db.Column(db.String(120))
+    created_at = db.Column(db.Float)
+    filled_at = db.Column(db.Float)
+    fill_price = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index("ix_orders_user", "user_id", "id"),
+        db.Index("ix_orders_open", "id", sqlite_where=db.text("status = 'open'")),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "side": self.side,
+            "type": self.type,
+            "symbol": self.symbol,
+            "quantity": self.quantity,
+            "price": self.trigger_price,
+            "status": self.status,
+            "reason": self.reason,
+            "created_at": self.created_at,
+            "filled_at": self.filled_at,
+            "fill_price": self.fill_price
+        }
+
+# Archives written by admin.py, keyed by season name
+
+class Season(db.Model):
+    """
+    One archive run. `last_user_id` is advanced in the same transaction
+    as each chunk, so an interrupted run resumes after it.
+    """
+    __tablename__ = "seasons"
+    name = db.Column(db.String(64), primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)  # "snapshot" or "rollover"
+    started_at = db.Column(db.Float, nullable=False)
+    finished_at = db.Column(db.Float)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)
+    users = db.Column(db.Integer, nullable=False, default=0)
+
+class SeasonPortfolio(db.Model):
+    __tablename__ = "season_portfolios"
+    season = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    cash = db.Column(db.Float, nullable=False)
+
+class SeasonHolding(db.Model):
+    __tablename__ = "season_holdings"
+    season = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(32), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    cost = db.Column(db.Float, nullable=False)
+    realized_pnl = db.Column(db.Float, nullable=False)
+
+class SeasonTransaction(db.Model):
+    __tablename__ = "season_transactions"
+    season = db.Column(db.String(64), primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)  # id in the transactions table
+    user_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(8), nullable=False)
+    symbol = db.Column(db.String(32), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.Float)
+    tick = db.Column(db.Integer)
+
+class MarketState(db.Model):
+    """
+    One row (id=1) shared by every app process: the epoch the shared
+    market clock counts ticks from, and a lease naming the process that
+    matches resting orders. See market_state.py.
+    """
+    __tablename__ = "market_state"
+    id = db.Column(db.Integer, primary_key=True)
+    epoch = db.Column(db.Float, nullable=False)
+    interval = db.Column(db.Float, nullable=False)
+    speed = db.Column(db.Float, nullable=False, default=1.0)
+    leader = db.Column(db.String(120))
+    lease_until = db.Column(db.Float, nullable=False, default=0.0)
+
+class JournalState(db.Model):
+    """
+    How far each trade journal has been applied to the database; updated
+    in the same transaction as the orders. See trade_journal.py.
+    """
+    __tablename__ = "trade_journal"
+    name = db.Column(db.String(512), primary_key=True)  # absolute path of the journal file
+    applied_seq = db.Column(db.Integer, nullable=False, default=0)
+
+def upgrade_schema():
+    """
+    Creates missing tables and adds columns listed in ADDED_COLUMNS to
+    tables created by older versions of the app.
+    """
+    db.create_all()
+    inspector = inspect(db.engine)
+    for table, columns in ADDED_COLUMNS.items():
+        present = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl, backfill in columns:
+            if name not in present:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                if backfill:
+                    db.session.execute(text(backfill))
+    db.session.commit()
+
+def configure_sqlite(engine, busy_timeout_ms=5000):
+    """
+    Runs SQLite in WAL mode so readers never block the writer, waits up to
+    `busy_timeout_ms` for the write lock instead of failing immediately,
+    and lets callers open a write transaction with BEGIN IMMEDIATE by
+    passing the execution option sqlite_begin="IMMEDIATE".
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let the "begin" hook below emit BEGIN instead of pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection):
+        mode = connection.get_execution_options().get("sqlite_begin")
+        connection.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
@@ -0,0 +1,116 @@
+"""
+order_book.py - In-memory index of resting limit and stop orders.
+
+Every resting order fires when the price crosses its trigger in one
+direction, so each symbol needs only two heaps:
+  - below: fires when price <= trigger (buy limit, sell stop), max-heap
+  - above: fires when price >= trigger (sell limit, buy stop), min-heap
+A tick pops just the orders the new price crosses, O(k log n) for k fills
+out of n resting orders. Cancelled orders are dropped lazily when they
+reach the top of a heap, and a heap is rebuilt once most of it is dead.
+"""
+
+import heapq
+import itertools
+import threading
+
+ORDER_SIDES = ("buy", "sell")
+ORDER_TYPES = ("limit", "stop")
+
+
+def fires_below(side, order_type):
+    """
+    True if the order fires when the price falls to its trigger.
+    """
+    return (side, order_type) in (("buy", "limit"), ("sell", "stop"))
+
+
+class SymbolBook:
+    def __init__(self):
+        self.below = []  # (-trigger, seq, order_id)
+        self.above = []  # (trigger, seq, order_id)
+        self.live = 0  # entries not cancelled yet
+
+    def __len__(self):
+        return len(self.below) + len(self.above)
+
+
+class OrderBook:
+    def __init__(self):
+        self._books = {}
+        self._live = {}  # order_id -> (symbol, user_id)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._live)
+
+    def add(self, order_id, user_id, symbol, side, order_type, trigger):
+        """
+        Adds a resting order. Adding an order that is already resting is a
+        no-op, so the book can be re-synced from the orders table.
+        """
+        with self._lock:
+            if order_id in self._live:
+                return
+            book = self._books.get(symbol)
+            if book is None:
+                book = self._books[symbol] = SymbolBook()
+            if fires_below(side, order_type):
+                heapq.heappush(book.below, (-trigger, next(self._seq), order_id))
+            else:
+                heapq.heappush(book.above, (trigger, next(self._seq), order_id))
+            book.live += 1
+            self._live[order_id] = (symbol, user_id)
+
+    def cancel(self, order_id):
+        """
+        Removes an order from the book. Returns False if it was not resting.
+        """
+        with self._lock:
+            entry = self._live.pop(order_id, None)
+            if entry is None:
+                return False
+            book = self._books[entry[0]]
+            book.live -= 1
+            if len(book) > 64 and len(book) > 2 * book.live:
+                self._compact(book)
+            return True
+
+    def pop_triggered(self, prices):
+        """
+        Pops every order crossed by `prices` ({symbol: price}). Returns a
+        list of (order_id, user_id, symbol, price); orders with the same
+        trigger come out in the order they were placed.
+        """
+        fired = []
+        with self._lock:
+            for symbol, book in list(self._books.items()):
+                price = prices.get(symbol)
+                if price is None:
+                    continue
+                below, above = book.below, book.above
+                while below and -below[0][0] >= price:
+                    self._fire(heapq.heappop(below)[2], book, price, fired)
+                while above and above[0][0] <= price:
+                    self._fire(heapq.heappop(above)[2], book, price, fired)
+                if not book:
+                    del self._books[symbol]
+        return fired
+
+    def clear(self):
+        with self._lock:
+            self._books.clear()
+            self._live.clear()
+
+    def _fire(self, order_id, book, price, fired):
+        entry = self._live.pop(order_id, None)
+        if entry is not None:
+            book.live -= 1
+            fired.append((order_id, entry[1], entry[0], price))
+
+    def _compact(self, book):
+        book.below = [item for item in book.below if item[2] in self._live]
+        book.above = [item for item in book.above if item[2] in self._live]
+        heapq.heapify(book.below)
+        heapq.heapify(book.above)
@@ -0,0 +1,123 @@
+"""
+password_pool.py - PBKDF2 hashing and verification off the request threads.
+
+generate_password_hash / check_password_hash spend ~100s of ms of pure
+CPU holding the GIL, so a burst of logins stalls every other request in
+the process. Here they run in a small process pool instead. The number
+of calls queued or running is capped; past the cap PoolBusy is raised at
+once so the route can answer 503 + Retry-After rather than pile up work.
+
+With workers=0 the calls run inline (no pool), which is the old
+behaviour and handy for scripts.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+HASH_METHOD = "pbkdf2:sha256"
+WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", min(os.cpu_count() or 1, 4)))
+MAX_PENDING = WORKERS * 8
+RETRY_AFTER = 2  # seconds, suggested to clients when the pool is full
+TIMEOUT = 30
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(MAX_PENDING, 1))
+rejected = 0  # calls turned away: queue full, timed out or pool broken
+
+
+class PoolBusy(Exception):
+    """
+    The hashing queue is full; retry after `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after=RETRY_AFTER):
+        super().__init__("Too many logins in progress, please retry.")
+        self.retry_after = retry_after
+
+
+def configure(workers, max_pending=None):
+    """
+    Resizes the pool (0 = run inline). Must not be called while hashes
+    are in flight.
+    """
+    global WORKERS, MAX_PENDING, _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+        WORKERS = workers
+        MAX_PENDING = max_pending if max_pending is not None else workers * 8
+        _slots = threading.BoundedSemaphore(max(MAX_PENDING, 1))
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a process that runs the price thread
+            # and request threads can copy a held lock into the child
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run(fn, *args):
+    global rejected
+    if WORKERS <= 0:
+        return fn(*args)
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        rejected += 1
+        raise PoolBusy()
+    try:
+        pool = _get_pool()
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _broken(pool)
+        raise PoolBusy()
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the hash is done, not until we stop waiting:
+    # cancel() cannot stop a worker that has started, so releasing it on a
+    # timeout would let more work pile up in the pool than MAX_PENDING
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(TIMEOUT)
+    except TimeoutError:
+        # Saturated: answer 503 rather than let the request fail with a 500
+        future.cancel()
+        rejected += 1
+        raise PoolBusy()
+    except BrokenProcessPool:
+        _broken(pool)
+        raise PoolBusy()
+
+
+def _broken(pool):
+    # A worker died (e.g. OOM-killed); start a fresh pool next time
+    global rejected
+    _discard_pool(pool)
+    rejected += 1
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
@@ -0,0 +1,118 @@
+"""
+portfolio_cache.py - Bounded LRU cache of per-user portfolio data.
+
+A portfolio only changes when its owner trades, but the frontend reads
+it on every price tick. Entries hold everything a portfolio response
+needs that does not depend on prices, tagged with Portfolio.version, and
+keep their last serialized body so repeated reads at the same tick cost
+a dict lookup. Entries are dropped when a trade for that user commits
+(execution.on_commit), and refetched after `max_age` seconds so writes
+made by other processes show up eventually.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = 10000
+MAX_AGE = 60  # seconds
+
+
+class CachedPortfolio:
+    """
+    The price-independent part of one user's portfolio. `holdings` is a
+    list of (symbol, quantity, cost, realized_pnl); `transactions` is the
+    latest page of them, continued from `transactions_cursor`.
+    """
+
+    def __init__(self, user_id, version, cash, holdings, stock_purchases, transactions,
+                 transactions_cursor=None):
+        self.user_id = user_id
+        self.version = version
+        self.cash = cash
+        self.holdings = holdings
+        self.stock_purchases = stock_purchases
+        self.transactions = transactions
+        self.transactions_cursor = transactions_cursor
+        self.loaded_at = time.monotonic()
+        self.rendered = None     # (tick, serialized /api/portfolio body)
+        self.public_body = None  # serialized /api/portfolio/<user_id> body
+
+
+class PortfolioCache:
+    def __init__(self, capacity=CACHE_SIZE, max_age=MAX_AGE):
+        self.capacity = capacity
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        # user_id -> [loads in progress, invalidations since the first began];
+        # only users being loaded have one, so it stays as small as the concurrency
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, load):
+        """
+        Returns the cached entry for `user_id`, calling load(user_id) on a
+        miss. `load` returns a CachedPortfolio or None (no such user).
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.max_age:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            generation = loading[1]
+
+        entry = None
+        try:
+            entry = load(user_id)
+        finally:
+            with self._lock:
+                loading[0] -= 1
+                if not loading[0]:
+                    del self._loading[user_id]
+                # A trade committed while we were loading: serve what we
+                # read, but don't cache it
+                if entry is not None and loading[1] == generation:
+                    self._entries[user_id] = entry
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.capacity:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return entry
+
+    def _bump(self, user_id):
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            loading[1] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._bump(user_id)
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for user_id in self._loading:
+                self._bump(user_id)
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
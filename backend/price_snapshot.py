@@ -0,0 +1,137 @@
+"""
+price_snapshot.py - Per-tick price snapshots for /api/stock_prices, with
+symbol filtering, deltas and a compact binary encoding.
+
+Each published tick keeps its row as a NumPy array plus the columns that
+changed since the previous tick, computed once at publish time, so a
+client polling with ?since=<its last timestamp> is sent only the prices
+that moved. The common delta (one tick back) and the full row are
+pre-encoded; older deltas are merged once per tick and cached.
+
+Binary encoding (little-endian), for ?format=binary:
+    4s  magic b"MKP1"
+    I   layout: crc32 of the newline-joined symbol list, see layout_id()
+    I   flags: 1 = delta
+    d   timestamp
+    I   count
+    count x I  column indexes into the symbol list
+    count x d  prices
+Clients get the symbol list from /api/stock_prices/symbols and refetch
+it when `layout` changes.
+"""
+
+import collections
+import json
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+BINARY_MAGIC = b"MKP1"
+BINARY_HEADER = struct.Struct("<4sIIdI")
+BINARY_MIMETYPE = "application/vnd.mock-trading.prices"
+FLAG_DELTA = 1
+
+
+def layout_id(symbols):
+    return zlib.crc32("\n".join(symbols).encode())
+
+
+class Snapshot:
+    """
+    One tick's prices. `changed` holds the columns that differ from the
+    previous snapshot (all of them after a layout change).
+    """
+
+    def __init__(self, tick, timestamp, symbols, columns, layout, row, changed, previous=None):
+        self.tick = tick
+        self.timestamp = timestamp
+        self.symbols = symbols
+        self.columns = columns  # symbol -> column, shared while the layout holds
+        self.layout = layout
+        self.row = row
+        self.changed = changed
+        self.previous_timestamp = previous.timestamp if previous is not None else None
+        everything = np.arange(len(symbols), dtype=np.uint32)
+        self.full_json = self.encode_json(everything)
+        self.full_binary = self.encode_binary(everything)
+        self.delta_json = self.encode_json(changed, since=self.previous_timestamp)
+        self.delta_binary = self.encode_binary(changed, delta=True)
+        self._merged = {}  # since timestamp -> columns changed since then
+
+    def encode_json(self, columns, since=None, unknown=None):
+        payload = {
+            "prices": dict(zip([self.symbols[c] for c in columns.tolist()],
+                               self.row[columns].tolist())),
+            "timestamp": self.timestamp
+        }
+        if since is not None:
+            payload["since"] = since
+            payload["delta"] = True
+        if unknown:
+            payload["unknown"] = unknown
+        return json.dumps(payload)
+
+    def encode_binary(self, columns, delta=False):
+        header = BINARY_HEADER.pack(BINARY_MAGIC, self.layout, FLAG_DELTA if delta else 0,
+                                    self.timestamp, len(columns))
+        return (header + columns.astype("<u4").tobytes()
+                + self.row[columns].astype("<f8").tobytes())
+
+
+class SnapshotHistory:
+    """
+    The last `history` snapshots, so deltas can reach that many ticks back.
+    """
+
+    def __init__(self, history=64):
+        self._snapshots = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def publish(self, tick, timestamp, symbols, row):
+        row = np.array(row, dtype=np.float64)
+        layout = layout_id(symbols)
+        previous = self.latest()
+        if previous is None or previous.layout != layout:
+            symbols = list(symbols)
+            columns = {symbol: i for i, symbol in enumerate(symbols)}
+            changed = np.arange(len(symbols), dtype=np.uint32)
+        else:
+            symbols, columns = previous.symbols, previous.columns
+            changed = np.flatnonzero(row != previous.row).astype(np.uint32)
+        snapshot = Snapshot(tick, timestamp, symbols, columns, layout, row, changed, previous)
+        with self._lock:
+            self._snapshots.append(snapshot)
+        return snapshot
+
+    def latest(self):
+        snapshots = self._snapshots
+        return snapshots[-1] if snapshots else None
+
+    def changed_since(self, snapshot, since):
+        """
+        Columns of `snapshot` that changed after the tick stamped `since`,
+        or None if that tick is no longer (or never was) in the history.
+        """
+        if since == snapshot.previous_timestamp:
+            return snapshot.changed
+        if since == snapshot.timestamp:
+            return np.empty(0, dtype=np.uint32)
+        cached = snapshot._merged.get(since)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            snapshots = list(self._snapshots)
+        for start, earlier in enumerate(snapshots):
+            if earlier.timestamp == since:
+                break
+        else:
+            return None
+        later = snapshots[start + 1:]
+        if any(s.layout != snapshot.layout for s in later) or snapshot not in later:
+            return None
+        merged = np.unique(np.concatenate([s.changed for s in later])).astype(np.uint32)
+        snapshot._merged[since] = merged
+        return merged
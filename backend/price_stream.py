@@ -0,0 +1,107 @@
+"""
+price_stream.py - Server-Sent Events fan-out for price ticks.
+
+The price thread publishes one snapshot per tick. The snapshot is
+serialized once, as both a plain JSON body (for the polling endpoint)
+and an SSE frame, and every subscriber is handed the same bytes.
+Listeners added with add_listener() are called with each new event, e.g.
+to hand it to asgi.py's event loop.
+"""
+
+import collections
+import json
+import threading
+
+KEEPALIVE_INTERVAL = 15  # seconds
+
+
+class PriceEvent:
+    def __init__(self, event_id, payload):
+        self.id = event_id
+        self.payload = payload
+        self.body = json.dumps(payload)
+        self.frame = f"id: {event_id}\nevent: prices\ndata: {self.body}\n\n"
+        self.frame_bytes = self.frame.encode()
+
+
+class PriceBroadcaster:
+    """
+    Keeps the last `history` events so reconnecting clients can resume
+    from their Last-Event-ID, and wakes every waiting subscriber when a
+    new event is published.
+    """
+
+    def __init__(self, history=64):
+        self._events = collections.deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        Calls listener(event) after every publish, on the publishing thread.
+        """
+        self._listeners.append(listener)
+
+    def publish(self, event_id, payload):
+        event = PriceEvent(event_id, payload)
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener(event)
+        return event
+
+    def latest(self):
+        """
+        Returns the most recent PriceEvent, or None before the first tick.
+        """
+        events = self._events
+        return events[-1] if events else None
+
+    def events_after(self, last_id):
+        """
+        The events a client that last saw `last_id` should be sent now.
+        """
+        with self._cond:
+            if last_id is None:
+                return list(self._events)[-1:]
+            missed = [event for event in self._events if event.id > last_id]
+            # Ticks are full snapshots, so if the client fell further behind
+            # than the history reaches, the latest event is all it needs.
+            if missed and missed[0].id != last_id + 1:
+                return missed[-1:]
+            # An id from before a server restart can be ahead of ours.
+            if not missed and self._events and self._events[-1].id < last_id:
+                return list(self._events)[-1:]
+            return missed
+
+    def subscribe(self, last_event_id=None, keepalive=KEEPALIVE_INTERVAL):
+        """
+        Generator of SSE frames. Replays what the client missed since
+        `last_event_id`, then blocks until the next publish. A comment frame
+        is sent every `keepalive` seconds so idle connections stay open and
+        disconnected clients are noticed.
+        """
+        yield "retry: 3000\n\n"
+        last_id = last_event_id
+        while True:
+            events = self.events_after(last_id)
+            if events:
+                for event in events:
+                    yield event.frame
+                last_id = events[-1].id
+                continue
+
+            with self._cond:
+                latest = self.latest()
+                idle = latest is None or latest.id == last_id
+                timed_out = idle and not self._cond.wait(keepalive)
+            if timed_out:
+                yield ": keepalive\n\n"
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
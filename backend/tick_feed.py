@@ -0,0 +1,373 @@
+"""
+tick_feed.py - Live price feed in place of the cycled test.csv.
+
+A TickFeed keeps the last `capacity` ticks in a ring buffer and is used
+as app.TICK_STORE. Tick t lives in slot t % capacity, and the buffer is
+exposed as a TickSeries whose rows are the slots, so every reader that
+looks a tick up as prices[tick % len(series)] finds its prices for as
+long as the tick is retained. Ticks are numbered in arrival order and
+never wrap.
+
+Two sources fill it, selected with MOCK_TRADING_FEED:
+  - api:           POST /api/ticks (admin token), in batches.
+  - tail:<path>:   follows a growing CSV (header row of symbols, as
+                   written by CSV_generator.py) or binary tick file
+                   (tick_store.py format), from its current end.
+  - replay:<path>: the same, from the first row.
+A file is never re-read: FileTail keeps the offset of the first unread
+row and only parses what was appended since the last poll.
+
+FeedClock drives the market loop from the feed: a tick is due whenever
+one has arrived that the market has not processed, and ticks are
+processed in order. Ingestion is refused (POST gets 503) or paused (file
+tail) while the market is more than `max_lag` ticks behind, so the ring
+never overwrites a tick the market has not seen.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from candles import CandleSet, MAX_POINTS
+from tick_store import BINARY_MAGIC, PRICE_DTYPE, EMPTY_SERIES, TickSeries, TickStore, read_binary_header
+
+RING_CAPACITY = 65536  # ticks
+TAIL_POLL_INTERVAL = 0.2  # seconds
+TAIL_MAX_ROWS = 4096  # rows parsed per poll
+RETRY_AFTER = 1  # seconds, suggested to producers refused for lag
+TIMESTAMP_STEP = 1e-3  # seconds between ticks that arrive with the same timestamp
+
+
+class FeedBusy(Exception):
+    """
+    The market is too far behind the feed; retry after `retry_after`
+    seconds.
+    """
+
+    def __init__(self, lag, retry_after=RETRY_AFTER):
+        super().__init__(f"The market is {lag} ticks behind the feed, please retry.")
+        self.lag = lag
+        self.retry_after = retry_after
+
+
+class FeedCandles:
+    """
+    CandleSet.query() over the ticks a TickFeed retains, by tick number.
+    Bars are built per query from the raw prices in range, so nothing is
+    maintained per tick.
+    """
+
+    def __init__(self, feed):
+        self.feed = feed
+
+    def query(self, column, start, end, resolution=1, max_points=MAX_POINTS):
+        oldest, newest = self.feed.retained()
+        start, end = max(start, oldest), min(end, newest + 1)
+        prices = self.feed.window(column, start, end)
+        width, bars = CandleSet(prices[:, None], resolutions=(1,)).query(
+            0, 0, len(prices), resolution, max_points
+        )
+        bars["index"] = [start + index for index in bars["index"]]
+        return width, bars
+
+
+class TickFeed(TickStore):
+    """
+    Ring buffer of the most recent ticks. The symbols are fixed by the
+    first append(); later ticks may price any subset of them, and the
+    others keep their previous price.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY, max_lag=None):
+        super().__init__(None)
+        self.capacity = capacity
+        self.max_lag = max_lag or capacity // 2
+        self.next_tick = 0     # number given to the next tick appended
+        self.consumed = -1     # last tick handed to the market loop
+        self._timestamps = np.zeros(capacity)
+        self._last_row = None
+        self._condition = threading.Condition()
+        self.ingested = 0
+        self.rejected = 0      # batches refused because of lag
+        self.throttled = 0     # file tail polls paused because of lag
+        self.dropped = 0       # ticks overwritten before the market saw them
+
+    def refresh(self):
+        # Filled by append(), never reloaded from a file
+        return False
+
+    def lag(self):
+        return self.next_tick - 1 - self.consumed
+
+    def retained(self):
+        """
+        (oldest, newest) tick numbers held; newest < oldest when empty.
+        """
+        return max(self.next_tick - self.capacity, 0), self.next_tick - 1
+
+    def start_at(self, tick):
+        """
+        Numbers ticks from `tick` on, e.g. past the ticks already stamped
+        on trades, if nothing was appended yet.
+        """
+        with self._condition:
+            if self.next_tick == 0 and self.consumed == -1:
+                self.next_tick = tick
+                self.consumed = tick - 1
+
+    def room(self):
+        return max(self.max_lag - self.lag(), 0)
+
+    def append(self, symbols, rows, timestamps=None, force=False):
+        """
+        Appends ticks: `rows` is (ticks, len(symbols)) prices, NaN for
+        unchanged. Raises FeedBusy if they would put the market more than
+        max_lag ticks behind (unless `force`), ValueError for symbols
+        outside the feed or a first tick that does not price them all.
+        Returns the (first, last) tick numbers given to them.
+        """
+        rows = np.asarray(rows, dtype=PRICE_DTYPE)
+        if rows.ndim != 2 or rows.shape[1] != len(symbols):
+            raise ValueError("Expected one price per symbol in every tick.")
+        if not symbols or len(set(symbols)) != len(symbols):
+            raise ValueError("Expected a list of distinct symbols.")
+        count = len(rows)
+        if count == 0:
+            raise ValueError("No ticks given.")
+        if count > self.max_lag:
+            raise ValueError(f"At most {self.max_lag} ticks per batch.")
+
+        with self._condition:
+            if not force and self.lag() + count > self.max_lag:
+                self.rejected += 1
+                raise FeedBusy(self.lag())
+            series = self.series
+            if series is EMPTY_SERIES:
+                series = TickSeries(symbols, np.zeros((self.capacity, len(symbols)), dtype=PRICE_DTYPE))
+                series.live = True
+                series.candles = FeedCandles(self)
+            unknown = [symbol for symbol in symbols if symbol not in series.columns]
+            if unknown:
+                raise ValueError(f"Unknown symbols: {', '.join(unknown)}")
+
+            # Carry the previous price forward where a tick has none
+            full = np.full((count + 1, len(series.symbols)), np.nan)
+            if self._last_row is not None:
+                full[0] = self._last_row
+            full[1:, [series.columns[symbol] for symbol in symbols]] = rows
+            valid = ~np.isnan(full)
+            source = np.maximum.accumulate(np.where(valid, np.arange(count + 1)[:, None], 0), axis=0)
+            full = np.take_along_axis(full, source, axis=0)[1:]
+            if np.isnan(full[0]).any():
+                raise ValueError("The first tick must price every symbol.")
+
+            # Strictly increasing timestamps, so each tick has its own ETag
+            previous = self._timestamps[(self.next_tick - 1) % self.capacity] if self._last_row is not None else 0.0
+            steps = np.arange(1, count + 1) * TIMESTAMP_STEP
+            stamps = np.full(count, time.time()) if timestamps is None else np.asarray(timestamps, dtype=float)
+            if stamps.shape != (count,) or not np.isfinite(stamps).all():
+                raise ValueError("Expected one numeric timestamp per tick.")
+            stamps = steps + np.maximum(previous, np.maximum.accumulate(stamps - steps))
+
+            first = self.next_tick
+            slots = np.arange(first, first + count) % self.capacity
+            series.prices[slots] = full
+            self._timestamps[slots] = stamps
+            self._last_row = full[-1].copy()
+            self.next_tick += count
+            series.first_tick = self.retained()[0]
+            self.series = series
+            self.ingested += count
+            self._condition.notify_all()
+            return first, first + count - 1
+
+    def window(self, column, start, end):
+        """
+        Prices of one column for ticks [start, end), oldest first; the
+        range must be retained.
+        """
+        series = self.series
+        if end <= start or series is EMPTY_SERIES:
+            return np.empty(0, dtype=PRICE_DTYPE)
+        return series.prices[np.arange(start, end) % self.capacity, column]
+
+    def timestamp(self, tick):
+        return float(self._timestamps[tick % self.capacity])
+
+    def next_due(self, timeout):
+        """
+        Waits up to `timeout` seconds for a tick the market has not
+        processed and hands it over. Returns its number, or None.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.next_tick - 1 > self.consumed, timeout):
+                return None
+            tick = max(self.consumed + 1, self.retained()[0])
+            self.dropped += tick - (self.consumed + 1)
+            self.consumed = tick
+            return tick
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "lag": self.lag(),
+            "ingested": self.ingested,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "dropped": self.dropped
+        }
+
+
+class FeedClock:
+    """
+    Market clock for a TickFeed (see market_clock.py for the interface):
+    wait_for_tick() returns True for every tick appended to the feed, in
+    order, and market time is the timestamp of the tick being processed.
+    """
+
+    def __init__(self, feed):
+        self.feed = feed
+
+    @property
+    def tick(self):
+        return max(self.feed.consumed, 0)
+
+    def time(self):
+        if self.feed.consumed < 0 or not len(self.feed):
+            return time.time()
+        return self.feed.timestamp(self.feed.consumed)
+
+    def wait_for_tick(self, timeout):
+        return self.feed.next_due(timeout) is not None
+
+    def start_at(self, tick):
+        self.feed.start_at(tick)
+
+
+# =========================
+#  FILE TAIL
+# =========================
+
+class FileTail:
+    """
+    Follows a growing tick file, appending complete new rows to a
+    TickFeed. Tick numbers are row numbers in the file. Unless
+    `from_start`, it starts at the last row (the current prices), so a
+    restart resumes where the file is rather than replaying it.
+    """
+
+    def __init__(self, path, feed, from_start=False, poll_interval=TAIL_POLL_INTERVAL):
+        self.path = path
+        self.feed = feed
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.symbols = None
+        self.binary = False
+        self.offset = None   # byte offset of the first unread row
+        self.row = 0         # number of that row
+        self.bytes_read = 0
+
+    def _open(self):
+        """
+        Reads the header and positions at the first row to feed.
+        """
+        with open(self.path, "rb") as f:
+            self.binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+        if self.binary:
+            self.symbols, data_offset = read_binary_header(self.path)
+            row_size = PRICE_DTYPE.itemsize * max(len(self.symbols), 1)
+            rows = (os.path.getsize(self.path) - data_offset) // row_size
+            self.row = 0 if self.from_start else max(rows - 1, 0)
+            self.offset = data_offset + self.row * row_size
+            return
+
+        with open(self.path, "rb") as f:
+            header = f.readline()
+            if not header.endswith(b"\n"):
+                raise ValueError(f"{self.path} has no complete header row yet")
+            self.symbols = header.decode().strip().split(",")
+            self.offset, self.row = f.tell(), 0
+            if not self.from_start:
+                # One pass over the existing rows, to number them and find the last
+                line_start = last_start = self.offset
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    last_start = line_start
+                    line_start += len(line)
+                    self.row += 1
+                if self.row:
+                    self.offset, self.row = last_start, self.row - 1
+
+    def poll(self):
+        """
+        Appends the complete rows written since the last poll, as many as
+        the feed has room for. Returns the number of ticks appended.
+        """
+        if self.offset is None:
+            self._open()
+            self.feed.start_at(self.row)
+        room = min(self.feed.room(), TAIL_MAX_ROWS)
+        if room == 0:
+            self.feed.throttled += 1
+            return 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            if self.binary:
+                row_size = PRICE_DTYPE.itemsize * len(self.symbols)
+                data = f.read(room * row_size)
+                count = len(data) // row_size
+                if not count:
+                    return 0
+                rows = np.frombuffer(data[:count * row_size], dtype=PRICE_DTYPE).reshape(count, -1)
+                consumed = count * row_size
+            else:
+                lines = []
+                consumed = 0
+                for line in f:
+                    if not line.endswith(b"\n") or len(lines) == room:
+                        break
+                    lines.append(line)
+                    consumed += len(line)
+                if not lines:
+                    return 0
+                rows = np.loadtxt([line.decode() for line in lines], delimiter=",",
+                                  dtype=PRICE_DTYPE, ndmin=2)
+
+        self.feed.append(self.symbols, rows, force=True)
+        self.offset += consumed
+        self.row += len(rows)
+        self.bytes_read += consumed
+        return len(rows)
+
+    def run(self):
+        while True:
+            try:
+                if self.poll():
+                    continue
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"Error tailing {self.path}: {str(e)}")
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        threading.Thread(target=self.run, name="tick-tail", daemon=True).start()
+
+
+def feed_from_spec(spec, capacity=RING_CAPACITY):
+    """
+    Builds (feed, tail) from a MOCK_TRADING_FEED value; tail is None for
+    the api feed.
+    """
+    spec = spec.strip()
+    feed = TickFeed(capacity)
+    if spec.lower() == "api":
+        return feed, None
+    kind, _, path = spec.partition(":")
+    if kind.lower() in ("tail", "replay") and path:
+        return feed, FileTail(path, feed, from_start=kind.lower() == "replay")
+    raise ValueError(f"Unknown feed {spec!r}, expected api, tail:<path> or replay:<path>")
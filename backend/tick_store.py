@@ -0,0 +1,196 @@
+"""
+tick_store.py - In-memory columnar store for the simulated price series.
+
+The series is loaded once into a 2-D NumPy array (one float column per
+symbol) and only reloaded when the source file's mtime changes. Besides
+the CSV format produced by CSV_generator.py, a compact binary format is
+supported that is memory-mapped instead of parsed, for series with
+millions of rows. OHLC candles (candles.py) are built with each load.
+
+Convert a CSV to the binary format with:
+    python tick_store.py test.csv test.ticks
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+from candles import CandleSet
+
+BINARY_MAGIC = b"MOCKTICKS 1\n"
+BINARY_ALIGNMENT = 64
+PRICE_DTYPE = np.dtype("<f8")
+
+
+class TickSeries:
+    """
+    Immutable snapshot of a loaded series.
+    prices[row, column] is the price of symbols[column] at that tick.
+    A live series (tick_feed.py) is a ring buffer written in place, in
+    which only ticks from first_tick on are still held.
+    """
+
+    live = False
+    first_tick = 0
+
+    def __init__(self, symbols, prices):
+        self.symbols = list(symbols)
+        self.columns = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.prices = prices
+        self.candles = None  # CandleSet, built by TickStore when loaded
+
+    def __len__(self):
+        return self.prices.shape[0]
+
+
+EMPTY_SERIES = TickSeries([], np.empty((0, 0), dtype=PRICE_DTYPE))
+
+
+# =========================
+#  FILE FORMATS
+# =========================
+
+def _binary_header(symbols):
+    header = BINARY_MAGIC + json.dumps({
+        "symbols": list(symbols),
+        "dtype": PRICE_DTYPE.str
+    }).encode()
+    padding = -(len(header) + 1) % BINARY_ALIGNMENT
+    return header + b" " * padding + b"\n"
+
+
+def is_binary_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_binary_header(path):
+    """
+    Returns (symbols, data_offset) for a binary tick file.
+    """
+    with open(path, "rb") as f:
+        if f.readline() != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a binary tick file")
+        meta = json.loads(f.readline())
+        return meta["symbols"], f.tell()
+
+
+def load_binary(path):
+    """
+    Memory-maps a binary tick file. Rows are counted from the file size,
+    so files that are still being appended to can be opened at any time.
+    """
+    symbols, offset = read_binary_header(path)
+    row_size = PRICE_DTYPE.itemsize * max(len(symbols), 1)
+    rows = (os.path.getsize(path) - offset) // row_size
+    if rows == 0:
+        return TickSeries(symbols, np.empty((0, len(symbols)), dtype=PRICE_DTYPE))
+    prices = np.memmap(path, dtype=PRICE_DTYPE, mode="r", offset=offset,
+                       shape=(rows, len(symbols)))
+    return TickSeries(symbols, prices)
+
+
+def load_csv(path):
+    with open(path, newline="") as csvfile:
+        symbols = next(csv.reader(csvfile), [])
+        prices = np.loadtxt(csvfile, delimiter=",", dtype=PRICE_DTYPE, ndmin=2)
+    if prices.size == 0:
+        prices = np.empty((0, len(symbols)), dtype=PRICE_DTYPE)
+    return TickSeries(symbols, prices)
+
+
+def load_series(path):
+    if is_binary_file(path):
+        return load_binary(path)
+    return load_csv(path)
+
+
+def write_binary(path, symbols, chunks):
+    """
+    Writes rows to a binary tick file. `chunks` is an iterable of 2-D
+    arrays with one column per symbol, so callers can stream series that
+    do not fit in memory.
+    """
+    with open(path, "wb") as f:
+        f.write(_binary_header(symbols))
+        for chunk in chunks:
+            f.write(np.ascontiguousarray(chunk, dtype=PRICE_DTYPE).tobytes())
+
+
+# =========================
+#  STORE
+# =========================
+
+class TickStore:
+    """
+    Holds the current TickSeries for a price file and swaps in a new one
+    when the file changes. Readers should grab `store.series` once per
+    operation so they never mix columns from one load with prices from
+    another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.series = EMPTY_SERIES
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.series)
+
+    def refresh(self):
+        """
+        Reloads the series if the file's mtime changed since the last load.
+        Returns True when a new series was loaded.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            print(f"Warning: {self.path} not found. Stock prices will remain unchanged.")
+            return False
+
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            try:
+                series = load_series(self.path)
+                series.candles = CandleSet(series.prices)
+                self.series = series
+            except (OSError, ValueError) as e:
+                print(f"Error loading {self.path}: {str(e)}")
+                return False
+            self._mtime = mtime
+            return True
+
+    def row(self, index):
+        """
+        Returns the prices at `index` as a {symbol: price} dict. The index
+        wraps around, so a row index taken before a reload stays valid.
+        """
+        series = self.series
+        if not len(series):
+            return {}
+        return dict(zip(series.symbols, series.prices[index % len(series)].tolist()))
+
+    def price(self, index, symbol):
+        """
+        Returns the price of `symbol` at `index`, or None if unknown.
+        """
+        series = self.series
+        column = series.columns.get(symbol)
+        if column is None or not len(series):
+            return None
+        return float(series.prices[index % len(series), column])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python tick_store.py <input.csv> <output.ticks>")
+        sys.exit(1)
+    series = load_csv(sys.argv[1])
+    write_binary(sys.argv[2], series.symbols, [series.prices])
+    print(f"Wrote {len(series)} rows x {len(series.symbols)} symbols to {sys.argv[2]}")
@@ -0,0 +1,350 @@
+"""
+trade_journal.py - Write-ahead journal for market orders, with group commit.
+
+By default (durability "per-trade") every order runs and commits in a
+transaction of its own. With MOCK_TRADING_DURABILITY=grouped or async,
+the routes hand orders to a TradeJournal instead. A background applier
+thread collects them into groups of up to GROUP_SIZE entries, waiting at
+most GROUP_INTERVAL after the first one. Each group is:
+
+  1. appended to the journal file, one JSON line per entry;
+  2. applied to the database in one transaction
+     (execution.execute_group()), together with the journal's applied
+     sequence number in the trade_journal table;
+  3. answered: every waiting request gets its new cash and transactions,
+     or its OrderError.
+
+Durability modes:
+  - per-trade: no journal; one database commit per order.
+  - grouped:   the journal is fsynced before the group is applied, so an
+               acknowledged order survives a crash or power loss.
+  - async:     the journal is only fsynced every ASYNC_FSYNC_INTERVAL.
+               A process crash loses nothing, since the OS has the data,
+               but a power loss can drop the last acknowledged orders.
+
+Orders are validated when they are applied, so a request returns only
+once its order is in the database, and its response is consistent with
+GET /api/portfolio.
+
+On startup, open() replays the entries written after the last applied
+sequence number (a crash between steps 1 and 2). They are idempotent
+because the sequence number is committed with the orders. A torn last
+line is cut off. The journal file is truncated once every entry in it
+has been applied and it has grown past ROTATE_BYTES.
+
+A group the database still refuses after APPLY_ATTEMPTS tries is given
+up: its requests get an error and its entries are marked applied, so
+they are not replayed either.
+
+One journal per process: the file is locked while open, so give each
+worker its own MOCK_TRADING_JOURNAL path.
+"""
+
+import collections
+import fcntl
+import json
+import os
+import threading
+import time
+
+import execution
+import market_clock
+from execution import OrderError
+from models import db, JournalState
+
+DURABILITY_MODES = ("per-trade", "grouped", "async")
+GROUP_INTERVAL = 0.002  # seconds to wait for more orders after the first one
+GROUP_SIZE = 256
+ASYNC_FSYNC_INTERVAL = 1.0  # seconds
+ROTATE_BYTES = 64 * 1024 * 1024
+SUBMIT_TIMEOUT = 30  # seconds
+RETRY_DELAY = 1.0  # seconds before retrying a group the database refused
+APPLY_ATTEMPTS = 5  # then the group's orders fail, so one bad group cannot wedge the applier
+
+_fsync = getattr(os, "fdatasync", os.fsync)
+
+
+class JournalEntry:
+    """
+    One request's orders: [(side, symbol, quantity, price), ...], applied
+    all-or-nothing. `result` is what execution.execute_group() returned
+    for it.
+    """
+
+    def __init__(self, user_id, orders, tick, timestamp, seq=None):
+        self.seq = seq
+        self.user_id = user_id
+        self.orders = orders
+        self.tick = tick
+        self.timestamp = timestamp
+        self.result = None
+        self.done = threading.Event()
+
+    def to_line(self):
+        return (json.dumps({
+            "seq": self.seq,
+            "user_id": self.user_id,
+            "orders": self.orders,
+            "tick": self.tick,
+            "timestamp": self.timestamp
+        }, separators=(",", ":")) + "\n").encode()
+
+    @classmethod
+    def from_line(cls, line):
+        data = json.loads(line)
+        orders = [tuple(order) for order in data["orders"]]
+        return cls(data["user_id"], orders, data["tick"], data["timestamp"], data["seq"])
+
+    def execution_args(self):
+        return self.user_id, self.orders, self.tick, self.timestamp
+
+
+class TradeJournal:
+    """
+    `context` returns a context manager the applier thread runs database
+    work in (the Flask app context).
+    """
+
+    def __init__(self, path, mode, context, group_interval=GROUP_INTERVAL, group_size=GROUP_SIZE):
+        if mode not in DURABILITY_MODES[1:]:
+            raise ValueError(f"Unknown durability {mode!r}, expected one of "
+                             f"{', '.join(DURABILITY_MODES)}")
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.context = context
+        self.group_interval = group_interval
+        self.group_size = group_size
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._fd = None
+        self._next_seq = 1
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self.applied_seq = 0
+        self.groups = 0
+        self.entries = 0
+        self.fsyncs = 0
+        self.replayed = 0
+        self.failed = 0    # entries given up after APPLY_ATTEMPTS
+
+    def __len__(self):
+        return len(self._queue)
+
+    # =========================
+    #  STARTUP
+    # =========================
+
+    def open(self):
+        """
+        Locks and replays the journal, then starts the applier thread.
+        Call inside an app context, after the schema exists.
+        """
+        if self._fd is not None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f"Trade journal {self.path} is in use by another process; "
+                               f"set MOCK_TRADING_JOURNAL per process")
+        try:
+            self._replay(fd)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        threading.Thread(target=self._run, name="trade-journal", daemon=True).start()
+
+    def _read(self, fd):
+        """
+        Returns the complete entries in the file, cutting off a torn tail.
+        """
+        entries = []
+        good = 0
+        with open(fd, "rb", closefd=False) as f:
+            f.seek(0)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(JournalEntry.from_line(line))
+                except (ValueError, KeyError, TypeError):
+                    break
+                good += len(line)
+        if good < os.fstat(fd).st_size:
+            print(f"Trade journal {self.path}: dropping a torn entry at byte {good}")
+            os.ftruncate(fd, good)
+            _fsync(fd)
+        return entries
+
+    def _replay(self, fd):
+        state = db.session.get(JournalState, self.path)
+        self.applied_seq = state.applied_seq if state else 0
+        db.session.commit()
+        entries = self._read(fd)
+        pending = [entry for entry in entries if entry.seq > self.applied_seq]
+        for start in range(0, len(pending), self.group_size):
+            self._apply(pending[start:start + self.group_size])
+        self.replayed = len(pending)
+        if pending:
+            print(f"Trade journal {self.path}: replayed {len(pending)} entries")
+        self._next_seq = max([self.applied_seq] + [entry.seq for entry in entries]) + 1
+
+    # =========================
+    #  SUBMITTING
+    # =========================
+
+    def submit(self, user_id, orders, tick=None, timestamp=None):
+        """
+        Journals and applies [(side, symbol, quantity, price), ...] for
+        the user, all-or-nothing. Returns (new cash, [transaction dicts]);
+        raises OrderError if the orders were rejected.
+        """
+        entry = JournalEntry(user_id, [list(order) for order in orders], tick,
+                             market_clock.now() if timestamp is None else timestamp)
+        with self._cond:
+            self._queue.append(entry)
+            self._cond.notify()
+        if not entry.done.wait(SUBMIT_TIMEOUT):
+            raise OrderError("The order is queued but not yet confirmed, "
+                             "check your portfolio before retrying.", 503)
+        if isinstance(entry.result, OrderError):
+            raise entry.result
+        return entry.result
+
+    # =========================
+    #  APPLIER
+    # =========================
+
+    def _next_group(self):
+        with self._cond:
+            while not self._queue:
+                if self._dirty:
+                    # async: fsync what was written once the interval is up
+                    remaining = ASYNC_FSYNC_INTERVAL - (time.monotonic() - self._last_fsync)
+                    if remaining <= 0:
+                        return []
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            deadline = time.monotonic() + self.group_interval
+            while len(self._queue) < self.group_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.group_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _sync(self):
+        _fsync(self._fd)
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self.fsyncs += 1
+
+    def _write(self, group):
+        for entry in group:
+            entry.seq = self._next_seq
+            self._next_seq += 1
+        offset = os.lseek(self._fd, 0, os.SEEK_END)
+        try:
+            os.write(self._fd, b"".join(entry.to_line() for entry in group))
+            self._dirty = True
+            if self.mode == "grouped" or time.monotonic() - self._last_fsync >= ASYNC_FSYNC_INTERVAL:
+                self._sync()
+        except OSError:
+            # Nothing of this group may be replayed later
+            os.ftruncate(self._fd, offset)
+            self._next_seq = group[0].seq
+            raise
+
+    def _record_progress(self, last_seq):
+        state = db.session.get(JournalState, self.path)
+        if state is None:
+            db.session.add(JournalState(name=self.path, applied_seq=last_seq))
+        else:
+            state.applied_seq = last_seq
+
+    def _apply(self, group):
+        last_seq = group[-1].seq
+        results = execution.execute_group([entry.execution_args() for entry in group],
+                                          lambda: self._record_progress(last_seq))
+        self.applied_seq = last_seq
+        return results
+
+    def _give_up(self, group):
+        """
+        Marks a group that could not be applied as done, without its orders.
+        """
+        last_seq = group[-1].seq
+        try:
+            with self.context():
+                self._record_progress(last_seq)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error skipping trade journal entries up to {last_seq}: {str(e)}")
+        self.applied_seq = last_seq
+        self.failed += len(group)
+
+    def _rotate(self):
+        if os.fstat(self._fd).st_size >= ROTATE_BYTES:
+            # Every entry in the file is applied; sequence numbers continue
+            # from trade_journal.applied_seq
+            os.ftruncate(self._fd, 0)
+            self._sync()
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            if not group:
+                self._sync()
+                continue
+            try:
+                self._write(group)
+            except OSError as e:
+                print(f"Error writing trade journal: {str(e)}")
+                error = OrderError("The trade journal is unavailable, please retry.", 503)
+                for entry in group:
+                    entry.result = error
+                    entry.done.set()
+                continue
+
+            results = None
+            for attempt in range(1, APPLY_ATTEMPTS + 1):
+                try:
+                    with self.context():
+                        results = self._apply(group)
+                    break
+                except Exception as e:
+                    print(f"Error applying trade journal entries "
+                          f"(attempt {attempt}/{APPLY_ATTEMPTS}): {str(e)}")
+                    if attempt < APPLY_ATTEMPTS:
+                        time.sleep(RETRY_DELAY)
+            if results is None:
+                self._give_up(group)
+                results = [OrderError("The order could not be executed, please retry.", 500)] * len(group)
+            else:
+                self.groups += 1
+                self.entries += len(group)
+            for entry, result in zip(group, results):
+                entry.result = result
+                entry.done.set()
+            try:
+                self._rotate()
+            except OSError as e:
+                print(f"Error rotating trade journal: {str(e)}")
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "queued": len(self._queue),
+            "applied_seq": self.applied_seq,
+            "groups": self.groups,
+            "entries": self.entries,
+            "fsyncs": self.fsyncs,
+            "replayed": self.replayed,
+            "failed": self.failed
+        }
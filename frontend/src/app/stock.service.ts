@@ -2,6 +2,7 @@ import { Injectable } from '@angular/core';
 import { HttpClient, HttpHeaders } from '@angular/common/http';
 import { Observable, of, throwError } from 'rxjs';
 import { catchError, map } from 'rxjs/operators';
+import { TradeResponse, TransactionPage } from './portfolio.model';
 
 @Injectable({
   providedIn: 'root'
@@ -19,33 +20,76 @@ export class StockService {
     });
   }
 
-  buyStock(symbol: string, quantity: number): Observable<any> {
+  buyStock(symbol: string, quantity: number): Observable<TradeResponse> {
     const url = `${this.apiUrl}/buy`;
     const body = { symbol, quantity };
     console.log('Sell request payload:',body);
-    return this.http.post<any>(url, body, { headers: this.getAuthHeaders() });
+    return this.http.post<TradeResponse>(url, body, { headers: this.getAuthHeaders() });
   }
 
-  sellStock(symbol: string, quantity: number): Observable<any> {
+  sellStock(symbol: string, quantity: number): Observable<TradeResponse> {
     const url = `${this.apiUrl}/sell`;
     const body = { symbol, quantity };
     console.log('Sell request payload:', body);
-    return this.http.post<any>(url, body, { headers: this.getAuthHeaders() });
+    return this.http.post<TradeResponse>(url, body, { headers: this.getAuthHeaders() });
   }
 
-  getStockPrices(): Observable<{prices: {[key: string]: number}, timestamp: number}> {
+  getStockPrices(symbols?: string[]): Observable<{prices: {[key: string]: number}, timestamp: number}> {
     const url = `${this.apiUrl}/stock_prices`;
-    return this.http.get<{prices: {[key: string]: number}, timestamp: number}>(url).pipe(
+    const params: {[key: string]: string} = symbols && symbols.length ? { symbols: symbols.join(',') } : {};
+    return this.http.get<{prices: {[key: string]: number}, timestamp: number}>(url, { params }).pipe(
       catchError(this.handleError<{prices: {[key: string]: number}, timestamp: number}>('getStockPrices'))
     );
   }
 
+  getPriceHistory(symbol: string, from?: number, to?: number, resolution = 1): Observable<any> {
+    const url = `${this.apiUrl}/stock_prices/history`;
+    const params: {[key: string]: string} = { symbol, resolution: String(resolution) };
+    if (from !== undefined) { params['from'] = String(from); }
+    if (to !== undefined) { params['to'] = String(to); }
+    return this.http.get<any>(url, { params }).pipe(
+      catchError(this.handleError<any>('getPriceHistory'))
+    );
+  }
+
+  streamStockPrices(): Observable<{prices: {[key: string]: number}, timestamp: number}> {
+    const url = `${this.apiUrl}/stock_prices/stream`;
+    return new Observable<{prices: {[key: string]: number}, timestamp: number}>(observer => {
+      // EventSource reconnects on its own and resumes via Last-Event-ID
+      const source = new EventSource(url);
+      source.addEventListener('prices', (event: MessageEvent) => observer.next(JSON.parse(event.data)));
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) {
+          observer.error(new Error('Price stream closed'));
+        }
+      };
+      return () => source.close();
+    });
+  }
+
   getUserPortfolio(): Observable<any> {
     const token=localStorage.getItem('access_token')
     const url = `${this.apiUrl}/portfolio`;
     return this.http.get<any>(url, { headers: this.getAuthHeaders() });
   }
 
+  getPortfolioAnalytics(points?: number): Observable<any> {
+    const url = `${this.apiUrl}/portfolio/analytics`;
+    const params: {[key: string]: string} = points ? { points: String(points) } : {};
+    return this.http.get<any>(url, { headers: this.getAuthHeaders(), params }).pipe(
+      catchError(this.handleError<any>('getPortfolioAnalytics'))
+    );
+  }
+
+  getTransactions(cursor?: number | null, limit = 50): Observable<TransactionPage> {
+    const url = `${this.apiUrl}/portfolio/transactions`;
+    const params: {[key: string]: string} = { limit: String(limit) };
+    if (cursor) { params['cursor'] = String(cursor); }
+    return this.http.get<TransactionPage>(url, { headers: this.getAuthHeaders(), params }).pipe(
+      catchError(this.handleError<TransactionPage>('getTransactions'))
+    );
+  }
+
   getSpecificUserPortfolio(userId: string): Observable<any> {
     const url = `${this.apiUrl}/portfolio/${userId}`;
     return this.http.get<any>(url);
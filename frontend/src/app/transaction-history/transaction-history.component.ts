@@ -1,6 +1,6 @@
 import { Component, OnInit } from '@angular/core';
 import { StockService } from '../stock.service';
-import { Portfolio, Transaction } from '../portfolio.model';
+import { Transaction, TransactionPage } from '../portfolio.model';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 
@@ -13,6 +13,7 @@ import { FormsModule } from '@angular/forms';
 })
 export class TransactionHistoryComponent implements OnInit {
   transactions: Transaction[] = [];
+  nextCursor: number | null = null;
 
   constructor(private stockService: StockService) {}
 
@@ -21,20 +22,11 @@ export class TransactionHistoryComponent implements OnInit {
   }
 
   fetchTransactions() {
-    this.stockService.getUserPortfolio().subscribe(
-      (portfolio: Portfolio) => {
-        // Check if transactions is a string and parse it if necessary
-        if (typeof portfolio.transactions === 'string') {
-          try {
-            this.transactions = JSON.parse(portfolio.transactions);
-          } catch (error) {
-            console.error('Error parsing transactions:', error);
-            this.transactions = [];
-          }
-        } else {
-          this.transactions = portfolio.transactions || [];
-        }
-        console.log('Parsed transactions:', this.transactions);
+    // Pages of the newest transactions first, so long histories are never fetched in bulk
+    this.stockService.getTransactions(this.nextCursor).subscribe(
+      (page: TransactionPage) => {
+        this.transactions = this.transactions.concat(page.transactions);
+        this.nextCursor = page.next_cursor;
       },
       error => {
         console.error('Error Fetching transactions:', error);
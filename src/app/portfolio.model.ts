@@ -3,7 +3,16 @@ export interface Portfolio {
   cash: number;
   stocks: { [key: string]: number }; // Ensure this is an object
   stock_purchases:{[key:string]:StockPurchase[]};
+  positions?: { [key: string]: Position };
   transactions: Transaction[];
+  transactions_cursor?: number | null; // older transactions: /api/portfolio/transactions
+}
+export interface Position {
+  quantity: number;
+  average_cost: number;
+  cost_basis: number;
+  realized_pnl: number;
+  unrealized_pnl?: number;
 }
 export interface StockPurchase{
   quantity:number;
@@ -11,10 +20,23 @@ export interface StockPurchase{
 }
   
   export interface Transaction {
+   id?:number;
    type:'buy'|'sell';
    symbol:string;
    quantity:number;
    price:number;
    timestamp:number;
   }
-  
\ No newline at end of file
+
+export interface TradeResponse {
+  message: string;
+  balance: number;
+  price: number;
+  transaction: Transaction;
+  position: Position;
+}
+
+export interface TransactionPage {
+  transactions: Transaction[];
+  next_cursor: number | null;
+}
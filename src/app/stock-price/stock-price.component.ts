@@ -1,11 +1,11 @@
 import { Component, OnInit, OnDestroy, ChangeDetectorRef } from '@angular/core';
 import { StockService } from '../stock.service';
-import { Observable, Subscription, interval } from 'rxjs';
-import { switchMap, take } from 'rxjs/operators';
+import { Observable, Subscription } from 'rxjs';
+import { take } from 'rxjs/operators';
 import { Router } from '@angular/router';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
-import { Portfolio, StockPurchase, Transaction } from '../portfolio.model';
+import { Portfolio, StockPurchase, TradeResponse, Transaction } from '../portfolio.model';
 
 
 @Component({
@@ -59,10 +59,7 @@ export class StockPriceComponent implements OnInit, OnDestroy {
   }
 
   fetchStockPrices() {
-    this.priceSubscription = interval(15000)
-      .pipe(
-        switchMap(() => this.stockService.getStockPrices())
-      )
+    this.priceSubscription = this.stockService.streamStockPrices()
       .subscribe(
         (data) => {
           this.stockPrices = data.prices;
@@ -80,11 +77,8 @@ export class StockPriceComponent implements OnInit, OnDestroy {
 
   buyStock(symbol: string, quantity: number) {
     this.stockService.buyStock(symbol, quantity).subscribe(
-      (response: Portfolio) => {
-        console.log('Stock bought:', response);
-        this.portfolio = response;
-        this.transactions = response.transactions;
-        this.updatePortfolioItems();
+      (response: TradeResponse) => {
+        this.applyTrade(symbol, response);
         this.successMessage = `Successfully bought ${quantity} shares of ${symbol}`;
         this.cdr.detectChanges();
       },
@@ -97,11 +91,8 @@ export class StockPriceComponent implements OnInit, OnDestroy {
 
   sellStock(symbol: string, quantity: number) {
     this.stockService.sellStock(symbol, quantity).subscribe(
-      (response: Portfolio) => {
-        console.log('Stock sold:', response);
-        this.portfolio = response;
-        this.transactions = response.transactions;
-        this.updatePortfolioItems();
+      (response: TradeResponse) => {
+        this.applyTrade(symbol, response);
         this.successMessage = `Successfully sold ${quantity} shares of ${symbol}`;
         this.cdr.detectChanges();
       },
@@ -112,6 +103,23 @@ export class StockPriceComponent implements OnInit, OnDestroy {
     );
   }
 
+  applyTrade(symbol: string, response: TradeResponse) {
+    // The trade response carries everything that changed; no need to refetch the portfolio
+    const stocks = { ...this.portfolio.stocks };
+    const positions = { ...(this.portfolio.positions || {}) };
+    if (response.position.quantity > 0) {
+      stocks[symbol] = response.position.quantity;
+      positions[symbol] = response.position;
+    } else {
+      delete stocks[symbol];
+      delete positions[symbol];
+    }
+    this.portfolio = { ...this.portfolio, cash: response.balance, stocks, positions };
+    this.transactions = [response.transaction, ...this.transactions];
+    this.portfolio.transactions = this.transactions;
+    this.updatePortfolioItems();
+  }
+
   updatePortfolio() {
     this.stockService.getUserPortfolio().subscribe(
       (portfolio: Portfolio) => {
@@ -132,6 +140,23 @@ export class StockPriceComponent implements OnInit, OnDestroy {
   updatePortfolioItems() {
     console.log('Updating portfolio items', this.portfolio);
     this.portfolioItems = Object.keys(this.portfolio.stocks || {}).map(symbol => {
+      // Cost basis is maintained by the backend; only value it at the live price
+      const position = this.portfolio.positions?.[symbol];
+      if (position) {
+        const currentPrice = this.stockPrices[symbol] || 0;
+        const currentValue = currentPrice * position.quantity;
+        const totalReturns = currentValue - position.cost_basis;
+        return {
+          symbol,
+          quantity: position.quantity,
+          avgPrice: position.average_cost,
+          currentPrice,
+          invested: position.cost_basis,
+          currentValue,
+          totalReturns,
+          totalReturnsPercentage: (position.cost_basis > 0 ? (totalReturns / position.cost_basis) * 100 : 0).toFixed(2)
+        };
+      }
       const purchases: StockPurchase[] = this.portfolio.stock_purchases[symbol] || [];
       if (!Array.isArray(purchases)) {
         console.error(`Purchases for ${symbol} is not an array:`, purchases);